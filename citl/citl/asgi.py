@@ -0,0 +1,28 @@
+"""
+ASGI config for citl project.
+
+It exposes the ASGI callable as a module-level variable named ``application``. Serve it with an ASGI server,
+for example ``uvicorn citl.asgi:application``, and set ``SHOOTER_ASYNC_VIEWS = True`` in settings so the public
+pages (IndexView, SeasonsView, SeasonView, ScorecardView) and the live scoreboard stream (LiveView) are served by
+their async versions.
+
+Needs Django 3.0 or later, and 4.2 or later for the async views. See "Load testing" in README.md to compare it
+with citl/wsgi.py.
+
+For more information on this file, see
+https://docs.djangoproject.com/en/stable/howto/deployment/asgi/
+"""
+
+import os
+
+import django
+from django.core.exceptions import ImproperlyConfigured
+
+os.environ.setdefault("DJANGO_SETTINGS_MODULE", "citl.settings")
+
+if django.VERSION < (3, 0):
+	raise ImproperlyConfigured("citl/asgi.py needs Django 3.0 or later; serve citl/wsgi.py instead")
+
+from django.core.asgi import get_asgi_application
+
+application = get_asgi_application()
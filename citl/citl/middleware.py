@@ -0,0 +1,154 @@
+"""Per-request query and timing instrumentation
+
+RequestTimingMiddleware records, for each sampled request, the SQL query count, total DB time, the slowest
+statements, template render time and total latency. It reports them in a ``Server-Timing`` response header (shown
+in the browser dev tools network tab) and as one structured log line on the ``citl.timing`` logger. A streaming
+response is timed until its last chunk is sent; it is only logged, since its headers are sent before that.
+
+Template time is measured by the Django engine that citl.templating.template_settings() sets up
+(``citl.templating.TimedDjangoTemplates``); with another TEMPLATES backend it is reported as 0.
+
+Enable it by adding it near the top of MIDDLEWARE in settings.py::
+
+    MIDDLEWARE = [
+        'citl.middleware.RequestTimingMiddleware',
+        ...
+    ]
+
+Settings (all optional):
+
+    REQUEST_TIMING_SAMPLE_RATE   fraction of requests to instrument, 0.0 - 1.0 (default 1.0)
+    REQUEST_TIMING_SLOWEST       how many of the slowest statements to log (default 3)
+"""
+
+import json
+import logging
+import random
+import time
+from contextlib import ExitStack, contextmanager
+
+from django.conf import settings
+from django.db import connections
+
+from . import templating
+
+logger = logging.getLogger('citl.timing')
+
+
+class RequestTiming(object):
+
+	def __init__(self, slowest):
+		self.slowest = slowest
+		self.queries = 0
+		self.db_time = 0.0
+		self.template_time = 0.0
+		self.render_depth = 0
+		self.statements = []
+
+	def record_query(self, execute, sql, params, many, context):
+		start = time.perf_counter()
+		try:
+			return execute(sql, params, many, context)
+		finally:
+			duration = time.perf_counter() - start
+			self.queries += 1
+			self.db_time += duration
+			self.statements.append((duration, sql))
+			if len(self.statements) > self.slowest * 4:
+				self.statements = sorted(self.statements, reverse=True)[:self.slowest]
+
+	def record_render(self, render, context, request):
+		# Only the outermost render counts, so pages rendering templates inside templates are not counted twice
+		self.render_depth += 1
+		start = time.perf_counter()
+		try:
+			return render(context, request)
+		finally:
+			self.render_depth -= 1
+			if self.render_depth == 0:
+				self.template_time += time.perf_counter() - start
+
+	def slowest_statements(self):
+		return [{'ms': round(d * 1000, 2), 'sql': sql[:300]}
+				for d, sql in sorted(self.statements, reverse=True)[:self.slowest]]
+
+
+class RequestTimingMiddleware(object):
+
+	def __init__(self, get_response):
+		self.get_response = get_response
+		self.sample_rate = getattr(settings, 'REQUEST_TIMING_SAMPLE_RATE', 1.0)
+		self.slowest = getattr(settings, 'REQUEST_TIMING_SLOWEST', 3)
+
+	def __call__(self, request):
+		if self.sample_rate <= 0 or random.random() >= self.sample_rate:
+			return self.get_response(request)
+
+		timing = RequestTiming(self.slowest)
+		start = time.perf_counter()
+		with _timed(timing):
+			response = self.get_response(request)
+
+		# The body is generated after this returns, too late for a header: log once the stream ends. Files are
+		# sent by the server's file_wrapper, without our code, and keep that
+		if response.streaming and getattr(response, 'file_to_stream', None) is None:
+			if getattr(response, 'is_async', False):
+				response.streaming_content = self._timed_async_stream(response.streaming_content, request,
+																	  response, timing, start)
+			else:
+				response.streaming_content = self._timed_stream(response.streaming_content, request, response,
+																timing, start)
+			return response
+
+		total = time.perf_counter() - start
+		response['Server-Timing'] = ', '.join([
+			'db;dur=%.1f;desc="%d queries"' % (timing.db_time * 1000, timing.queries),
+			'tpl;dur=%.1f;desc="templates"' % (timing.template_time * 1000),
+			'total;dur=%.1f' % (total * 1000),
+		])
+		self._log(request, response, timing, total)
+		return response
+
+	def _timed_stream(self, content, request, response, timing, start):
+		try:
+			with _timed(timing):
+				for chunk in content:
+					yield chunk
+		finally:
+			self._log(request, response, timing, time.perf_counter() - start)
+
+	async def _timed_async_stream(self, content, request, response, timing, start):
+		# Queries run in other threads here; only the total is measured
+		try:
+			async for chunk in content:
+				yield chunk
+		finally:
+			self._log(request, response, timing, time.perf_counter() - start)
+
+	def _log(self, request, response, timing, total):
+		record = {
+			'method': request.method,
+			'path': request.path,
+			'status': response.status_code,
+			'streaming': response.streaming,
+			'total_ms': round(total * 1000, 2),
+			'db_ms': round(timing.db_time * 1000, 2),
+			'queries': timing.queries,
+			'template_ms': round(timing.template_time * 1000, 2),
+			'slowest': timing.slowest_statements(),
+		}
+		logger.info(json.dumps(record), extra={'timing': record})
+
+
+@contextmanager
+def _timed(timing):
+	"""Time this thread's queries on every database, and its template renders, into timing
+	"""
+	templating.time_renders(timing.record_render)
+	try:
+		with ExitStack() as stack:
+			for connection in connections.all():
+				stack.enter_context(connection.execute_wrapper(timing.record_query))
+			yield
+	finally:
+		templating.time_renders(None)
@@ -0,0 +1,167 @@
+"""Read replica routing
+
+ReplicaRouter sends every write, and every read by default, to the primary ('default') database. Views that only
+read public league data opt in with ``read_replica = True`` (SeasonsView, SeasonView, ScorecardView, IndexView);
+while ReplicaMiddleware is handling a GET or HEAD for one of them, reads go to one of DATABASE_REPLICAS instead.
+
+After a visitor's own write (any successful POST) ReplicaMiddleware sets a short-lived cookie that keeps that
+browser's reads on the primary for REPLICA_PIN_SECONDS, so they see their scores even if a replica lags behind.
+A write inside a request pins the rest of that request too.
+
+Everyone else's reads may still lag behind a write. That is fine for one page view, but not for what gets cached:
+shooter/cache.py keys cached pages, fragments and standings on per-scope write stamps, and content rendered from a
+replica that hasn't caught up would be stored under the new stamp until the next write. So whenever cache.stamps()
+sees a write from the last REPLICA_PIN_SECONDS, recent_write() moves the rest of the request to the primary.
+
+Replicas are health checked at most every REPLICA_HEALTH_INTERVAL seconds per process (a ``SELECT 1`` on the
+alias' connection); an unreachable replica is skipped until the next check, and with none healthy reads fall
+back to the primary. HealthView (``/health/``) reports every alias for load balancers.
+
+Persistent connections are set per alias with CONN_MAX_AGE (seconds, None for unlimited). On Django 4.1+ also set
+CONN_HEALTH_CHECKS so a dropped persistent connection is replaced before a request uses it. In settings.py::
+
+    DATABASES = {
+        'default': {..., 'CONN_MAX_AGE': 60},
+        'replica': {..., 'CONN_MAX_AGE': 60, 'TEST': {'MIRROR': 'default'}},
+    }
+    DATABASE_ROUTERS = ['citl.routers.ReplicaRouter']
+    DATABASE_REPLICAS = ['replica']
+    MIDDLEWARE = [
+        ...
+        'citl.routers.ReplicaMiddleware',
+    ]
+
+Settings (all optional):
+
+    DATABASE_REPLICAS          aliases reads may go to (default none: everything uses the primary)
+    REPLICA_PIN_SECONDS        how long a visitor's reads stay on the primary after their write, and how far behind
+                               a replica may be (default 10)
+    REPLICA_HEALTH_INTERVAL    seconds between health checks of a replica (default 30)
+
+Migrations only run on the primary; replicas get their schema through replication. To try it locally with
+SQLite, point 'replica' at a copy of the migrated database file (copy it again to "replicate"), or with
+PostgreSQL at a second local database restored from a dump of the first.
+"""
+
+import logging
+import random
+import threading
+import time
+
+from django.conf import settings
+from django.db import DEFAULT_DB_ALIAS, connections
+from django.db.utils import DatabaseError
+
+try:
+	# Follows the request into sync_to_async threads under ASGI
+	from asgiref.local import Local
+except ImportError:
+	from threading import local as Local
+
+logger = logging.getLogger(__name__)
+
+PIN_COOKIE = 'citl_primary'
+
+_state = Local()
+_health = {}
+_health_lock = threading.Lock()
+
+
+def replicas():
+	return list(getattr(settings, 'DATABASE_REPLICAS', []))
+
+
+def healthy(alias):
+	"""Whether alias answered its last health check, checking again if that was more than the interval ago
+	"""
+	interval = getattr(settings, 'REPLICA_HEALTH_INTERVAL', 30)
+	now = time.monotonic()
+	checked = _health.get(alias)
+	if checked is not None and now - checked[0] < interval:
+		return checked[1]
+
+	with _health_lock:
+		ok = check(alias)
+		_health[alias] = (now, ok)
+	if not ok:
+		logger.warning("Database %s failed its health check; reading from the primary", alias)
+	return ok
+
+
+def check(alias):
+	"""Run a trivial query on alias. A broken connection is closed so the next use opens a fresh one
+	"""
+	connection = connections[alias]
+	try:
+		with connection.cursor() as cursor:
+			cursor.execute('SELECT 1')
+			cursor.fetchone()
+		return True
+	except DatabaseError:
+		connection.close()
+		return False
+
+
+def recent_write(stamp):
+	"""A write happened at stamp (a time.time() value). If a replica may not have it yet, read from the primary for
+	the rest of this request
+	"""
+	if time.time() - stamp < getattr(settings, 'REPLICA_PIN_SECONDS', 10):
+		_state.use_replica = False
+
+
+class ReplicaRouter(object):
+
+	def db_for_read(self, model, **hints):
+		if not getattr(_state, 'use_replica', False) or getattr(_state, 'wrote', False):
+			return DEFAULT_DB_ALIAS
+
+		alias = getattr(_state, 'replica', None)
+		if alias is None:
+			# One replica for the whole request, so its queries see one consistent snapshot
+			candidates = [a for a in replicas() if healthy(a)]
+			alias = random.choice(candidates) if candidates else DEFAULT_DB_ALIAS
+			_state.replica = alias
+		return alias
+
+	def db_for_write(self, model, **hints):
+		_state.wrote = True
+		return DEFAULT_DB_ALIAS
+
+	def allow_relation(self, obj1, obj2, **hints):
+		# Replicas hold the same rows as the primary
+		return True
+
+	def allow_migrate(self, db, app_label, model_name=None, **hints):
+		if db in replicas():
+			return False
+		return None
+
+
+class ReplicaMiddleware(object):
+
+	def __init__(self, get_response):
+		self.get_response = get_response
+		self.pin_seconds = getattr(settings, 'REPLICA_PIN_SECONDS', 10)
+
+	def __call__(self, request):
+		_state.use_replica = False
+		_state.wrote = False
+		_state.replica = None
+		try:
+			response = self.get_response(request)
+		finally:
+			wrote = _state.wrote
+			_state.use_replica = False
+			_state.wrote = False
+			_state.replica = None
+
+		if (wrote or request.method not in ('GET', 'HEAD', 'OPTIONS')) and response.status_code < 400:
+			response.set_cookie(PIN_COOKIE, '1', max_age=self.pin_seconds, httponly=True)
+		return response
+
+	def process_view(self, request, view_func, view_args, view_kwargs):
+		view_class = getattr(view_func, 'view_class', None)
+		_state.use_replica = request.method in ('GET', 'HEAD') \
+				and getattr(view_class, 'read_replica', False) \
+				and PIN_COOKIE not in request.COOKIES
@@ -0,0 +1,239 @@
+"""Fingerprinted, minified and precompressed static files
+
+CompressedManifestStorage extends Django's ManifestStaticFilesStorage, which gives every collected file a
+content hashed name (style.css -> style.1a2b3c4d5e6f.css) that ``{% static %}`` resolves through the manifest.
+At collectstatic time it also minifies CSS (and JavaScript, when the optional ``rjsmin`` package is installed)
+before hashing, so each name's hash is that of the bytes served under it, and writes ``.gz`` variants next to
+each text asset, plus ``.br`` variants when the optional ``brotli`` package is installed. A template referring to
+a file that was never collected gets its plain URL instead of failing the page.
+
+StaticFilesApplication is a small WSGI wrapper serving STATIC_ROOT: it picks the precompressed variant the
+browser accepts and marks hashed files immutable for a year, so repeat visitors make no static requests at
+all. citl/wsgi.py wraps the Django application with it.
+
+Enable both in settings.py and run ``manage.py collectstatic``::
+
+    STATIC_ROOT = os.path.join(BASE_DIR, 'staticfiles')
+    STATICFILES_STORAGE = 'citl.staticfiles.CompressedManifestStorage'
+"""
+
+import gzip
+import logging
+import mimetypes
+import os
+import re
+from io import BytesIO
+
+from django.conf import settings
+from django.contrib.staticfiles.storage import ManifestStaticFilesStorage
+from django.core.files.base import ContentFile
+
+try:
+	import brotli
+except ImportError:
+	brotli = None
+
+try:
+	import rjsmin
+except ImportError:
+	rjsmin = None
+
+logger = logging.getLogger(__name__)
+
+COMPRESS_EXTENSIONS = ('.css', '.js', '.svg', '.txt', '.html', '.json', '.map')
+# Not worth a second file below this size
+COMPRESS_MIN_SIZE = 256
+
+
+def minify_css(css):
+	css = re.sub(r'/\*(?!!).*?\*/', '', css, flags=re.S)			# comments, except /*! licences */
+	css = re.sub(r'\s+', ' ', css)
+	css = re.sub(r'\s*([{};,>])\s*', r'\1', css)
+	# Only in declaration blocks (innermost braces): in a selector, "a :hover" and "a:hover" differ
+	css = re.sub(r'\{[^{}]*\}', _minify_declarations, css)
+	css = css.replace(';}', '}')
+	return css.strip() + '\n'
+
+
+def _minify_declarations(match):
+	# Quoted strings are kept as they are
+	return re.sub(r'("[^"]*"|\'[^\']*\')|\s*:\s*', lambda m: m.group(1) or ':', match.group(0))
+
+
+def minify_js(js):
+	if rjsmin is None:
+		return js
+	return rjsmin.jsmin(js, keep_bang_comments=True) + '\n'
+
+
+class CompressedManifestStorage(ManifestStaticFilesStorage):
+
+	minifiers = {
+		'.css': minify_css,
+		'.js': minify_js,
+	}
+
+	# Files missing from the manifest are hashed on first use, and stored_name() falls back to the plain name for
+	# files that don't exist at all
+	manifest_strict = False
+
+	def stored_name(self, name):
+		try:
+			return super(CompressedManifestStorage, self).stored_name(name)
+		except ValueError:
+			logger.warning("Static file %s was not collected; using its unhashed URL", name)
+			return name
+
+	def post_process(self, paths, dry_run=False, **options):
+		if not dry_run:
+			# Minify the collected copies first and hash those, so the hash in each name matches its content
+			paths = dict(paths)
+			for name in sorted(paths):
+				if self._minify(name, *paths[name]):
+					paths[name] = (self, name)
+
+		# The manifest storage yields some files more than once (one per pass); compress each hashed file once,
+		# after every url() in the CSS has been rewritten to hashed names
+		results = list(super(CompressedManifestStorage, self).post_process(paths, dry_run, **options))
+
+		if not dry_run:
+			for hashed_name in sorted(set(r[1] for r in results if r[1] and not isinstance(r[2], Exception))):
+				self._compress(hashed_name)
+
+		for result in results:
+			yield result
+
+	def _minify(self, name, storage, path):
+		base, ext = os.path.splitext(name)
+		minify = self.minifiers.get(ext)
+		if minify is None or base.endswith('.min'):
+			return False
+
+		with storage.open(path) as f:
+			content = f.read()
+		minified = minify(content.decode('utf-8')).encode('utf-8')
+		if len(minified) >= len(content):
+			return False
+
+		if self.exists(name):
+			self.delete(name)
+		self._save(name, ContentFile(minified))
+		return True
+
+	def _compress(self, name):
+		if os.path.splitext(name)[1] not in COMPRESS_EXTENSIONS:
+			return
+
+		with self.open(name) as f:
+			content = f.read()
+		if len(content) < COMPRESS_MIN_SIZE:
+			return
+
+		buffer = BytesIO()
+		# mtime=0 keeps the .gz bytes identical between builds
+		with gzip.GzipFile(fileobj=buffer, mode='wb', compresslevel=9, mtime=0) as gz:
+			gz.write(content)
+		self._save_variant(name + '.gz', buffer.getvalue(), len(content))
+
+		if brotli is not None:
+			self._save_variant(name + '.br', brotli.compress(content, quality=11), len(content))
+
+	def _save_variant(self, name, data, original_size):
+		if self.exists(name):
+			self.delete(name)
+		if len(data) < original_size:
+			self._save(name, ContentFile(data))
+
+
+class StaticFilesApplication(object):
+	"""WSGI wrapper serving STATIC_URL from STATIC_ROOT, precompressed and with far-future headers for hashed
+	names. Everything else goes to the wrapped application
+	"""
+
+	hashed = re.compile(r'\.[0-9a-f]{12}\.[^./]+$')
+	encodings = (('br', '.br'), ('gzip', '.gz'))
+
+	def __init__(self, application, root=None, prefix=None):
+		self.application = application
+		self.root = root if root is not None else getattr(settings, 'STATIC_ROOT', None)
+		self.prefix = prefix if prefix is not None else getattr(settings, 'STATIC_URL', None)
+
+	def __call__(self, environ, start_response):
+		path = environ.get('PATH_INFO', '')
+		if not self.root or not self.prefix or not path.startswith(self.prefix) \
+				or environ.get('REQUEST_METHOD') not in ('GET', 'HEAD'):
+			return self.application(environ, start_response)
+
+		relative = path[len(self.prefix):]
+		filename = os.path.normpath(os.path.join(self.root, relative))
+		if not filename.startswith(os.path.abspath(self.root) + os.sep) or not os.path.isfile(filename):
+			return self.application(environ, start_response)
+
+		headers = [('Vary', 'Accept-Encoding')]
+		content_type, _ = mimetypes.guess_type(filename)
+		headers.append(('Content-Type', content_type or 'application/octet-stream'))
+
+		if self.hashed.search(relative):
+			headers.append(('Cache-Control', 'public, max-age=31536000, immutable'))
+		else:
+			headers.append(('Cache-Control', 'public, max-age=300'))
+
+		accepted = accepted_encodings(environ.get('HTTP_ACCEPT_ENCODING', ''))
+		available = [(encoding, suffix) for encoding, suffix in self.encodings
+					 if accepted.get(encoding, accepted.get('*', 0)) > 0 and os.path.isfile(filename + suffix)]
+		if available:
+			# The browser's preferred encoding; ours (brotli first) between equals
+			encoding, suffix = max(available, key=lambda e: accepted.get(e[0], accepted.get('*', 0)))
+			filename += suffix
+			headers.append(('Content-Encoding', encoding))
+
+		stat = os.stat(filename)
+		etag = '"%x-%x"' % (int(stat.st_mtime), stat.st_size)
+		headers.append(('ETag', etag))
+		if environ.get('HTTP_IF_NONE_MATCH') == etag:
+			start_response('304 Not Modified', headers)
+			return []
+
+		headers.append(('Content-Length', str(stat.st_size)))
+		start_response('200 OK', headers)
+		if environ['REQUEST_METHOD'] == 'HEAD':
+			return []
+
+		f = open(filename, 'rb')
+		file_wrapper = environ.get('wsgi.file_wrapper')
+		if file_wrapper is not None:
+			return file_wrapper(f)
+		return _FileIterator(f)
+
+
+def accepted_encodings(header):
+	"""Parse an Accept-Encoding header into {coding: q}. q=0 means the coding is refused
+	"""
+	accepted = {}
+	for item in header.split(','):
+		coding, _, params = item.partition(';')
+		coding = coding.strip().lower()
+		if not coding:
+			continue
+		q = 1.0
+		match = re.search(r'\bq\s*=\s*([0-9.]+)', params)
+		if match:
+			try:
+				q = float(match.group(1))
+			except ValueError:
+				q = 0.0
+		accepted[coding] = q
+	return accepted
+
+
+class _FileIterator(object):
+
+	def __init__(self, f, block_size=64 * 1024):
+		self.f = f
+		self.block_size = block_size
+
+	def __iter__(self):
+		return iter(lambda: self.f.read(self.block_size), b'')
+
+	def close(self):
+		self.f.close()
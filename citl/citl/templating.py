@@ -0,0 +1,119 @@
+"""Template engine settings
+
+template_settings() builds the TEMPLATES setting. Outside DEBUG the Django engine compiles each template once per
+process through the cached loader; with DEBUG on it reloads templates from disk on every render, so edits show up
+without a restart (Django 2.0's cached loader never notices a changed file).
+
+With ``jinja2=True`` (and Jinja2 installed) a second, Jinja2 engine serves the templates under jinja2_templates/
+and <app>/jinja2/. Set ``SHOOTER_JINJA2_TEMPLATES = True`` as well to render the heaviest pages (the scorecard grid
+and the season list) with it; ``manage.py benchmark_templates`` compares the two. In settings.py::
+
+    from citl.templating import template_settings
+
+    TEMPLATES = template_settings(BASE_DIR, DEBUG)
+
+The Django engine is TimedDjangoTemplates, which lets RequestTimingMiddleware (citl/middleware.py) time each
+page's render through time_renders(). It renders exactly like DjangoTemplates.
+"""
+
+import os
+import threading
+
+from django.template.backends.django import DjangoTemplates
+from django.templatetags.static import static
+from django.urls import reverse
+
+LOADERS = [
+	'django.template.loaders.filesystem.Loader',
+	'django.template.loaders.app_directories.Loader',
+]
+
+CONTEXT_PROCESSORS = [
+	'django.template.context_processors.debug',
+	'django.template.context_processors.request',
+	'django.contrib.auth.context_processors.auth',
+	'django.contrib.messages.context_processors.messages',
+]
+
+
+def template_settings(base_dir, debug=False, jinja2=False):
+	if debug:
+		loaders = LOADERS
+	else:
+		loaders = [('django.template.loaders.cached.Loader', LOADERS)]
+
+	templates = [{
+		'BACKEND': 'citl.templating.TimedDjangoTemplates',
+		'DIRS': [os.path.join(base_dir, 'templates')],
+		'OPTIONS': {
+			'context_processors': CONTEXT_PROCESSORS,
+			'loaders': loaders,
+			'debug': debug,
+		},
+	}]
+
+	if jinja2:
+		templates.append({
+			'BACKEND': 'django.template.backends.jinja2.Jinja2',
+			'DIRS': [os.path.join(base_dir, 'jinja2_templates')],
+			'APP_DIRS': True,
+			'OPTIONS': {
+				'environment': 'citl.templating.environment',
+				# Jinja2 caches compiled templates itself; only stat the files for changes while developing
+				'auto_reload': debug,
+			},
+		})
+
+	return templates
+
+
+_renders = threading.local()
+
+
+def time_renders(timer):
+	"""Run every render on this thread through timer(render, context, request) until time_renders(None)
+	"""
+	_renders.timer = timer
+
+
+class TimedTemplate(object):
+	"""A backend template whose render() goes through the thread's timer, when there is one
+	"""
+
+	def __init__(self, template):
+		self.template = template
+
+	def __getattr__(self, name):
+		return getattr(self.template, name)
+
+	def render(self, context=None, request=None):
+		timer = getattr(_renders, 'timer', None)
+		if timer is None:
+			return self.template.render(context, request)
+		return timer(self.template.render, context, request)
+
+
+class TimedDjangoTemplates(DjangoTemplates):
+
+	def from_string(self, template_code):
+		return TimedTemplate(super(TimedDjangoTemplates, self).from_string(template_code))
+
+	def get_template(self, template_name):
+		return TimedTemplate(super(TimedDjangoTemplates, self).get_template(template_name))
+
+
+def url(name, *args):
+	return reverse(name, args=args)
+
+
+def environment(**options):
+	"""The Jinja2 environment: {{ static('style.css') }} and {{ url('shooter:season', 2018) }} as in Django templates
+	"""
+	from jinja2 import Environment
+
+	env = Environment(**options)
+	env.globals.update({
+		'static': static,
+		'url': url,
+	})
+	return env
@@ -13,13 +13,21 @@ Including another URLconf
     1. Import the include() function: from django.urls import include, path
     2. Add a URL to urlpatterns:  path('blog/', include('blog.urls'))
 """
+from django.conf import settings
 from django.contrib import admin
 from django.urls import path, include
 
 from . import views
 
+# Async read views when served over ASGI (see citl/asgi.py)
+if getattr(settings, 'SHOOTER_ASYNC_VIEWS', False):
+	IndexView = views.AsyncIndexView
+else:
+	IndexView = views.IndexView
+
 urlpatterns = [
-	path('', views.IndexView.as_view(), name='index'),
+	path('', IndexView.as_view(), name='index'),
+	path('health/', views.HealthView.as_view(), name='health'),
 	path('shooter/', include('shooter.urls')),
 	path('accounts/', include('django.contrib.auth.urls')),	# Add Django site authentication urls (for login, logout, password management)
     path('admin/', admin.site.urls),
@@ -1,13 +1,50 @@
 # https://docs.djangoproject.com/en/2.0/intro/tutorial01/
 
+from django.conf import settings
+from django.http import JsonResponse
 from django.shortcuts import render
 from django.views import View
 
+from .routers import check
+
 class IndexView(View):	
+
+	read_replica = True
+
 	def get(self, request):		
 	
 		context = {
 			'home': 'home',
 		}		
 
-		return render(request, 'index.html', context)
\ No newline at end of file
+		return render(request, 'index.html', context)
+
+
+class AsyncIndexView(View):
+	"""IndexView for ASGI deployments (settings.SHOOTER_ASYNC_VIEWS, see citl/asgi.py)
+	"""
+
+	read_replica = True
+
+	async def get(self, request):
+		# Not imported at the top: asgiref only ships with Django 3.0 and later
+		from asgiref.sync import sync_to_async
+
+		context = {
+			'home': 'home',
+		}
+
+		# base.html reads request.user, which loads the session and the user from the database. The ORM refuses to
+		# run on the event loop, so render in a worker thread
+		return await sync_to_async(render)(request, 'index.html', context)
+
+
+class HealthView(View):
+	"""Every database alias answers a query. 503 if the primary doesn't, for load balancer health checks
+	"""
+	def get(self, request):
+
+		databases = {alias: 'ok' if check(alias) else 'unavailable' for alias in settings.DATABASES}
+		status = 200 if databases.get('default') == 'ok' else 503
+
+		return JsonResponse({'databases': databases}, status=status)
@@ -13,4 +13,7 @@ from django.core.wsgi import get_wsgi_application
 
 os.environ.setdefault("DJANGO_SETTINGS_MODULE", "citl.settings")
 
-application = get_wsgi_application()
+from citl.staticfiles import StaticFilesApplication
+
+# Collected static files are served precompressed with far-future headers (see citl/staticfiles.py)
+application = StaticFilesApplication(get_wsgi_application())
@@ -2,6 +2,40 @@
 
 from django.contrib import admin
 
-from .models import Shooter, Team, Score
+from .models import Shooter, Team, Score, Season, Job
 
-admin.site.register([Shooter, Team, Score])
\ No newline at end of file
+
+@admin.register(Shooter)
+class ShooterAdmin(admin.ModelAdmin):
+	list_display = ('last_name', 'first_name', 'email', 'captain', 'user', 'rookie', 'guest')
+	search_fields = ('last_name', 'first_name', 'email')
+	# Captains get score entry for their team through this link, never through a matching email
+	raw_id_fields = ('user',)
+
+
+@admin.register(Score)
+class ScoreAdmin(admin.ModelAdmin):
+	# Score.__str__ follows team and shooter; join them up front instead of a query per row
+	list_display = ('team', 'shooter', 'season', 'week', 'date', 'bunker_one', 'bunker_two')
+	list_select_related = ('team', 'shooter')
+	list_filter = ('season', 'week')
+	# Searchable widget instead of a select listing every shooter in the league
+	autocomplete_fields = ('shooter',)
+
+
+@admin.register(Season)
+class SeasonAdmin(admin.ModelAdmin):
+	list_display = ('year', 'status', 'closed_at')
+	# Closing and reopening also freeze or drop the season's summary rows: use manage.py close_season
+	readonly_fields = ('status', 'closed_at')
+
+
+@admin.register(Job)
+class JobAdmin(admin.ModelAdmin):
+	list_display = ('pk', 'kind', 'status', 'progress', 'attempts', 'message', 'created_at', 'finished_at')
+	list_filter = ('status', 'kind')
+	# Written by the worker (manage.py run_jobs); only the queue fields are worth editing by hand
+	readonly_fields = ('progress', 'error', 'started_at', 'finished_at', 'heartbeat', 'worker')
+
+
+admin.site.register(Team)
@@ -0,0 +1,280 @@
+# Read-only JSON API
+#
+# Seasons, a season's teams, team scorecards, standings and shooters for the scoreboard display and mobile
+# clients. Every response is {"results": [...], "next": url or null} plus a few endpoint specific keys.
+#
+#   ?limit=N       page size for list endpoints (default 50, at most 200)
+#   ?after=CURSOR  keyset pagination: pass the cursor from the previous page's "next" link. Pages are found by
+#                  seeking past the last row's sort key, so deep pages cost the same as the first one
+#   ?fields=a,b    only return these keys for each result
+#
+# Responses carry a weak ETag built from the cache.py stamps of the data they show (bumped on every score write),
+# so polling clients get a 304 with If-None-Match until something changes. Bodies are cached between writes and
+# gzipped for clients that accept it.
+
+import base64
+import hashlib
+import json
+import re
+
+from django.core.cache import cache as django_cache
+from django.core.exceptions import ImproperlyConfigured
+from django.db.models import Q
+from django.http import Http404, HttpResponse, JsonResponse
+from django.urls import reverse
+from django.utils.cache import get_conditional_response, patch_cache_control, patch_vary_headers
+from django.utils.http import http_date
+from django.utils.text import compress_string
+from django.views import View
+
+from . import cache
+from .batch import score_shooters
+from .models import Roster, Shooter, ScorecardLine, Season
+from .standings import leaderboard, team_position
+from .stats import as_dict, career, season_history
+
+DEFAULT_LIMIT = 50
+MAX_LIMIT = 200
+
+re_accepts_gzip = re.compile(r'\bgzip\b')
+
+
+class BadRequest(Exception):
+	pass
+
+
+def keyset_page(queryset, ordering, after=None, limit=DEFAULT_LIMIT):
+	"""Return (rows, cursor) for one page of a values() queryset ordered by ordering (field names, '-' for
+	descending; the last one must be unique). cursor is None on the last page
+	"""
+	queryset = queryset.order_by(*ordering)
+
+	if after:
+		try:
+			last = json.loads(base64.urlsafe_b64decode(after.encode('ascii')).decode('utf-8'))
+		except (ValueError, UnicodeError):
+			raise BadRequest("Bad cursor")
+		if not isinstance(last, list) or len(last) != len(ordering):
+			raise BadRequest("Bad cursor")
+
+		# (a, b, c) > (x, y, z)  ==  a > x  or  (a = x and b > y)  or  (a = x and b = y and c > z)
+		seek = Q()
+		for i, field in enumerate(ordering):
+			name = field.lstrip('-')
+			lookup = name + ('__lt' if field.startswith('-') else '__gt')
+			step = Q(**{lookup: last[i]})
+			for prior, value in zip(ordering[:i], last):
+				step &= Q(**{prior.lstrip('-'): value})
+			seek |= step
+		queryset = queryset.filter(seek)
+
+	rows = list(queryset[:limit + 1])
+	if len(rows) <= limit:
+		return rows, None
+
+	rows = rows[:limit]
+	last = [rows[-1][field.lstrip('-')] for field in ordering]
+	return rows, base64.urlsafe_b64encode(json.dumps(last).encode('utf-8')).decode('ascii')
+
+
+class ApiView(View):
+	"""Base for the API endpoints. Subclasses set scopes (cache.py scopes, formatted with the URL kwargs) and
+	ordering. The response data comes from payload(request, **url_kwargs), a method of the subclass or a function
+	passed as as_view(payload=...); as_view() refuses a view without one
+	"""
+
+	scopes = ()
+	ordering = None
+	timeout = cache.PAGE_TIMEOUT
+	payload = None
+
+	@classmethod
+	def as_view(cls, **initkwargs):
+		if initkwargs.get('payload', cls.payload) is None:
+			raise ImproperlyConfigured("%s has no payload: define payload(request, **kwargs) or pass "
+									   "as_view(payload=...)" % cls.__name__)
+		return super(ApiView, cls).as_view(**initkwargs)
+
+	def get(self, request, **kwargs):
+		scope_stamps = cache.stamps(['league'] + [scope.format(**kwargs) for scope in self.scopes])
+		version = hashlib.md5((request.get_full_path() + repr(scope_stamps)).encode('utf-8')).hexdigest()
+		etag = 'W/"%s"' % version
+		last_modified = int(max(scope_stamps))
+
+		response = get_conditional_response(request, etag=etag, last_modified=last_modified)
+		if response is None:
+			gzip = bool(re_accepts_gzip.search(request.META.get('HTTP_ACCEPT_ENCODING', '')))
+			key = 'shooter:api:%s:%s' % (version, 'gzip' if gzip else 'identity')
+			cached = django_cache.get(key)
+			if cached is None:
+				try:
+					body = json.dumps(self.render(request, kwargs), separators=(',', ':')).encode('utf-8')
+				except BadRequest as e:
+					return JsonResponse({'error': str(e)}, status=400)
+				except Http404 as e:
+					return JsonResponse({'error': str(e)}, status=404)
+				encoding = None
+				if gzip and len(body) >= 200:
+					body, encoding = compress_string(body), 'gzip'
+				cached = (body, encoding)
+				django_cache.set(key, cached, self.timeout)
+
+			response = HttpResponse(cached[0], content_type='application/json')
+			if cached[1]:
+				response['Content-Encoding'] = cached[1]
+
+		response['ETag'] = etag
+		response['Last-Modified'] = http_date(last_modified)
+		patch_cache_control(response, max_age=0, must_revalidate=True)
+		patch_vary_headers(response, ['Accept-Encoding'])
+		return response
+
+	def render(self, request, kwargs):
+		data = self.payload(request, **kwargs)
+
+		fields = [f for f in request.GET.get('fields', '').split(',') if f]
+		if fields:
+			data['results'] = [{k: v for k, v in row.items() if k in fields} for row in data['results']]
+
+		return data
+
+	def page(self, request, queryset):
+		"""Keyset paginate a values() queryset on self.ordering. Returns (rows, next url)
+		"""
+		try:
+			limit = min(int(request.GET.get('limit', DEFAULT_LIMIT)), MAX_LIMIT)
+		except ValueError:
+			raise BadRequest("limit must be a number")
+		if limit < 1:
+			raise BadRequest("limit must be positive")
+
+		rows, cursor = keyset_page(queryset, self.ordering, request.GET.get('after'), limit)
+		if cursor is None:
+			return rows, None
+
+		params = request.GET.copy()
+		params['after'] = cursor
+		return rows, request.build_absolute_uri(request.path + '?' + params.urlencode())
+
+
+class SeasonsApi(ApiView):
+
+	scopes = ('seasons',)
+	ordering = ['-year']
+
+	def payload(self, request):
+		rows, next_url = self.page(request, Season.objects.values('year', 'status'))
+		return {
+			'results': [{
+				'season': row['year'],
+				'status': row['status'],
+				'teams': request.build_absolute_uri(reverse('shooter:api-teams', args=[row['year']])),
+				'standings': request.build_absolute_uri(reverse('shooter:api-standings', args=[row['year']])),
+			} for row in rows],
+			'next': next_url,
+		}
+
+
+class TeamsApi(ApiView):
+
+	scopes = ('season:{year}',)
+	ordering = ['team__team_name', 'team']
+
+	def payload(self, request, year):
+		teams = Roster.objects \
+			.filter(season=year) \
+			.values('team__team_name', 'team') \
+			.distinct()
+
+		rows, next_url = self.page(request, teams)
+		return {
+			'season': year,
+			'results': [{
+				'id': row['team'],
+				'team': row['team__team_name'],
+				'scorecard': request.build_absolute_uri(
+					reverse('shooter:api-scorecard', args=[year, row['team__team_name']])),
+			} for row in rows],
+			'next': next_url,
+		}
+
+
+class ScorecardApi(ApiView):
+
+	scopes = ('scorecard:{year}:{team}', 'standings:{year}')
+	ordering = ['shooter__last_name', 'shooter__first_name', 'shooter']
+
+	def payload(self, request, year, team):
+		lines = ScorecardLine.objects \
+			.filter(team__team_name=team, season=year) \
+			.values('shooter', 'shooter__first_name', 'shooter__last_name', 'weeks', 'weeks_shot', 'average')
+
+		rows, next_url = self.page(request, lines)
+		if not rows and not request.GET.get('after'):
+			raise Http404("No scorecard for " + team + " in " + str(year))
+
+		standing = team_position(year, team)
+		all_weeks = ScorecardLine.objects.filter(team__team_name=team, season=year).values_list('weeks', flat=True)
+		return {
+			'season': year,
+			'team': team,
+			'place': standing['place'] if standing else None,
+			'points': standing['points'] if standing else None,
+			'week_totals': score_shooters([[int(w) for w in weeks.split(",")] for weeks in all_weeks]).week_totals,
+			'results': [{
+				'shooter': row['shooter'],
+				'name': row['shooter__first_name'] + " " + row['shooter__last_name'],
+				'weeks': [int(w) for w in row['weeks'].split(",")],
+				'weeks_shot': row['weeks_shot'],
+				'average': row['average'],
+			} for row in rows],
+			'next': next_url,
+		}
+
+
+class StandingsApi(ApiView):
+
+	scopes = ('standings:{year}',)
+
+	def payload(self, request, year):
+		return {
+			'season': year,
+			'results': leaderboard(year),
+			'next': None,
+		}
+
+
+class ShootersApi(ApiView):
+
+	scopes = ('shooters',)
+	ordering = ['last_name', 'first_name', 'id']
+
+	def payload(self, request):
+		shooters = Shooter.objects.values('id', 'first_name', 'last_name', 'rookie')
+
+		rows, next_url = self.page(request, shooters)
+		return {
+			'results': [dict(row, history=request.build_absolute_uri(reverse('shooter:api-shooter', args=[row['id']])))
+						for row in rows],
+			'next': next_url,
+		}
+
+
+class ShooterApi(ApiView):
+
+	scopes = ('shooter:{shooter_id}',)
+
+	def payload(self, request, shooter_id):
+		try:
+			shooter = Shooter.objects.get(pk=shooter_id)
+		except Shooter.DoesNotExist:
+			raise Http404("No such shooter")
+
+		history = season_history(shooter)
+		return {
+			'id': shooter.pk,
+			'name': str(shooter),
+			'career': career(history),
+			'results': [as_dict(s) for s in history],
+			'next': None,
+		}
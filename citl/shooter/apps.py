@@ -3,3 +3,6 @@ from django.apps import AppConfig
 
 class ShooterConfig(AppConfig):
     name = 'shooter'
+
+    def ready(self):
+        from . import signals  # noqa: F401
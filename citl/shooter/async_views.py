@@ -0,0 +1,139 @@
+# Async versions of the public read views
+#
+# Used instead of the views.py classes when settings.SHOOTER_ASYNC_VIEWS is True and the site is served by an
+# ASGI server from citl/asgi.py, so one process can hold many league night requests waiting on the database or
+# cache without a sync worker per request. They read through Django's async ORM interface (async iteration of
+# querysets), and LiveView streams from an async generator, which needs Django 4.2 or later.
+#
+# Pages and context are the same as the sync views; keep the two in step.
+
+import datetime
+
+import django
+from asgiref.sync import sync_to_async
+from django.core.exceptions import ImproperlyConfigured
+from django.http import HttpResponse, StreamingHttpResponse
+from django.shortcuts import render
+from django.views import View
+
+from . import live
+from .models import ScorecardLine, Season, SeasonSummary
+from .batch import score_shooters
+from .cache import cached_page, data_version
+from .rosters import season_teams
+from .standings import team_position
+from .views import heavy_template_engine
+
+if django.VERSION < (4, 2):
+	raise ImproperlyConfigured("SHOOTER_ASYNC_VIEWS needs Django 4.2 or later (async ORM queries and streaming)")
+
+
+class SeasonsView(View):
+
+	template_name = 'shooter/seasons.html'
+	read_replica = True				# see citl/routers.py
+
+	@cached_page('seasons')
+	async def get(self, request):
+
+		current_year = datetime.datetime.now().year
+		# Before the queries: the fragment is cached under this version, so right after a write it reads the primary
+		version = await sync_to_async(data_version)('seasons', 'season:%s' % current_year)
+
+		# The season list is the Season table; only the current season lists its teams
+		seasons = [s async for s in Season.objects.order_by('-year')]
+		current_teams = [team async for team in season_teams(current_year)]
+
+		context = {
+			'seasons': seasons,
+			'current_teams': current_teams,
+			'current_year': current_year,
+			'version': version,
+		}
+
+		return render(request, self.template_name, context, using=heavy_template_engine())
+
+
+class SeasonView(View):
+
+	template_name = 'shooter/season.html'
+	read_replica = True
+
+	@cached_page('season:{year}')
+	async def get(self, request, year):
+
+		# A closed season's teams in final standing order, otherwise from the season's rosters
+		teams = [team async for team in SeasonSummary.objects \
+			.filter(season__year=year) \
+			.order_by('position', 'team_name') \
+			.values_list('team_name', flat=True)]
+		if not teams:
+			teams = [team async for team in season_teams(year)]
+
+		context = {
+			'teams': teams,
+			'year': year,
+		}
+
+		return render(request, self.template_name, context)
+
+
+class ScorecardView(View):
+
+	read_replica = True
+
+	@cached_page('scorecard:{year}:{team}', 'standings:{year}')
+	async def get(self, request, year, team):
+
+		week_range = range(0,16)
+		# Before the queries, as in SeasonsView
+		version = await sync_to_async(data_version)('scorecard:%s:%s' % (year, team))
+
+		lines = [line async for line in ScorecardLine.objects \
+				.filter(team__team_name=team, season=year) \
+				.select_related('shooter') \
+				.order_by('shooter__last_name', 'shooter__first_name')]
+
+		# Total targets row
+		week_totals = score_shooters([line.week_totals for line in lines]).week_totals
+		total_targets = dict(zip(week_range, week_totals))
+
+		context = {
+			'scores': lines,
+			'team': team,
+			'weekRange': week_range,
+			'season': year,
+			'totalTargets': total_targets,
+			# Cached between writes; on a miss it is one aggregate query, run in a thread
+			'standing': await sync_to_async(team_position)(year, team),
+			'version': version,
+		}
+
+		return render(request, 'shooter/scorecard.html', context, using=heavy_template_engine())
+
+
+class LiveView(View):
+	"""Server-Sent Events stream of a season's scorecard and standings changes. An open stream waits on an
+	asyncio queue (live.async_stream()), so it holds no thread and never blocks the event loop
+	"""
+
+	async def get(self, request, year):
+
+		subscriber = live.hub.subscribe(live.AsyncSubscriber())
+		if subscriber is None:
+			response = HttpResponse("Too many live viewers, try again shortly", status=503, content_type='text/plain')
+			response['Retry-After'] = '30'
+			return response
+
+		try:
+			last_event_id = int(request.META.get('HTTP_LAST_EVENT_ID', ''))
+		except ValueError:
+			last_event_id = None
+
+		response = StreamingHttpResponse(
+			live.async_stream(subscriber, year, request.GET.get('team'), last_event_id),
+			content_type='text/event-stream')
+		response['Cache-Control'] = 'no-cache'
+		# Stop nginx from buffering the stream
+		response['X-Accel-Buffering'] = 'no'
+		return response
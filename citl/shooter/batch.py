@@ -0,0 +1,110 @@
+# Batch scoring
+#
+# Scores a whole season at once from a dense shooters x 16 weeks matrix of week totals (bunker_one + bunker_two,
+# 0 for weeks not shot). Uses NumPy when it is installed and falls back to flat integer arrays otherwise; both
+# paths give the same results.
+
+from array import array
+from collections import namedtuple
+
+try:
+	import numpy
+except ImportError:
+	numpy = None
+
+WEEKS = 16
+
+SeasonScores = namedtuple('SeasonScores', ['week_totals', 'averages', 'weeks_shot'])
+
+
+def score_shooters(matrix, entered=None):
+	"""Score a shooters x 16 matrix in one pass.
+
+	Returns SeasonScores with the summed week totals (16 ints), and per shooter the league average and weeks
+	shot. The average is average(W1:W15) once a shooter has shot two or more weeks, otherwise average(W0:W15);
+	weeks with a zero total are not counted.
+
+	Weeks shot counts the league weeks (W1-W15) with a score entered, zero or not, like ScorecardLine and
+	ShooterStats. entered is a 0/1 matrix parallel to matrix marking those weeks; without it every non-zero week
+	counts as entered.
+	"""
+	if numpy is not None:
+		return _score_numpy(matrix, entered)
+	return _score_python(matrix, entered)
+
+
+def team_totals(matrix, teams):
+	"""Sum week totals per team. teams is a sequence parallel to the matrix rows; returns {team: [16 ints]}
+	"""
+	if numpy is not None:
+		m = _as_numpy(matrix)
+		keys, index = numpy.unique(numpy.asarray(teams), return_inverse=True)
+		totals = numpy.zeros((len(keys), WEEKS), dtype=numpy.int64)
+		numpy.add.at(totals, index, m)
+		return {key: row for key, row in zip(keys.tolist(), totals.tolist())}
+
+	totals = {}
+	flat = _as_array(matrix)
+	for i, team in enumerate(teams):
+		if team not in totals:
+			totals[team] = array('q', bytes(8 * WEEKS))
+		row = totals[team]
+		for w in range(WEEKS):
+			row[w] += flat[i * WEEKS + w]
+	return {team: row.tolist() for team, row in totals.items()}
+
+
+def _as_numpy(matrix):
+	return numpy.asarray(matrix, dtype=numpy.int64).reshape(-1, WEEKS)
+
+
+def _as_array(matrix):
+	flat = array('q')
+	for row in matrix:
+		flat.extend(row)
+	return flat
+
+
+def _score_numpy(matrix, entered):
+	m = _as_numpy(matrix)
+	shot = m != 0
+	weeks_shot = (_as_numpy(entered) != 0 if entered is not None else shot)[:, 1:].sum(axis=1)
+
+	shot_all = shot.sum(axis=1)
+	shot_league = shot[:, 1:].sum(axis=1)
+	sum_all = m.sum(axis=1)
+	sum_league = m[:, 1:].sum(axis=1)
+
+	averages = numpy.where(shot_league >= 2,
+						   sum_league / numpy.maximum(shot_league, 1),
+						   sum_all / numpy.maximum(shot_all, 1))
+
+	return SeasonScores(m.sum(axis=0).tolist(), [round(a, 2) for a in averages.tolist()], weeks_shot.tolist())
+
+
+def _score_python(matrix, entered):
+	flat = _as_array(matrix)
+	flat_entered = _as_array(entered) if entered is not None else flat
+	week_totals = array('q', bytes(8 * WEEKS))
+	averages = []
+	weeks_shot = []
+
+	for start in range(0, len(flat), WEEKS):
+		row = flat[start:start + WEEKS]
+		shot_all = shot_league = sum_all = sum_league = 0
+		for w, total in enumerate(row):
+			week_totals[w] += total
+			if total != 0:
+				shot_all += 1
+				sum_all += total
+				if w != 0:
+					shot_league += 1
+					sum_league += total
+
+		if shot_league >= 2:
+			averages.append(round(sum_league / shot_league, 2))
+		else:
+			averages.append(round(sum_all / max(shot_all, 1), 2))
+		weeks_shot.append(sum(1 for w in range(start + 1, start + WEEKS) if flat_entered[w] != 0))
+
+	return SeasonScores(week_totals.tolist(), averages, weeks_shot)
@@ -0,0 +1,244 @@
+# View benchmarks
+#
+# Seeds a synthetic league into the current database and drives every shooter view through the test client,
+# recording query count, wall time and peak Python memory per view. Used by `manage.py benchmark_views`, which runs
+# it against a throwaway test database (SQLite or PostgreSQL, whatever DATABASES['default'] points at).
+#
+# render_benchmarks() times the scorecard template alone for a synthetic team (no database), under each template
+# setup from citl/templating.py. Used by `manage.py benchmark_templates`.
+
+import datetime
+import itertools
+import os
+import random
+import statistics
+import time
+import tracemalloc
+
+from django.conf import settings
+from django.contrib.auth.models import AnonymousUser, Group, User
+from django.core.cache import cache
+from django.db import connection, transaction
+from django.template.backends.django import DjangoTemplates
+from django.test import Client, RequestFactory
+from django.test.utils import CaptureQueriesContext
+from django.urls import reverse
+
+from citl.templating import CONTEXT_PROCESSORS, LOADERS
+
+from .models import Shooter, Team, Score, ScorecardLine
+from .permissions import ADMIN_GROUP
+from .scorecards import rebuild_scorecards
+from .scoring import run_season_scores
+from .rosters import refresh_rosters
+from .seasons import ensure_seasons
+from .stats import refresh_stats
+
+
+def seed_league(teams=8, shooters=10, seasons=3, weeks=15, seed=0):
+	"""Bulk load a synthetic league ending with the current season. Returns the list of Teams
+	"""
+	rng = random.Random(seed)
+	this_year = datetime.datetime.now().year
+	years = range(this_year - seasons + 1, this_year + 1)
+
+	team_rows = Team.objects.bulk_create([Team(team_name="Team %02d" % t) for t in range(teams)])
+	if not team_rows[0].pk:
+		# Backends without RETURNING on bulk inserts
+		team_rows = list(Team.objects.order_by('pk'))
+
+	shooter_rows = [
+		Shooter(first_name="Shooter%d" % s, last_name="Team%02d" % t, email="s%d.t%d@example.com" % (s, t),
+				rookie=(s == 0))
+		for t in range(teams) for s in range(shooters)]
+	for shooter in shooter_rows:
+		shooter.set_search_keys()
+	shooter_rows = Shooter.objects.bulk_create(shooter_rows)
+	if not shooter_rows[0].pk:
+		shooter_rows = list(Shooter.objects.order_by('pk'))
+
+	scores = []
+	for year in years:
+		for t, team in enumerate(team_rows):
+			for shooter in shooter_rows[t * shooters:(t + 1) * shooters]:
+				scores.append(Score(shooter=shooter, team=team, date=datetime.date(year, 5, 1), season=year,
+									week=0, bunker_one=1, bunker_two=34))
+				for week in range(1, weeks + 1):
+					scores.append(Score(shooter=shooter, team=team, date=datetime.date(year, 5, 1 + week),
+										season=year, week=week,
+										bunker_one=rng.randint(10, 25), bunker_two=rng.randint(10, 25)))
+	ensure_seasons(years)
+	Score.objects.bulk_create(scores)
+
+	rebuild_scorecards()
+	refresh_stats()
+	refresh_rosters()
+	for year in years:
+		run_season_scores(year)
+
+	return team_rows
+
+
+def _measure(client, method, url, data, repeat, rollback):
+	"""Time one view. Write views run inside a rolled back transaction so every repetition sees the same data
+	"""
+	times = []
+	queries = 0
+	peak = 0
+	status = None
+
+	for _ in range(repeat):
+		cache.clear()
+		tracemalloc.start()
+		with transaction.atomic():
+			with CaptureQueriesContext(connection) as captured:
+				start = time.perf_counter()
+				response = getattr(client, method)(url, data)
+				times.append(time.perf_counter() - start)
+			if rollback:
+				transaction.set_rollback(True)
+		peak = max(peak, tracemalloc.get_traced_memory()[1])
+		tracemalloc.stop()
+		queries = len(captured.captured_queries)
+		status = response.status_code
+
+	return {
+		'status': status,
+		'queries': queries,
+		'time_ms': round(statistics.median(times) * 1000, 2),
+		'peak_kb': round(peak / 1024.0, 1),
+	}
+
+
+def run_benchmarks(teams, repeat=5):
+	"""Drive every shooter view once per repetition. Returns {view: measurements}
+	"""
+	this_year = datetime.datetime.now().year
+	team = teams[0]
+	roster = list(Shooter.objects.filter(score__team=team, score__season=this_year).distinct())
+
+	admin = User.objects.create_user('benchmark-admin', password='benchmark')
+	admin.groups.add(Group.objects.get_or_create(name=ADMIN_GROUP)[0])
+	anonymous = Client()
+	client = Client()
+	client.force_login(admin)
+
+	new_shooter = {
+		'team_name': team.team_name, 'first_name': 'Bench', 'last_name': 'Mark', 'email': 'bench@example.com',
+	}
+	new_scores = {
+		'date': datetime.date(this_year, 9, 1).isoformat(), 'week': 15,
+		'form-TOTAL_FORMS': len(roster), 'form-INITIAL_FORMS': len(roster),
+		'form-MIN_NUM_FORMS': 0, 'form-MAX_NUM_FORMS': 1000,
+	}
+	for i, shooter in enumerate(roster):
+		new_scores['form-%d-shooter' % i] = shooter.pk
+		new_scores['form-%d-bunker_one' % i] = 20
+		new_scores['form-%d-bunker_two' % i] = 21
+	# Week 15 is already seeded, so post to the first unshot week if there is one
+	shot = set(Score.objects.filter(team=team, season=this_year).values_list('week', flat=True))
+	unshot = [w for w in range(1, 16) if w not in shot]
+	if unshot:
+		new_scores['week'] = unshot[0]
+
+	cases = [
+		('SeasonsView', anonymous, 'get', reverse('shooter:seasons'), None, False),
+		('SeasonView', anonymous, 'get', reverse('shooter:season', args=[this_year - 1]), None, False),
+		('ScorecardView', anonymous, 'get', reverse('shooter:scorecard', args=[this_year, team.team_name]), None, False),
+		('StandingsView', anonymous, 'get', reverse('shooter:standings', args=[this_year]), None, False),
+		('ShooterView', anonymous, 'get', reverse('shooter:shooter', args=[roster[0].pk]), None, False),
+		('AdministrationView.get', client, 'get', reverse('shooter:administration'), None, False),
+		('AdministrationView.run_scores', client, 'post', reverse('shooter:administration'), {'run_scores': '1'}, True),
+		('NewShooterView.get', client, 'get', reverse('shooter:newshooter'), None, False),
+		('NewShooterView.post', client, 'post', reverse('shooter:newshooter'), new_shooter, True),
+		('NewScoreView.get', client, 'get', reverse('shooter:newscore', args=[team.team_name]), None, False),
+		('NewScoreView.post', client, 'post', reverse('shooter:newscore', args=[team.team_name]), new_scores, True),
+	]
+
+	return {name: _measure(c, method, url, data, repeat, rollback)
+			for name, c, method, url, data, rollback in cases}
+
+
+def compare(results, baseline, threshold):
+	"""Regressions against a baseline: more queries at all, or wall time over baseline * (1 + threshold)
+	"""
+	regressions = []
+	for name, result in sorted(results.items()):
+		base = baseline.get(name)
+		if base is None:
+			continue
+		if result['queries'] > base['queries']:
+			regressions.append("%s: %d queries (baseline %d)" % (name, result['queries'], base['queries']))
+		if result['time_ms'] > base['time_ms'] * (1 + threshold):
+			regressions.append("%s: %.2f ms (baseline %.2f ms)" % (name, result['time_ms'], base['time_ms']))
+	return regressions
+
+
+def synthetic_scorecard(shooters=30, seed=0):
+	"""Template context for a full season scorecard of one team, built in memory
+	"""
+	rng = random.Random(seed)
+	week_range = range(0, 16)
+	lines = []
+	for s in range(shooters):
+		weeks = [0] + [rng.choice([0, rng.randint(20, 50)]) for _ in range(15)]
+		shot = [w for w in weeks[1:] if w]
+		lines.append(ScorecardLine(
+			shooter=Shooter(pk=s + 1, first_name="Shooter%d" % s, last_name="Bench"), season=2018,
+			weeks=",".join(str(w) for w in weeks), weeks_shot=len(shot),
+			average=round(sum(shot) / float(len(shot)), 2) if shot else 0))
+
+	return {
+		'scores': lines,
+		'team': "Bench Team",
+		'weekRange': week_range,
+		'season': 2018,
+		'totalTargets': dict(zip(week_range, [sum(line.week_totals[w] for line in lines) for w in week_range])),
+		'standing': None,
+	}
+
+
+def _engines():
+	"""(name, backend, fresh fragment version per render?) for every template setup worth comparing
+	"""
+	dirs = [os.path.join(settings.BASE_DIR, 'templates')]
+	engines = [
+		('django', DjangoTemplates({'NAME': 'bench-django', 'DIRS': dirs, 'APP_DIRS': False, 'OPTIONS': {
+			'context_processors': CONTEXT_PROCESSORS, 'loaders': LOADERS}}), True),
+		('django, cached loader', DjangoTemplates({'NAME': 'bench-cached', 'DIRS': dirs, 'APP_DIRS': False,
+			'OPTIONS': {'context_processors': CONTEXT_PROCESSORS,
+						'loaders': [('django.template.loaders.cached.Loader', LOADERS)]}}), True),
+	]
+	engines.append(('django, cached loader + fragment hit', engines[1][1], False))
+
+	try:
+		from django.template.backends.jinja2 import Jinja2
+		engines.append(('jinja2', Jinja2({'NAME': 'bench-jinja2',
+				'DIRS': [os.path.join(settings.BASE_DIR, 'jinja2_templates')], 'APP_DIRS': True,
+				'OPTIONS': {'environment': 'citl.templating.environment'}}), True))
+	except ImportError:
+		pass
+
+	return engines
+
+
+def render_benchmarks(shooters=30, repeat=200):
+	"""Median time to load and render shooter/scorecard.html under each template setup. Returns {setup: ms}
+	"""
+	context = synthetic_scorecard(shooters)
+	request = RequestFactory().get('/shooter/2018/Bench%20Team/')
+	request.user = AnonymousUser()
+	versions = itertools.count()
+	cache.clear()
+
+	results = {}
+	for name, engine, fresh_version in _engines():
+		times = []
+		# The first render warms the loader and fragment caches; it isn't counted
+		for _ in range(repeat + 1):
+			context['version'] = next(versions) if fresh_version else 'bench'
+			start = time.perf_counter()
+			engine.get_template('shooter/scorecard.html').render(context, request)
+			times.append(time.perf_counter() - start)
+		results[name] = round(statistics.median(times[1:]) * 1000, 3)
+	return results
@@ -0,0 +1,161 @@
+# Page caching for the public league pages
+#
+# Each page depends on a few scopes ("seasons", "season:2018", "scorecard:2018:Team Name", plus "league" for
+# everything). Every scope has a stamp in the cache framework holding the time of its newest write; the signal
+# receivers bump stamps when a Score, Team or Shooter changes. A cached page is keyed on its path and the stamps
+# it depends on, so a bump invalidates exactly the pages that show the changed data, and the newest stamp doubles
+# as Last-Modified/ETag for conditional GETs. data_version() gives templates the same stamps as a key for their
+# {% cache %} fragments.
+#
+# Works with any Django cache backend: the default locmem cache for development and tests, a file based or
+# memcached backend in production (CACHES['default'] in settings).
+
+import asyncio
+import hashlib
+import time
+from functools import wraps
+
+from django.core.cache import cache
+from django.http import HttpResponse
+from django.utils.cache import get_conditional_response, patch_cache_control, patch_vary_headers
+from django.utils.http import http_date, quote_etag
+
+from citl import routers
+
+PAGE_TIMEOUT = 60 * 60 * 24
+
+
+def _stamp_key(scope):
+	return 'shooter:stamp:' + hashlib.md5(scope.encode('utf-8')).hexdigest()
+
+
+def bump(*scopes):
+	"""Record a write to the given scopes, invalidating every cached page that depends on them
+	"""
+	now = time.time()
+	cache.set_many({_stamp_key(scope): now for scope in scopes}, None)
+
+
+def stamps(scopes):
+	"""Newest write time for each scope. Scopes the cache has never seen (or has lost) start now.
+
+	Whatever the request reads next may be cached under these stamps, so after a recent write it reads from the
+	primary rather than a replica that may not have the write yet (see citl/routers.py)
+	"""
+	keys = [_stamp_key(scope) for scope in scopes]
+	found = cache.get_many(keys)
+	missing = [key for key in keys if key not in found]
+	if missing:
+		now = time.time()
+		for key in missing:
+			cache.add(key, now, None)
+		found.update(cache.get_many(missing))
+	scope_stamps = [found.get(key, time.time()) for key in keys]
+	if scope_stamps:
+		routers.recent_write(max(scope_stamps))
+	return scope_stamps
+
+
+def data_version(*scopes):
+	"""A short key that changes whenever one of scopes (or the league) is written. Templates use it to version
+	their {% cache %} fragments, so logged in users (who never get a cached page) still skip the heavy loops
+	"""
+	scope_stamps = stamps(['league'] + list(scopes))
+	return hashlib.md5(repr(scope_stamps).encode('utf-8')).hexdigest()[:12]
+
+
+def score_changed(season, team_name):
+	"""A Score was written for team_name in season
+	"""
+	if season is not None:
+		bump('seasons', 'season:%s' % season, 'scorecard:%s:%s' % (season, team_name))
+
+
+def team_changed():
+	# Team names appear on (and in the URLs of) every public page
+	bump('league')
+
+
+def shooter_changed(seasons_and_teams):
+	"""A Shooter's details changed; seasons_and_teams are the (season, team_name) scorecards they appear on
+	"""
+	scopes = ['scorecard:%s:%s' % (season, team_name) for season, team_name in seasons_and_teams]
+	if scopes:
+		bump(*scopes)
+
+
+def cached_page(*scope_formats, timeout=PAGE_TIMEOUT):
+	"""Cache a View.get() for anonymous visitors and answer conditional GETs with 304s.
+
+	scope_formats are formatted with the URL kwargs, e.g. cached_page('season:{year}').
+	Logged in users see their name in the page header, so they always get a fresh render.
+	Works on async get() methods too (see async_views.py).
+	"""
+	def decorator(get):
+		if asyncio.iscoroutinefunction(get):
+			from asgiref.sync import sync_to_async
+
+			@wraps(get)
+			async def async_wrapper(self, request, *args, **kwargs):
+				if not await sync_to_async(lambda: request.user.is_anonymous)():
+					return await get(self, request, *args, **kwargs)
+
+				page = await sync_to_async(_page_lookup)(request, scope_formats, kwargs)
+				if page.response is None:
+					page.response = await get(self, request, *args, **kwargs)
+					await sync_to_async(page.store)(timeout)
+				return page.finish()
+			return async_wrapper
+
+		@wraps(get)
+		def wrapper(self, request, *args, **kwargs):
+			if not request.user.is_anonymous:
+				return get(self, request, *args, **kwargs)
+
+			page = _page_lookup(request, scope_formats, kwargs)
+			if page.response is None:
+				page.response = get(self, request, *args, **kwargs)
+				page.store(timeout)
+			return page.finish()
+		return wrapper
+	return decorator
+
+
+class _Page(object):
+
+	def __init__(self, version, etag, last_modified, response):
+		self.version = version
+		self.etag = etag
+		self.last_modified = last_modified
+		self.response = response
+
+	def store(self, timeout):
+		if self.response.status_code == 200:
+			cache.set('shooter:page:' + self.version, (self.response.content, self.response['Content-Type']), timeout)
+
+	def finish(self):
+		response = self.response
+		response['ETag'] = self.etag
+		response['Last-Modified'] = http_date(self.last_modified)
+		# Always revalidate; the ETag makes that a cheap 304
+		patch_cache_control(response, max_age=0, must_revalidate=True)
+		patch_vary_headers(response, ['Cookie'])
+		return response
+
+
+def _page_lookup(request, scope_formats, kwargs):
+	"""Version the page from its scopes' stamps. The _Page has a response already for a 304 or a cache hit
+	"""
+	scopes = ['league'] + [scope.format(**kwargs) for scope in scope_formats]
+	scope_stamps = stamps(scopes)
+	version = hashlib.md5((request.get_full_path() + repr(scope_stamps)).encode('utf-8')).hexdigest()
+	etag = quote_etag(version)
+	last_modified = int(max(scope_stamps))
+
+	response = get_conditional_response(request, etag=etag, last_modified=last_modified)
+	if response is None:
+		cached = cache.get('shooter:page:' + version)
+		if cached is not None:
+			response = HttpResponse(cached[0], content_type=cached[1])
+
+	return _Page(version, etag, last_modified, response)
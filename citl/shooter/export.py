@@ -0,0 +1,76 @@
+# Streaming export of league data
+#
+# Rows are read with .iterator(), which uses a server-side cursor on PostgreSQL, and encoded one line at a time,
+# so memory use stays flat however many seasons are exported. Used by ExportView (StreamingHttpResponse) and the
+# export_scores management command.
+
+import csv
+import json
+
+from .models import Score, Scorecard, ScorecardLine
+
+CHUNK_SIZE = 2000
+
+EXPORTS = {
+	'scores': {
+		'queryset': lambda: Score.objects.order_by('season', 'team__team_name', 'shooter__last_name',
+												   'shooter__first_name', 'shooter', 'week'),
+		'columns': [('season', 'season'), ('team', 'team__team_name'), ('shooter_id', 'shooter'),
+					('first_name', 'shooter__first_name'), ('last_name', 'shooter__last_name'), ('date', 'date'),
+					('week', 'week'), ('bunker_one', 'bunker_one'), ('bunker_two', 'bunker_two')],
+	},
+	'lines': {
+		'queryset': lambda: ScorecardLine.objects.order_by('season', 'team__team_name', 'shooter__last_name',
+														   'shooter__first_name', 'shooter'),
+		'columns': [('season', 'season'), ('team', 'team__team_name'), ('shooter_id', 'shooter'),
+					('first_name', 'shooter__first_name'), ('last_name', 'shooter__last_name'), ('weeks', 'weeks'),
+					('weeks_shot', 'weeks_shot'), ('average', 'average')],
+	},
+	'scorecards': {
+		'queryset': lambda: Scorecard.objects.order_by('season', 'team__team_name', 'week'),
+		'columns': [('season', 'season'), ('team', 'team__team_name'), ('week', 'week'),
+					('total_targets', 'total_targets'), ('rank_points', 'rank_points'), ('bonus_points', 'bonus_points')],
+	},
+}
+
+FORMATS = {
+	'csv': 'text/csv',
+	'ndjson': 'application/x-ndjson',
+}
+
+
+def export_rows(kind, season=None):
+	"""Return (header, rows) for an export kind; rows is a lazy iterator of value tuples
+	"""
+	export = EXPORTS[kind]
+	queryset = export['queryset']()
+	if season is not None:
+		queryset = queryset.filter(season=season)
+	header = [column for column, field in export['columns']]
+	fields = [field for column, field in export['columns']]
+	return header, queryset.values_list(*fields).iterator(chunk_size=CHUNK_SIZE)
+
+
+class _Echo(object):
+	# csv.writer only needs write(); hand each encoded line straight back instead of buffering
+	def write(self, value):
+		return value
+
+
+def stream(kind, fmt, season=None):
+	"""Generate the export as encoded text lines
+	"""
+	header, rows = export_rows(kind, season)
+
+	if fmt == 'csv':
+		writer = csv.writer(_Echo())
+		yield writer.writerow(header)
+		for row in rows:
+			yield writer.writerow(row)
+
+	elif fmt == 'ndjson':
+		for row in rows:
+			yield json.dumps(dict(zip(header, row)), default=str) + "\n"
+
+	else:
+		raise ValueError("Unknown export format " + fmt)
@@ -28,6 +28,10 @@ class ShooterForm(forms.ModelForm):
 		fields	= ['first_name', 'last_name', 'email', 'rookie', 'guest', 'captain']
 
 
+class ImportForm(forms.Form):
+	score_sheet = forms.FileField(label='Score Sheet (CSV)')
+
+
 class DateInput(forms.DateInput):
 	input_type = 'date'
 
@@ -41,15 +45,46 @@ class ScoreFormTeam(forms.ModelForm):
 		}
 
 
-class ScoreFormWeek(forms.ModelForm):
-	class Meta:
-		model = Score
-		fields = ['shooter', 'bunker_one', 'bunker_two']
+class RosterChoiceField(forms.ChoiceField):
+	"""Shooter dropdown over a roster loaded once per request, so a formset of these renders and validates
+	without a query per form
+	"""
 
-		initial = {
-			'bunker_one': 0,
-			'bunker_two': 0,
-		}
+	def __init__(self, roster=(), **kwargs):
+		super(RosterChoiceField, self).__init__(**kwargs)
+		self.roster = roster
+
+	@property
+	def roster(self):
+		return list(self._roster.values())
+
+	@roster.setter
+	def roster(self, shooters):
+		self._roster = {s.pk: s for s in shooters}
+		self.choices = [('', '---------')] + [(s.pk, str(s)) for s in shooters]
+
+	def to_python(self, value):
+		if value in self.empty_values:
+			return None
+		try:
+			return self._roster[int(value)]
+		except (KeyError, TypeError, ValueError):
+			raise forms.ValidationError(self.error_messages['invalid_choice'], code='invalid_choice',
+										params={'value': value})
+
+	def validate(self, value):
+		# to_python already checked value against the roster
+		forms.Field.validate(self, value)
+
+
+class ScoreFormWeek(forms.Form):
+	shooter = RosterChoiceField()
+	bunker_one = forms.IntegerField(initial=0)
+	bunker_two = forms.IntegerField(initial=0)
+
+	def __init__(self, *args, roster=(), **kwargs):
+		super(ScoreFormWeek, self).__init__(*args, **kwargs)
+		self.fields['shooter'].roster = roster
 
 # Forms
 
@@ -0,0 +1,186 @@
+# Bulk import of score sheets
+#
+# Loads CSV score sheets (team, shooter, date, week, bunker_one, bunker_two; optionally first_name/last_name
+# instead of shooter, and email) in a fixed number of queries: teams and shooters are resolved or created in
+# batches, duplicates are rejected in memory against the existing (shooter, season, week) keys, and scores go in
+# with bulk_create in chunked transactions. Used by the import_scores command and ImportView (through a job).
+
+import csv
+import datetime
+import time
+
+from django.db import transaction
+
+from . import cache, rosters, seasons, standings
+from .models import Shooter, Team, Score
+from .scorecards import rebuild_scorecards
+from .search import shooter_keys
+from .stats import refresh_stats
+
+CHUNK_SIZE = 1000
+REQUIRED = ('team', 'date', 'week', 'bunker_one', 'bunker_two')
+
+
+class SheetError(Exception):
+	pass
+
+
+class ImportResult(object):
+
+	def __init__(self):
+		self.rows = 0
+		self.created = 0
+		self.duplicates = 0
+		self.teams_created = 0
+		self.shooters_created = 0
+		self.seconds = 0.0
+
+	@property
+	def rows_per_second(self):
+		return self.rows / self.seconds if self.seconds else 0.0
+
+	def __str__(self):
+		return "Imported %d of %d scores (%d duplicates skipped, %d shooters and %d teams created) " \
+			   "in %.2fs, %d rows/s" % (self.created, self.rows, self.duplicates, self.shooters_created,
+										self.teams_created, self.seconds, self.rows_per_second)
+
+
+def read_sheet(lines):
+	"""Parse CSV lines into score dicts. Raises SheetError listing every bad row
+	"""
+	reader = csv.DictReader(lines)
+	columns = set(f.strip().lower() for f in reader.fieldnames or [])
+	missing = [c for c in REQUIRED if c not in columns]
+	if 'shooter' not in columns and not {'first_name', 'last_name'} <= columns:
+		missing.append('shooter (or first_name and last_name)')
+	if missing:
+		raise SheetError("Missing columns: " + ", ".join(missing))
+
+	rows = []
+	errors = []
+	for line, raw in enumerate(reader, start=2):
+		row = {k.strip().lower(): (v or '').strip() for k, v in raw.items() if k}
+		try:
+			if row.get('first_name') or row.get('last_name'):
+				first_name, last_name = row.get('first_name', ''), row.get('last_name', '')
+			else:
+				first_name, _, last_name = row['shooter'].rpartition(' ')
+			if not (first_name and last_name and row['team']):
+				raise ValueError("team, first and last name are required")
+			week = int(row['week'].upper().lstrip('W'))
+			if week not in range(0, 16):
+				raise ValueError("week must be W0-W15")
+			rows.append({
+				'team': row['team'],
+				'first_name': first_name,
+				'last_name': last_name,
+				'email': row.get('email', ''),
+				'date': datetime.datetime.strptime(row['date'], '%Y-%m-%d').date(),
+				'week': week,
+				'bunker_one': int(row['bunker_one'] or 0),
+				'bunker_two': int(row['bunker_two'] or 0),
+			})
+		except (KeyError, ValueError) as e:
+			errors.append("line %d: %s" % (line, e))
+
+	if errors:
+		raise SheetError("Could not read the sheet:\n" + "\n".join(errors[:20]))
+	return rows
+
+
+def _shooter_key(first_name, last_name, email=''):
+	# The normalized search keys, so "smith", "Smith" and "Smíth" are one shooter
+	name_key, _, email_key = shooter_keys(first_name, last_name, email)
+	return (name_key, email_key)
+
+
+def import_scores(lines, progress=None):
+	"""Import a CSV score sheet. Returns an ImportResult. progress, if given, is called with the fraction of the
+	scores written after each chunk
+	"""
+	start = time.perf_counter()
+	result = ImportResult()
+	rows = read_sheet(lines)
+	result.rows = len(rows)
+
+	try:
+		seasons.check_open(set(r['date'].year for r in rows))
+	except seasons.SeasonClosed as e:
+		raise SheetError(str(e) + "; reopen it before importing scores into it")
+
+	# Teams, by name: one query, one bulk insert for the new ones
+	team_names = set(r['team'] for r in rows)
+	teams = {t.team_name: t for t in Team.objects.filter(team_name__in=team_names)}
+	new_teams = [Team(team_name=name) for name in sorted(team_names - set(teams))]
+	if new_teams:
+		Team.objects.bulk_create(new_teams)
+		teams.update({t.team_name: t for t in Team.objects.filter(team_name__in=[t.team_name for t in new_teams])})
+		result.teams_created = len(new_teams)
+
+	# Shooters, by name (and email when the sheet has one), matched on the normalized search keys. Same-name
+	# shooters resolve to the oldest record, and a row without an email matches on the name alone, so it joins
+	# a shooter another row of the sheet creates with an email
+	keys = {}
+	for r in rows:
+		key = r['shooter_key'] = _shooter_key(r['first_name'], r['last_name'], r['email'])
+		keys.setdefault(key, r)
+	emailed = set(name_key for name_key, email_key in keys if email_key)
+	shooters = {}
+	for s in Shooter.objects.filter(name_key__in=set(name_key for name_key, _ in keys)).order_by('-pk'):
+		shooters[(s.name_key, '')] = s
+		shooters[(s.name_key, s.email_key)] = s
+	wanted = [Shooter(first_name=r['first_name'], last_name=r['last_name'], email=r['email'])
+			  for (name_key, email_key), r in keys.items()
+			  if (name_key, email_key) not in shooters and (email_key or name_key not in emailed)]
+	if wanted:
+		for s in wanted:
+			s.set_search_keys()
+		Shooter.objects.bulk_create(wanted)
+		for s in Shooter.objects.filter(name_key__in=set(s.name_key for s in wanted)).order_by('-pk'):
+			shooters.setdefault((s.name_key, s.email_key), s)
+			shooters.setdefault((s.name_key, ''), s)
+		result.shooters_created = len(wanted)
+
+	# Existing (shooter, season, week) keys for every season on the sheet, checked in memory
+	years = set(r['date'].year for r in rows)
+	existing = set(Score.objects.filter(season__in=years).values_list('shooter', 'season', 'week'))
+
+	scores = []
+	for r in rows:
+		shooter = shooters[r['shooter_key']]
+		key = (shooter.pk, r['date'].year, r['week'])
+		if key in existing:
+			result.duplicates += 1
+			continue
+		existing.add(key)
+		scores.append(Score(shooter=shooter, team=teams[r['team']], date=r['date'], season=r['date'].year,
+							week=r['week'], bunker_one=r['bunker_one'], bunker_two=r['bunker_two']))
+
+	seasons.ensure_seasons(set(s.season for s in scores))
+	written = []
+	try:
+		for i in range(0, len(scores), CHUNK_SIZE):
+			chunk = scores[i:i + CHUNK_SIZE]
+			with transaction.atomic():
+				Score.objects.bulk_create(chunk)
+			written += chunk
+			if progress is not None:
+				progress(len(written) / float(len(scores)))
+	finally:
+		# Chunks already committed stay, so their rollups are rebuilt even when a later chunk fails
+		result.created = len(written)
+		_refresh(written, new_teams)
+
+	result.seconds = time.perf_counter() - start
+	return result
+
+
+def _refresh(scores, new_teams):
+	# bulk_create sends no signals: rebuild the touched seasons' rollups and standings, drop every cached page
+	for season in sorted(set(s.season for s in scores)):
+		rebuild_scorecards(season)
+		rosters.refresh_rosters(season)
+		refresh_stats(season, set(s.shooter_id for s in scores if s.season == season))
+		standings.weeks_touched(season, set(s.week for s in scores if s.season == season))
+	if scores or new_teams:
+		cache.bump('league')
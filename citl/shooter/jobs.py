@@ -0,0 +1,287 @@
+# Background jobs
+#
+# Season scoring, score sheet imports and exports can take longer than a request should. The administration pages
+# enqueue() a Job row and return at once; `manage.py run_jobs` claims queued jobs and runs the registered task
+# for each, with a configurable number of worker threads. Tasks report progress on the Job row, which the
+# administration page shows. A failed job is retried with exponential backoff up to its max_attempts, unless the
+# task raised JobError (a bad sheet will not get better by retrying). While a job runs, its worker process
+# updates the job's heartbeat every JOB_HEARTBEAT_SECONDS, whether or not the task reports progress. A running
+# job whose heartbeat is older than JOB_STALE_SECONDS (worker killed, machine lost) is queued again by any worker.
+#
+# Claiming is a conditional UPDATE (status queued -> running) rather than SELECT ... FOR UPDATE, so it works the
+# same on SQLite and PostgreSQL and two workers never run the same job.
+#
+# Settings (all optional):
+#
+#     JOB_MAX_ATTEMPTS         tries per job before it fails (default 3)
+#     JOB_RETRY_DELAY          seconds before the first retry; doubled for each later one (default 30)
+#     JOB_HEARTBEAT_SECONDS    seconds between heartbeats of running jobs (default 30)
+#     JOB_STALE_SECONDS        running jobs without a heartbeat this long are requeued (default 600)
+#
+# Import sheets and export files are kept with the job in the default file storage (MEDIA_ROOT) under jobs/.
+
+import datetime
+import io
+import json
+import logging
+import os
+import socket
+import tempfile
+import threading
+import traceback
+
+from django.conf import settings
+from django.core.files import File
+from django.db import close_old_connections
+from django.utils import timezone
+
+from .models import Job
+
+logger = logging.getLogger(__name__)
+
+TASKS = {}
+
+
+class JobError(Exception):
+	"""A failure retrying won't fix. The job fails at once with this message
+	"""
+	pass
+
+
+def task(kind):
+	"""Register a function as the task for jobs of this kind. It is called as function(job, **job.kwargs) and
+	returns the message to show when it's done
+	"""
+	def register(function):
+		TASKS[kind] = function
+		return function
+	return register
+
+
+def enqueue(kind, user=None, input_file=None, **arguments):
+	"""Queue a job for the worker. Returns the Job
+	"""
+	if kind not in TASKS:
+		raise ValueError("Unknown job kind " + kind)
+
+	job = Job(kind=kind, arguments=json.dumps(arguments), created_by=user,
+			  max_attempts=getattr(settings, 'JOB_MAX_ATTEMPTS', 3), message="Queued")
+	if input_file is not None:
+		job.input_file.save(os.path.basename(input_file.name), input_file, save=False)
+	job.save()
+	return job
+
+
+def report(job, progress, message=None):
+	"""Record a running job's progress (0 - 100) and prove its worker is alive
+	"""
+	job.progress = max(0, min(100, int(progress)))
+	fields = {'progress': job.progress, 'heartbeat': timezone.now()}
+	if message is not None:
+		job.message = fields['message'] = message[:255]
+	Job.objects.filter(pk=job.pk).update(**fields)
+
+
+def beat(job_ids):
+	"""Record that the workers running these jobs are alive, however long since their tasks reported
+	"""
+	return Job.objects.filter(pk__in=job_ids, status=Job.RUNNING).update(heartbeat=timezone.now())
+
+
+def recent(limit=10):
+	return Job.objects.select_related('created_by').order_by('-created_at', '-pk')[:limit]
+
+
+def claim(worker):
+	"""Take the next due job, or None. Safe with any number of workers
+	"""
+	now = timezone.now()
+	candidates = Job.objects \
+		.filter(status=Job.QUEUED, run_after__lte=now) \
+		.order_by('run_after', 'pk') \
+		.values_list('pk', flat=True)[:5]
+
+	for pk in candidates:
+		# Whoever flips the status first owns the job
+		claimed = Job.objects \
+			.filter(pk=pk, status=Job.QUEUED) \
+			.update(status=Job.RUNNING, worker=worker, started_at=now, heartbeat=now, progress=0,
+					message="Started")
+		if claimed:
+			return Job.objects.get(pk=pk)
+	return None
+
+
+def run(job):
+	"""Run a claimed job's task and record how it went
+	"""
+	function = TASKS.get(job.kind)
+	job.attempts += 1
+	Job.objects.filter(pk=job.pk).update(attempts=job.attempts)
+
+	try:
+		if function is None:
+			raise JobError("No task registered for " + job.kind)
+		message = function(job, **job.kwargs)
+	except Exception as e:
+		logger.exception("Job %s failed (attempt %d of %d)", job.pk, job.attempts, job.max_attempts)
+		_failed(job, e)
+		return
+
+	Job.objects.filter(pk=job.pk).update(status=Job.DONE, progress=100, message=(message or "Done")[:255],
+										 finished_at=timezone.now(), output_file=job.output_file.name or '')
+
+
+def _failed(job, error):
+	now = timezone.now()
+	fields = {'error': traceback.format_exc(), 'heartbeat': now}
+
+	if isinstance(error, JobError) or job.attempts >= job.max_attempts:
+		fields.update(status=Job.FAILED, finished_at=now, message=str(error)[:255])
+	else:
+		delay = getattr(settings, 'JOB_RETRY_DELAY', 30) * 2 ** (job.attempts - 1)
+		fields.update(status=Job.QUEUED, run_after=now + datetime.timedelta(seconds=delay),
+					  message=("Retrying in %ds: " % delay + str(error))[:255])
+	Job.objects.filter(pk=job.pk).update(**fields)
+
+
+def requeue_stale():
+	"""Queue again the running jobs whose heartbeat has stopped. Returns how many
+	"""
+	cutoff = timezone.now() - datetime.timedelta(seconds=getattr(settings, 'JOB_STALE_SECONDS', 600))
+	return Job.objects \
+		.filter(status=Job.RUNNING, heartbeat__lt=cutoff) \
+		.update(status=Job.QUEUED, run_after=timezone.now(), message="Requeued: the worker stopped responding")
+
+
+class Worker(object):
+	"""concurrency threads, each claiming and running jobs until stop() (or, with drain, until the queue is empty)
+	"""
+
+	def __init__(self, concurrency=1, poll=2.0, drain=False):
+		self.concurrency = concurrency
+		self.poll = poll
+		self.drain = drain
+		self.name = "%s:%d" % (socket.gethostname(), os.getpid())
+		self.stopping = threading.Event()
+		self.processed = 0
+		self.running = set()
+		self._lock = threading.Lock()
+
+	def start(self):
+		requeue_stale()
+		self.threads = [threading.Thread(target=self._loop, args=(n,), name="job-worker-%d" % n, daemon=True)
+						for n in range(self.concurrency)]
+		for thread in self.threads:
+			thread.start()
+		threading.Thread(target=self._heartbeat, name="job-heartbeat", daemon=True).start()
+
+	def join(self, timeout=None):
+		for thread in self.threads:
+			thread.join(timeout)
+
+	def alive(self):
+		return any(thread.is_alive() for thread in self.threads)
+
+	def stop(self):
+		self.stopping.set()
+
+	def _loop(self, n):
+		worker = self.name + ":" + str(n)
+		while not self.stopping.is_set():
+			close_old_connections()
+			job = claim(worker)
+			if job is None:
+				if self.drain:
+					break
+				self.stopping.wait(self.poll)
+				continue
+
+			logger.info("%s running job %s (%s)", worker, job.pk, job.kind)
+			with self._lock:
+				self.running.add(job.pk)
+			try:
+				run(job)
+			finally:
+				with self._lock:
+					self.running.discard(job.pk)
+					self.processed += 1
+		close_old_connections()
+
+	def _heartbeat(self):
+		# Keeps this process's jobs from being requeued, and requeues other workers' stale jobs
+		interval = getattr(settings, 'JOB_HEARTBEAT_SECONDS', 30)
+		while not self.stopping.wait(interval) and self.alive():
+			close_old_connections()
+			with self._lock:
+				running = list(self.running)
+			try:
+				if running:
+					beat(running)
+				requeue_stale()
+			except Exception:
+				logger.exception("Job heartbeat failed")
+		close_old_connections()
+
+
+# TASKS
+
+@task('run_scores')
+def run_scores_task(job, season):
+	from .scoring import run_season_scores
+	from .standings import standings_changed
+
+	# Weeks rank independently, so score four at a time and let the administration page follow along
+	count = 0
+	for first in range(0, 16, 4):
+		weeks = list(range(first, first + 4))
+		count += run_season_scores(season, weeks)
+		report(job, (first + 4) * 100 / 16.0, "Scored weeks " + str(first) + "-" + str(first + 3))
+	standings_changed(season)
+	return "Scored " + str(count) + " team weeks for " + str(season)
+
+
+@task('import_scores')
+def import_scores_task(job):
+	from .importer import SheetError, import_scores
+
+	if not job.input_file:
+		raise JobError("The score sheet is missing")
+
+	with job.input_file.open('rb') as f:
+		sheet = io.TextIOWrapper(f, encoding='utf-8-sig')
+		try:
+			result = import_scores(sheet, progress=lambda done: report(job, done * 100, "Importing scores"))
+		except (SheetError, UnicodeDecodeError) as e:
+			raise JobError(str(e))
+	return str(result)
+
+
+@task('export')
+def export_task(job, export, fmt='csv', season=None):
+	from .export import EXPORTS, FORMATS, stream
+
+	if export not in EXPORTS or fmt not in FORMATS:
+		raise JobError("Unknown export " + export + "." + fmt)
+
+	total = _export_count(export, season)
+
+	with tempfile.TemporaryFile() as out:
+		for n, line in enumerate(stream(export, fmt, season)):
+			out.write(line.encode('utf-8'))
+			if n and n % 5000 == 0:
+				report(job, n * 100.0 / max(total, 1), "Exported " + str(n) + " rows")
+		out.seek(0)
+		filename = "citl-" + export + "-" + (str(season) if season else "all") + "." + fmt
+		job.output_file.save(filename, File(out), save=False)
+
+	return "Exported " + str(total) + " rows to " + filename
+
+
+def _export_count(kind, season):
+	from .export import EXPORTS
+
+	queryset = EXPORTS[kind]['queryset']()
+	if season is not None:
+		queryset = queryset.filter(season=season)
+	return queryset.count()
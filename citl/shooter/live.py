@@ -0,0 +1,288 @@
+# Live scoreboard updates
+#
+# When scores are committed the writer builds the changes once (the team's new lines and week total, and the
+# season standings) and publishes them. Viewers hold a Server-Sent Events connection (LiveView) fed from an
+# in-process hub, so a connected scoreboard costs no queries at all: hundreds of viewers on league night are
+# hundreds of idle queue waits instead of hundreds of scorecard renders.
+#
+# Workers share events through the cache framework: every event is appended to a short log in the cache and one
+# background thread per process polls the log and hands other processes' events to its local hub. This needs a
+# cache every worker can see (memcached, redis or file based); with the per-process locmem cache each worker only
+# hears its own writes. Reconnecting browsers send Last-Event-ID and are replayed what they missed from the log.
+#
+# A live stream needs ASGI (uvicorn citl.asgi:application, with SHOOTER_ASYNC_VIEWS): async_stream() awaits an
+# asyncio.Queue on the server's event loop, so an open stream holds no thread at all. Under WSGI each open stream
+# holds a worker thread for as long as the page is open (stream() blocks on a queue.Queue), so a process only
+# streams to LIVE_MAX_SYNC_STREAMS viewers, none by default. Everyone else is polled: poll() answers with the
+# events they missed and ends, and the browser's EventSource reconnects after LIVE_POLL_RETRY seconds with
+# Last-Event-ID. The page script needs no changes either way.
+#
+# Settings (all optional):
+#
+#     LIVE_MAX_CLIENTS        open streams per process before new ones get a 503 (default 500)
+#     LIVE_MAX_SYNC_STREAMS   open streams per WSGI process, each holding a thread, before viewers are polled
+#                             instead (default 0). Keep it well below the threads per process
+#     LIVE_POLL_RETRY         seconds between a polled viewer's requests (default 10)
+#     LIVE_POLL_INTERVAL      seconds between polls of the shared event log (default 1.0)
+#     LIVE_KEEPALIVE          seconds between keep-alive comments on an idle stream (default 15)
+#     LIVE_STREAM_SECONDS     how long an async stream stays open before the browser is left to reconnect (default
+#                             600). Django before 5.0 doesn't tell an async stream its client has gone, so this is
+#                             what ends abandoned ones
+
+import asyncio
+import json
+import logging
+import os
+import queue
+import threading
+import uuid
+
+from django.conf import settings
+from django.core.cache import cache
+
+try:
+	from asgiref.sync import sync_to_async
+except ImportError:
+	# Django before 3.0: no ASGI, only stream() is used
+	sync_to_async = None
+
+from .models import Scorecard, ScorecardLine
+from .standings import leaderboard
+
+logger = logging.getLogger(__name__)
+
+LOG_LENGTH = 200
+EVENT_TIMEOUT = 60 * 60
+QUEUE_SIZE = 100
+
+_SEQUENCE_KEY = 'shooter:live:sequence'
+_ORIGIN = '%s:%s' % (os.getpid(), uuid.uuid4().hex)
+
+
+def _event_key(sequence):
+	return 'shooter:live:event:%d' % sequence
+
+
+class AsyncSubscriber(object):
+	"""A subscriber for async_stream(): events are handed to an asyncio.Queue on the event loop that created it
+	"""
+
+	def __init__(self):
+		self.loop = asyncio.get_running_loop()
+		self.queue = asyncio.Queue(QUEUE_SIZE)
+
+	def put_nowait(self, event):
+		# Called from writers' threads and the poller, never from the loop itself
+		try:
+			self.loop.call_soon_threadsafe(self._put, event)
+		except RuntimeError:
+			# The loop is closed; the stream went with it
+			pass
+
+	def _put(self, event):
+		try:
+			self.queue.put_nowait(event)
+		except asyncio.QueueFull:
+			pass
+
+
+class Hub(object):
+	"""In-process fan out: every subscriber gets its own bounded queue of events
+	"""
+
+	def __init__(self):
+		self.lock = threading.Lock()
+		self.subscribers = set()
+		self.last_sequence = None
+		self.poller = None
+
+	def subscribe(self, subscriber=None):
+		"""Add a subscriber (a new queue.Queue by default, or an AsyncSubscriber), or return None when full
+		"""
+		if subscriber is None:
+			subscriber = queue.Queue(QUEUE_SIZE)
+		with self.lock:
+			if len(self.subscribers) >= getattr(settings, 'LIVE_MAX_CLIENTS', 500):
+				return None
+			self.subscribers.add(subscriber)
+			self._start_poller()
+		return subscriber
+
+	def unsubscribe(self, subscriber):
+		with self.lock:
+			self.subscribers.discard(subscriber)
+
+	def deliver(self, event):
+		with self.lock:
+			subscribers = list(self.subscribers)
+		for subscriber in subscribers:
+			try:
+				subscriber.put_nowait(event)
+			except queue.Full:
+				# A stalled client; it reloads the page when it sees the gap
+				pass
+
+	def _start_poller(self):
+		if self.poller is None or not self.poller.is_alive():
+			self.last_sequence = cache.get(_SEQUENCE_KEY, 0)
+			self.poller = threading.Thread(target=self._poll, name='shooter-live-poller', daemon=True)
+			self.poller.start()
+
+	def _poll(self):
+		interval = getattr(settings, 'LIVE_POLL_INTERVAL', 1.0)
+		stop = threading.Event()
+		while not stop.wait(interval):
+			with self.lock:
+				if not self.subscribers:
+					# Nobody is listening; the next subscribe() starts a fresh poller
+					self.poller = None
+					return
+			try:
+				for event in events_since(self.last_sequence):
+					self.last_sequence = event['id']
+					if event['origin'] != _ORIGIN:
+						self.deliver(event)
+			except Exception:
+				logger.exception("Polling live events failed")
+
+
+hub = Hub()
+
+
+def publish(kind, season, team, data):
+	"""Append an event to the shared log and deliver it to this process's subscribers
+	"""
+	cache.add(_SEQUENCE_KEY, 0, None)
+	sequence = cache.incr(_SEQUENCE_KEY)
+	event = {'id': sequence, 'origin': _ORIGIN, 'event': kind, 'season': season, 'team': team, 'data': data}
+	cache.set(_event_key(sequence), event, EVENT_TIMEOUT)
+	hub.deliver(event)
+	return event
+
+
+def events_since(sequence):
+	"""Logged events after sequence, oldest first (at most LOG_LENGTH)
+	"""
+	latest = cache.get(_SEQUENCE_KEY, 0)
+	if sequence is None or latest <= sequence:
+		return []
+	first = max(sequence + 1, latest - LOG_LENGTH + 1)
+	found = cache.get_many([_event_key(n) for n in range(first, latest + 1)])
+	return sorted(found.values(), key=lambda event: event['id'])
+
+
+def scores_posted(season, team, week, shooter_ids):
+	"""Publish a team's week as the scorecard pages show it, plus the season standings. Call after commit
+	"""
+	lines = ScorecardLine.objects \
+		.filter(team=team, season=season, shooter__in=shooter_ids) \
+		.select_related('shooter')
+	card = Scorecard.objects.filter(team=team, season=season, week=week).first()
+
+	publish('scorecard', season, team.team_name, {
+		'week': week,
+		'total_targets': card.total_targets if card is not None else 0,
+		'lines': [{
+			'shooter': line.shooter_id,
+			'name': str(line.shooter),
+			'weeks': line.week_totals,
+			'weeks_shot': line.weeks_shot,
+			'average': line.average,
+		} for line in lines],
+	})
+	publish('standings', season, None, {'standings': leaderboard(season)})
+
+
+def format_event(event):
+	return "id: %d\nevent: %s\ndata: %s\n\n" % (
+		event['id'], event['event'], json.dumps(dict(event['data'], season=event['season'], team=event['team'])))
+
+
+def sync_streams_full():
+	"""Whether this process already holds LIVE_MAX_SYNC_STREAMS thread-blocking stream() connections
+	"""
+	with hub.lock:
+		open_streams = sum(1 for subscriber in hub.subscribers if isinstance(subscriber, queue.Queue))
+	return open_streams >= getattr(settings, 'LIVE_MAX_SYNC_STREAMS', 0)
+
+
+def poll(season, team=None, last_event_id=None):
+	"""The whole text/event-stream response for a polled viewer: the events missed since last_event_id, then the
+	response ends and the browser reconnects after LIVE_POLL_RETRY seconds
+	"""
+	response = ["retry: %d\n\n" % (getattr(settings, 'LIVE_POLL_RETRY', 10) * 1000)]
+	if last_event_id is None:
+		# A first visit has missed nothing. An id-only event sets the browser's Last-Event-ID for the next poll
+		response.append("id: %d\n\n" % cache.get(_SEQUENCE_KEY, 0))
+		return "".join(response)
+
+	events = events_since(last_event_id)
+	response += [format_event(event) for event in events if _wanted(event, season, team)]
+	if events and not _wanted(events[-1], season, team):
+		response.append("id: %d\n\n" % events[-1]['id'])
+	return "".join(response)
+
+
+def _wanted(event, season, team):
+	return event['season'] == season and (team is None or event['team'] in (None, team))
+
+
+def stream(subscriber, season, team=None, last_event_id=None):
+	"""Generate the text/event-stream for one subscriber: a season's events, optionally only one team's
+	scorecard. Replays what a reconnecting client missed, then waits on the subscriber's queue
+	"""
+	keepalive = getattr(settings, 'LIVE_KEEPALIVE', 15)
+
+	try:
+		yield "retry: 5000\n\n"
+
+		# Events can also reach the queue while the missed ones are replayed; send those once
+		replayed = set()
+		if last_event_id is not None:
+			for event in events_since(last_event_id):
+				if _wanted(event, season, team):
+					replayed.add(event['id'])
+					yield format_event(event)
+
+		while True:
+			try:
+				event = subscriber.get(timeout=keepalive)
+			except queue.Empty:
+				# Comment lines keep proxies from closing an idle stream and find dead clients
+				yield ": keepalive\n\n"
+				continue
+			if event['id'] not in replayed and _wanted(event, season, team):
+				yield format_event(event)
+	finally:
+		hub.unsubscribe(subscriber)
+
+
+async def async_stream(subscriber, season, team=None, last_event_id=None):
+	"""stream() for ASGI, with an AsyncSubscriber: the same events, awaited on the event loop instead of blocking
+	a thread
+	"""
+	keepalive = getattr(settings, 'LIVE_KEEPALIVE', 15)
+	loop = asyncio.get_running_loop()
+	# EventSource reconnects by itself, with Last-Event-ID, so ending the stream loses nothing
+	closes = loop.time() + getattr(settings, 'LIVE_STREAM_SECONDS', 600)
+
+	try:
+		yield "retry: 5000\n\n"
+
+		replayed = set()
+		if last_event_id is not None:
+			for event in await sync_to_async(events_since)(last_event_id):
+				if _wanted(event, season, team):
+					replayed.add(event['id'])
+					yield format_event(event)
+
+		while loop.time() < closes:
+			try:
+				event = await asyncio.wait_for(subscriber.queue.get(), min(keepalive, max(closes - loop.time(), 0)))
+			except asyncio.TimeoutError:
+				yield ": keepalive\n\n"
+				continue
+			if event['id'] not in replayed and _wanted(event, season, team):
+				yield format_event(event)
+	finally:
+		hub.unsubscribe(subscriber)
@@ -0,0 +1,81 @@
+# HTTP load test
+#
+# Drives a running server (citl/wsgi.py under gunicorn or citl/asgi.py under uvicorn) with concurrent clients
+# for a fixed time and reports throughput and latency percentiles, so WSGI and ASGI deployments can be compared
+# on the same synthetic league. Used by `manage.py loadtest`; see "Load testing" in README.md.
+
+import statistics
+import threading
+import time
+import urllib.error
+import urllib.request
+from urllib.parse import quote
+
+from .models import Season
+from .rosters import season_teams
+
+
+def league_paths():
+	"""The public read pages for the newest season in the database, the mix a league night crowd loads
+	"""
+	season = Season.objects.order_by('-year').values_list('year', flat=True).first()
+	if season is None:
+		return ['/', '/shooter/']
+
+	teams = season_teams(season)
+	paths = ['/', '/shooter/', '/shooter/%d/season/' % season]
+	paths += ['/shooter/%d/%s/scorecard/' % (season, quote(team)) for team in teams]
+	return paths
+
+
+def _percentile(times, fraction):
+	ordered = sorted(times)
+	return ordered[min(len(ordered) - 1, int(len(ordered) * fraction))]
+
+
+def run_load(base_url, paths, concurrency=20, duration=20.0, timeout=10.0):
+	"""Fetch paths round robin from concurrency threads for duration seconds. Returns a summary dict
+	"""
+	deadline = time.perf_counter() + duration
+	lock = threading.Lock()
+	times = []
+	errors = []
+
+	def client(offset):
+		n = offset
+		local_times = []
+		local_errors = 0
+		while time.perf_counter() < deadline:
+			url = base_url.rstrip('/') + paths[n % len(paths)]
+			n += 1
+			start = time.perf_counter()
+			try:
+				with urllib.request.urlopen(url, timeout=timeout) as response:
+					response.read()
+				local_times.append(time.perf_counter() - start)
+			except (urllib.error.URLError, OSError):
+				local_errors += 1
+		with lock:
+			times.extend(local_times)
+			errors.append(local_errors)
+
+	start = time.perf_counter()
+	threads = [threading.Thread(target=client, args=(i,)) for i in range(concurrency)]
+	for thread in threads:
+		thread.start()
+	for thread in threads:
+		thread.join()
+	elapsed = time.perf_counter() - start
+
+	if not times:
+		return {'requests': 0, 'errors': sum(errors), 'rps': 0.0}
+
+	return {
+		'requests': len(times),
+		'errors': sum(errors),
+		'rps': round(len(times) / elapsed, 1),
+		'p50_ms': round(statistics.median(times) * 1000, 2),
+		'p95_ms': round(_percentile(times, 0.95) * 1000, 2),
+		'p99_ms': round(_percentile(times, 0.99) * 1000, 2),
+		'max_ms': round(max(times) * 1000, 2),
+	}
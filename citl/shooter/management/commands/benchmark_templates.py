@@ -0,0 +1,20 @@
+from django.core.management.base import BaseCommand
+
+from shooter.benchmark import render_benchmarks
+
+
+class Command(BaseCommand):
+	help = ("Render the scorecard of a synthetic team with each template setup (plain and cached loaders, a "
+			"cached scorecard fragment, Jinja2 when installed) and report the median render time.")
+
+	def add_arguments(self, parser):
+		parser.add_argument('--shooters', type=int, default=30, help="Shooters on the team")
+		parser.add_argument('--repeat', type=int, default=200, help="Renders per setup; the median time is kept")
+
+	def handle(self, *args, **options):
+		results = render_benchmarks(options['shooters'], options['repeat'])
+
+		fastest = min(results.values())
+		self.stdout.write("%-40s %10s %8s" % ("setup", "render ms", "x"))
+		for name, ms in results.items():
+			self.stdout.write("%-40s %10.3f %8.1f" % (name, ms, ms / fastest))
@@ -0,0 +1,66 @@
+import json
+
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connection
+from django.test.utils import setup_test_environment, teardown_test_environment
+
+from shooter.benchmark import compare, run_benchmarks, seed_league
+
+
+class Command(BaseCommand):
+	help = ("Seed a synthetic league into a throwaway test database and record query count, wall time and peak "
+			"memory for every shooter view. Compares against --baseline and fails on regressions.")
+
+	def add_arguments(self, parser):
+		parser.add_argument('--teams', type=int, default=8)
+		parser.add_argument('--shooters', type=int, default=10, help="Shooters per team")
+		parser.add_argument('--seasons', type=int, default=3)
+		parser.add_argument('--weeks', type=int, default=12, help="Weeks shot per season (max 15)")
+		parser.add_argument('--repeat', type=int, default=5, help="Requests per view; the median time is kept")
+		parser.add_argument('--baseline', help="Baseline JSON file to compare against")
+		parser.add_argument('--save-baseline', action='store_true', help="Write the results to --baseline")
+		parser.add_argument('--threshold', type=float, default=0.25,
+							help="Allowed wall time increase over the baseline (default 0.25 = 25%%)")
+
+	def handle(self, *args, **options):
+		if options['weeks'] > 15:
+			raise CommandError("A season has at most 15 weeks")
+
+		setup_test_environment()
+		old_name = connection.creation.create_test_db(verbosity=0, autoclobber=True, serialize=False)
+		try:
+			teams = seed_league(options['teams'], options['shooters'], options['seasons'], options['weeks'])
+			results = run_benchmarks(teams, options['repeat'])
+		finally:
+			connection.creation.destroy_test_db(old_name, verbosity=0)
+			teardown_test_environment()
+
+		self.stdout.write("%-32s %7s %8s %10s %10s" % ("view", "status", "queries", "time ms", "peak KB"))
+		for name, r in results.items():
+			self.stdout.write("%-32s %7s %8d %10.2f %10.1f" % (
+				name, r['status'], r['queries'], r['time_ms'], r['peak_kb']))
+
+		report = {
+			'league': {key: options[key] for key in ('teams', 'shooters', 'seasons', 'weeks')},
+			'vendor': connection.vendor,
+			'views': results,
+		}
+
+		if not options['baseline']:
+			return
+
+		if options['save_baseline']:
+			with open(options['baseline'], 'w') as f:
+				json.dump(report, f, indent=2, sort_keys=True)
+			self.stdout.write(self.style.SUCCESS("Baseline written to " + options['baseline']))
+			return
+
+		with open(options['baseline']) as f:
+			baseline = json.load(f)
+		if baseline.get('league') != report['league']:
+			self.stdout.write(self.style.WARNING("Baseline was recorded for a different league size"))
+
+		regressions = compare(results, baseline['views'], options['threshold'])
+		if regressions:
+			raise CommandError("Performance regressions:\n  " + "\n  ".join(regressions))
+		self.stdout.write(self.style.SUCCESS("No regressions against " + options['baseline']))
@@ -0,0 +1,30 @@
+from django.core.management.base import BaseCommand, CommandError
+
+from shooter.models import Season
+from shooter.seasons import SeasonClosed, close_season, reopen_season
+
+
+class Command(BaseCommand):
+	help = ("Close a season: rank it one last time and freeze its standings into summary rows. "
+			"No scores can be entered for a closed season until it is reopened.")
+
+	def add_arguments(self, parser):
+		parser.add_argument('season', type=int, help="Season year")
+		parser.add_argument('--reopen', action='store_true', help="Reopen a closed season instead")
+
+	def handle(self, *args, **options):
+		year = options['season']
+
+		if options['reopen']:
+			try:
+				reopen_season(year)
+			except Season.DoesNotExist:
+				raise CommandError("There is no %d season" % year)
+			self.stdout.write(self.style.SUCCESS("Reopened the %d season" % year))
+			return
+
+		try:
+			count = close_season(year)
+		except SeasonClosed as e:
+			raise CommandError(str(e))
+		self.stdout.write(self.style.SUCCESS("Closed the %d season with %d teams" % (year, count)))
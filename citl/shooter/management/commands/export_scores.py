@@ -0,0 +1,24 @@
+import sys
+
+from django.core.management.base import BaseCommand
+
+from shooter.export import EXPORTS, FORMATS, stream
+
+
+class Command(BaseCommand):
+	help = "Stream scores, scorecard lines or team scorecards as CSV or newline delimited JSON"
+
+	def add_arguments(self, parser):
+		parser.add_argument('kind', choices=sorted(EXPORTS), help="What to export")
+		parser.add_argument('--season', type=int, help="Only export this season (default: every season)")
+		parser.add_argument('--format', choices=sorted(FORMATS), default='csv')
+		parser.add_argument('--output', help="File to write (default: stdout)")
+
+	def handle(self, *args, **options):
+		out = open(options['output'], 'w', newline='') if options['output'] else sys.stdout
+		try:
+			for line in stream(options['kind'], options['format'], options['season']):
+				out.write(line)
+		finally:
+			if out is not sys.stdout:
+				out.close()
@@ -0,0 +1,19 @@
+from django.core.management.base import BaseCommand, CommandError
+
+from shooter.importer import SheetError, import_scores
+
+
+class Command(BaseCommand):
+	help = "Bulk import CSV score sheets (team, shooter, date, week, bunker_one, bunker_two)"
+
+	def add_arguments(self, parser):
+		parser.add_argument('sheets', nargs='+', help="CSV files to import")
+
+	def handle(self, *args, **options):
+		for path in options['sheets']:
+			with open(path, newline='', encoding='utf-8-sig') as sheet:
+				try:
+					result = import_scores(sheet)
+				except SheetError as e:
+					raise CommandError(path + ": " + str(e))
+			self.stdout.write(self.style.SUCCESS(path + ": " + str(result)))
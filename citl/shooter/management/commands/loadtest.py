@@ -0,0 +1,61 @@
+import json
+
+from django.core.management.base import BaseCommand, CommandError
+
+from shooter.benchmark import seed_league
+from shooter.loadtest import league_paths, run_load
+from shooter.models import Team
+
+COLUMNS = ('requests', 'errors', 'rps', 'p50_ms', 'p95_ms', 'p99_ms', 'max_ms')
+
+
+class Command(BaseCommand):
+	help = ("Load test a running server with concurrent clients on the public league pages and report "
+			"throughput and tail latency. Save runs with --save and compare WSGI and ASGI with --compare.")
+
+	def add_arguments(self, parser):
+		parser.add_argument('--url', default='http://127.0.0.1:8000', help="Server to load (default %(default)s)")
+		parser.add_argument('--concurrency', type=int, default=20)
+		parser.add_argument('--duration', type=float, default=20.0, help="Seconds (default %(default)s)")
+		parser.add_argument('--label', default='run', help="Name for this run in --save files")
+		parser.add_argument('--seed', action='store_true',
+							help="Seed the synthetic league from benchmark_views into this (empty) database first")
+		parser.add_argument('--save', help="Append this run to a JSON results file")
+		parser.add_argument('--compare', help="Print the runs in a JSON results file side by side and exit")
+
+	def handle(self, *args, **options):
+		if options['compare']:
+			with open(options['compare']) as f:
+				self._table(json.load(f))
+			return
+
+		if options['seed']:
+			if Team.objects.exists():
+				raise CommandError("--seed only loads into an empty database; this one has teams")
+			seed_league()
+			self.stdout.write("Seeded the synthetic league")
+
+		paths = league_paths()
+		self.stdout.write("Loading %d pages from %s with %d clients for %.0fs" % (
+			len(paths), options['url'], options['concurrency'], options['duration']))
+		result = run_load(options['url'], paths, options['concurrency'], options['duration'])
+		result['concurrency'] = options['concurrency']
+
+		runs = {options['label']: result}
+		if options['save']:
+			try:
+				with open(options['save']) as f:
+					runs = dict(json.load(f), **runs)
+			except FileNotFoundError:
+				pass
+			with open(options['save'], 'w') as f:
+				json.dump(runs, f, indent=2, sort_keys=True)
+
+		self._table({options['label']: result})
+		if result['errors']:
+			self.stdout.write(self.style.WARNING("%d requests failed" % result['errors']))
+
+	def _table(self, runs):
+		self.stdout.write("%-16s" % "run" + "".join("%10s" % column for column in COLUMNS))
+		for label, result in runs.items():
+			self.stdout.write("%-16s" % label + "".join("%10s" % result.get(column, '-') for column in COLUMNS))
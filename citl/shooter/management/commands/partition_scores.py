@@ -0,0 +1,43 @@
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connection
+
+from shooter.models import Score
+
+TABLE = Score._meta.db_table
+
+
+def partition_sql(year):
+	return "CREATE TABLE %s_%d PARTITION OF %s FOR VALUES IN (%d);" % (TABLE, year, TABLE, year)
+
+
+class Command(BaseCommand):
+	help = ("PostgreSQL only: add the partition for a new season to the Score table (run it before the season's "
+			"first scores, which otherwise land in the default partition). Prints the SQL unless --execute is "
+			"given. The table itself is partitioned by migration shooter 0015 when SHOOTER_PARTITION_SCORES is set.")
+
+	def add_arguments(self, parser):
+		parser.add_argument('--season', type=int, required=True, help="Season to add the partition for")
+		parser.add_argument('--execute', action='store_true', help="Run the statement instead of printing it")
+
+	def handle(self, *args, **options):
+		sql = partition_sql(options['season'])
+
+		if not options['execute']:
+			self.stdout.write(sql)
+			return
+
+		if connection.vendor != 'postgresql':
+			raise CommandError("Partitioning needs PostgreSQL 11 or later; this database is " + connection.vendor)
+		if not self._partitioned():
+			raise CommandError(TABLE + " is not partitioned; set SHOOTER_PARTITION_SCORES and migrate shooter "
+						"0014 then migrate shooter to partition it")
+
+		with connection.cursor() as cursor:
+			cursor.execute(sql)
+		self.stdout.write(self.style.SUCCESS("Added the %d partition" % options['season']))
+
+	def _partitioned(self):
+		with connection.cursor() as cursor:
+			cursor.execute("SELECT 1 FROM pg_partitioned_table p JOIN pg_class c ON c.oid = p.partrelid "
+						   "WHERE c.relname = %s", [TABLE])
+			return cursor.fetchone() is not None
@@ -0,0 +1,20 @@
+from django.core.management.base import BaseCommand
+
+from shooter.scorecards import rebuild_scorecards
+from shooter.rosters import refresh_rosters
+from shooter.stats import refresh_stats
+
+
+class Command(BaseCommand):
+	help = "Recompute the Scorecard, ScorecardLine and ShooterStats rollups from Score rows and fill in Roster"
+
+	def add_arguments(self, parser):
+		parser.add_argument('--season', type=int, help="Only rebuild this season (default: every season)")
+
+	def handle(self, *args, **options):
+		lines, weeks = rebuild_scorecards(options['season'])
+		shooters = refresh_stats(options['season'])
+		enrolled = refresh_rosters(options['season'])
+		self.stdout.write(self.style.SUCCESS(
+			"Rebuilt %d scorecard lines, %d team weeks and %d shooter seasons; enrolled %d roster entries"
+			% (lines, weeks, shooters, enrolled)))
@@ -0,0 +1,42 @@
+import logging
+import signal
+
+from django.core.management.base import BaseCommand, CommandError
+
+from shooter.jobs import Worker
+
+
+class Command(BaseCommand):
+	help = ("Run queued background jobs (season scoring, imports, exports) with --concurrency worker threads. "
+			"Runs until interrupted, or with --drain until the queue is empty.")
+
+	def add_arguments(self, parser):
+		parser.add_argument('--concurrency', type=int, default=2, help="Jobs run at once (default %(default)s)")
+		parser.add_argument('--poll', type=float, default=2.0,
+							help="Seconds between queue checks when idle (default %(default)s)")
+		parser.add_argument('--drain', action='store_true', help="Exit once no job is due")
+
+	def handle(self, *args, **options):
+		if options['concurrency'] < 1:
+			raise CommandError("--concurrency must be at least 1")
+
+		if not logging.getLogger('shooter.jobs').handlers and options['verbosity'] > 1:
+			logging.basicConfig(level=logging.INFO)
+
+		worker = Worker(options['concurrency'], options['poll'], options['drain'])
+
+		def stop(signum, frame):
+			self.stdout.write("Stopping after the running jobs finish")
+			worker.stop()
+		signal.signal(signal.SIGTERM, stop)
+
+		self.stdout.write("Running jobs with %d threads" % options['concurrency'])
+		worker.start()
+		try:
+			while worker.alive():
+				worker.join(1.0)
+		except KeyboardInterrupt:
+			stop(None, None)
+			worker.join()
+
+		self.stdout.write(self.style.SUCCESS("Ran %d jobs" % worker.processed))
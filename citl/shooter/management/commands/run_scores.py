@@ -0,0 +1,18 @@
+import datetime
+
+from django.core.management.base import BaseCommand
+
+from shooter.scoring import run_season_scores
+
+
+class Command(BaseCommand):
+	help = "Compute total targets, bonus points and rank points for every team and week of a season"
+
+	def add_arguments(self, parser):
+		parser.add_argument('--season', type=int, default=datetime.datetime.now().year,
+							help="Season year to score (default: current year)")
+
+	def handle(self, *args, **options):
+		count = run_season_scores(options['season'])
+		self.stdout.write(self.style.SUCCESS(
+			"Scored %d team weeks for the %d season" % (count, options['season'])))
@@ -0,0 +1,100 @@
+# Generated by Django 2.2.28 on 2026-10-18 03:22
+
+from django.db import migrations, models
+import django.db.models.deletion
+
+
+def populate_scorecards(apps, schema_editor):
+    # What rebuild_scorecards() computes, for the scores already entered. Inlined so that later changes to
+    # shooter/scorecards.py don't change what this migration does
+    Score = apps.get_model('shooter', 'Score')
+    Scorecard = apps.get_model('shooter', 'Scorecard')
+    ScorecardLine = apps.get_model('shooter', 'ScorecardLine')
+
+    lines = {}
+    team_weeks = {}
+    scores = Score.objects \
+        .filter(date__isnull=False) \
+        .values_list('date', 'team', 'shooter', 'week', 'bunker_one', 'bunker_two')
+    for date, team_id, shooter_id, week, bunker_one, bunker_two in scores.iterator():
+        total = bunker_one + bunker_two
+        line = lines.setdefault((date.year, team_id, shooter_id),
+                                {'weeks': [0] * 16, 'weeks_shot': 0, 'all': [], 'league': []})
+        line['weeks'][week] += total
+        if week > 0:
+            line['weeks_shot'] += 1
+        if bunker_one > 0 or bunker_two > 0:
+            line['all'].append(total)
+            if week > 0:
+                line['league'].append(total)
+        key = (date.year, team_id, week)
+        team_weeks[key] = team_weeks.get(key, 0) + total
+
+    new_lines = []
+    for (season, team_id, shooter_id), line in lines.items():
+        counted = line['league'] if len(line['league']) >= 2 else line['all']
+        average = round(float(sum(counted)) / len(counted), 2) if counted else 0
+        new_lines.append(ScorecardLine(season=season, team_id=team_id, shooter_id=shooter_id,
+                                       weeks=",".join(str(total) for total in line['weeks']),
+                                       weeks_shot=line['weeks_shot'], average=average))
+    ScorecardLine.objects.bulk_create(new_lines, batch_size=500)
+    Scorecard.objects.bulk_create([Scorecard(season=season, team_id=team_id, week=week, total_targets=total)
+                                   for (season, team_id, week), total in team_weeks.items()], batch_size=500)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('shooter', '0006_auto_20180708_1122'),
+    ]
+
+    operations = [
+        migrations.RemoveField(
+            model_name='score',
+            name='average',
+        ),
+        migrations.RemoveField(
+            model_name='team',
+            name='captain',
+        ),
+        migrations.RemoveField(
+            model_name='team',
+            name='season',
+        ),
+        migrations.AddField(
+            model_name='shooter',
+            name='captain',
+            field=models.BooleanField(default=False),
+        ),
+        migrations.CreateModel(
+            name='ScorecardLine',
+            fields=[
+                ('id', models.AutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('season', models.IntegerField(default=1900)),
+                ('weeks', models.CharField(default='0,0,0,0,0,0,0,0,0,0,0,0,0,0,0,0', max_length=80)),
+                ('weeks_shot', models.IntegerField(default=0)),
+                ('average', models.FloatField(default=0)),
+                ('shooter', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, to='shooter.Shooter')),
+                ('team', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, to='shooter.Team')),
+            ],
+            options={
+                'unique_together': {('team', 'shooter', 'season')},
+            },
+        ),
+        migrations.CreateModel(
+            name='Scorecard',
+            fields=[
+                ('id', models.AutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('season', models.IntegerField(default=1900)),
+                ('week', models.IntegerField(default=0)),
+                ('total_targets', models.IntegerField(default=0)),
+                ('rank_points', models.IntegerField(default=0)),
+                ('bonus_points', models.IntegerField(default=0)),
+                ('team', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, to='shooter.Team')),
+            ],
+            options={
+                'unique_together': {('team', 'season', 'week')},
+            },
+        ),
+        migrations.RunPython(populate_scorecards, migrations.RunPython.noop),
+    ]
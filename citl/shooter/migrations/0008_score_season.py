@@ -0,0 +1,70 @@
+# Generated by Django 2.2.28 on 2026-10-18 03:27
+
+from django.db import migrations, models
+from django.db.models import Count
+
+
+def populate_season(apps, schema_editor):
+    Score = apps.get_model('shooter', 'Score')
+    for date in Score.objects.filter(date__isnull=False).dates('date', 'year'):
+        Score.objects.filter(date__year=date.year).update(season=date.year)
+
+
+def remove_duplicate_scores(apps, schema_editor):
+    # Score entry used to accept the same shooter twice in a week. Exact copies (a resubmitted sheet) are
+    # dropped, keeping the first; conflicting scores have to be resolved by hand before the constraint can go on
+    Score = apps.get_model('shooter', 'Score')
+    groups = Score.objects \
+        .filter(season__isnull=False) \
+        .values('shooter', 'season', 'week') \
+        .annotate(count=Count('pk')) \
+        .filter(count__gt=1) \
+        .order_by('shooter', 'season', 'week')
+
+    conflicts = []
+    for group in groups:
+        scores = list(Score.objects
+                      .filter(shooter=group['shooter'], season=group['season'], week=group['week'])
+                      .order_by('pk'))
+        first = scores[0]
+        copies = [score.pk for score in scores[1:]
+                  if (score.team_id, score.date, score.bunker_one, score.bunker_two)
+                  == (first.team_id, first.date, first.bunker_one, first.bunker_two)]
+        Score.objects.filter(pk__in=copies).delete()
+        if len(copies) < len(scores) - 1:
+            conflicts.append("shooter %(shooter)s season %(season)s week %(week)s" % group
+                             + " (score ids " + ", ".join(str(s.pk) for s in scores if s.pk not in copies) + ")")
+
+    if conflicts:
+        raise RuntimeError(
+            "Scores must be unique per shooter, season and week. Delete or correct the conflicting scores and "
+            "migrate again:\n  " + "\n  ".join(conflicts))
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('shooter', '0007_scorecardline'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='score',
+            name='season',
+            field=models.IntegerField(blank=True, editable=False, null=True),
+        ),
+        migrations.RunPython(populate_season, migrations.RunPython.noop),
+        migrations.RunPython(remove_duplicate_scores, migrations.RunPython.noop),
+        migrations.AlterUniqueTogether(
+            name='score',
+            unique_together={('shooter', 'season', 'week')},
+        ),
+        migrations.AddIndex(
+            model_name='score',
+            index=models.Index(fields=['season', 'team', 'week'], name='score_season_team_week'),
+        ),
+        migrations.AddIndex(
+            model_name='score',
+            index=models.Index(fields=['season', 'shooter', 'week'], name='score_season_shooter_week'),
+        ),
+    ]
@@ -0,0 +1,75 @@
+# Generated by Django 2.2.28 on 2026-10-18 03:34
+
+from django.db import migrations, models
+import django.db.models.deletion
+
+
+def populate_stats(apps, schema_editor):
+    # The same running totals shooter/stats.py keeps, computed once for every existing score. Inlined so that later
+    # changes to stats.py don't change what this migration does
+    Score = apps.get_model('shooter', 'Score')
+    ShooterStats = apps.get_model('shooter', 'ShooterStats')
+
+    stats = {}
+    scores = Score.objects \
+        .filter(season__isnull=False) \
+        .annotate(total=models.F('bunker_one') + models.F('bunker_two')) \
+        .values_list('shooter', 'season', 'week', 'total') \
+        .order_by('week')
+    for shooter_id, season, week, total in scores.iterator():
+        row = stats.get((shooter_id, season))
+        if row is None:
+            row = stats[shooter_id, season] = ShooterStats(shooter_id=shooter_id, season=season)
+        row.scores += 1
+        if week > 0:
+            row.weeks_shot += 1
+        if total > 0:
+            row.shot_all += 1
+            row.sum_all += total
+            if week > 0:
+                row.shot_league += 1
+                row.sum_league += total
+                if row.best_total is None or total > row.best_total:
+                    row.best_week, row.best_total = week, total
+                if row.worst_total is None or total < row.worst_total:
+                    row.worst_week, row.worst_total = week, total
+
+    for row in stats.values():
+        if row.shot_league >= 2:
+            row.average = round(row.sum_league / row.shot_league, 2)
+        elif row.shot_all > 0:
+            row.average = round(row.sum_all / row.shot_all, 2)
+    ShooterStats.objects.bulk_create(stats.values(), batch_size=500)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('shooter', '0008_score_season'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='ShooterStats',
+            fields=[
+                ('id', models.AutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('season', models.IntegerField(default=1900)),
+                ('scores', models.IntegerField(default=0)),
+                ('weeks_shot', models.IntegerField(default=0)),
+                ('shot_all', models.IntegerField(default=0)),
+                ('sum_all', models.IntegerField(default=0)),
+                ('shot_league', models.IntegerField(default=0)),
+                ('sum_league', models.IntegerField(default=0)),
+                ('average', models.FloatField(default=0)),
+                ('best_week', models.IntegerField(blank=True, null=True)),
+                ('best_total', models.IntegerField(blank=True, null=True)),
+                ('worst_week', models.IntegerField(blank=True, null=True)),
+                ('worst_total', models.IntegerField(blank=True, null=True)),
+                ('shooter', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, to='shooter.Shooter')),
+            ],
+            options={
+                'unique_together': {('shooter', 'season')},
+            },
+        ),
+        migrations.RunPython(populate_stats, migrations.RunPython.noop),
+    ]
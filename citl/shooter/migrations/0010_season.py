@@ -0,0 +1,50 @@
+# Generated by Django 2.2.28 on 2026-10-18 03:43
+
+from django.db import migrations, models
+import django.db.models.deletion
+
+
+def populate_seasons(apps, schema_editor):
+    Score = apps.get_model('shooter', 'Score')
+    Season = apps.get_model('shooter', 'Season')
+    years = Score.objects.filter(season__isnull=False).values_list('season', flat=True).order_by().distinct()
+    Season.objects.bulk_create([Season(year=year) for year in sorted(years)])
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('shooter', '0009_shooterstats'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='Season',
+            fields=[
+                ('id', models.AutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('year', models.IntegerField(unique=True)),
+                ('status', models.CharField(choices=[('open', 'Open'), ('closed', 'Closed')], default='open', max_length=10)),
+                ('closed_at', models.DateTimeField(blank=True, null=True)),
+            ],
+        ),
+        migrations.CreateModel(
+            name='SeasonSummary',
+            fields=[
+                ('id', models.AutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('team_name', models.CharField(max_length=100)),
+                ('position', models.IntegerField(default=0)),
+                ('place', models.CharField(max_length=8)),
+                ('total_targets', models.IntegerField(default=0)),
+                ('rank_points', models.IntegerField(default=0)),
+                ('bonus_points', models.IntegerField(default=0)),
+                ('points', models.IntegerField(default=0)),
+                ('weeks', models.CharField(max_length=120)),
+                ('season', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='summaries', to='shooter.Season')),
+                ('team', models.ForeignKey(blank=True, null=True, on_delete=django.db.models.deletion.SET_NULL, to='shooter.Team')),
+            ],
+            options={
+                'unique_together': {('season', 'team_name')},
+            },
+        ),
+        migrations.RunPython(populate_seasons, migrations.RunPython.noop),
+    ]
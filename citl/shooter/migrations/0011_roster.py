@@ -0,0 +1,39 @@
+# Generated by Django 2.2.28 on 2026-10-18 03:45
+
+from django.db import migrations, models
+import django.db.models.deletion
+
+
+def populate_roster(apps, schema_editor):
+    Score = apps.get_model('shooter', 'Score')
+    Roster = apps.get_model('shooter', 'Roster')
+    members = Score.objects \
+        .filter(season__isnull=False) \
+        .values_list('season', 'team', 'shooter') \
+        .order_by() \
+        .distinct()
+    Roster.objects.bulk_create([Roster(season=season, team_id=team, shooter_id=shooter)
+                                for season, team, shooter in members])
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('shooter', '0010_season'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='Roster',
+            fields=[
+                ('id', models.AutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('season', models.IntegerField()),
+                ('shooter', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, to='shooter.Shooter')),
+                ('team', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, to='shooter.Team')),
+            ],
+            options={
+                'unique_together': {('season', 'team', 'shooter')},
+            },
+        ),
+        migrations.RunPython(populate_roster, migrations.RunPython.noop),
+    ]
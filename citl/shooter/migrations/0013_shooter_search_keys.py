@@ -0,0 +1,81 @@
+# Generated by Django 2.2.28 on 2026-10-18 03:55
+
+import unicodedata
+
+from django.db import DatabaseError, migrations, models, transaction
+
+
+# shooter.search.normalize() and shooter_keys() as they were when this migration was written, so that later
+# changes to search.py don't change what it does
+def normalize(text):
+    text = unicodedata.normalize('NFKD', text or '')
+    text = ''.join(c for c in text if not unicodedata.combining(c)).lower()
+    return ' '.join(''.join(c if c.isalnum() else ' ' for c in text).split())
+
+
+def shooter_keys(first_name, last_name, email):
+    first, last = normalize(first_name), normalize(last_name)
+    return (first + " " + last).strip(), (last + " " + first).strip(), (email or '').strip().lower()
+
+
+def populate_search_keys(apps, schema_editor):
+    Shooter = apps.get_model('shooter', 'Shooter')
+    shooters = list(Shooter.objects.only('pk', 'first_name', 'last_name', 'email'))
+    for shooter in shooters:
+        shooter.name_key, shooter.surname_key, shooter.email_key = \
+            shooter_keys(shooter.first_name, shooter.last_name, shooter.email)
+    Shooter.objects.bulk_update(shooters, ['name_key', 'surname_key', 'email_key'], batch_size=500)
+
+
+def add_trigram_index(apps, schema_editor):
+    # PostgreSQL only, and only where pg_trgm is (or may be) installed: search falls back to prefix matches
+    if schema_editor.connection.vendor != 'postgresql':
+        return
+    with schema_editor.connection.cursor() as cursor:
+        cursor.execute("SELECT 1 FROM pg_available_extensions WHERE name = 'pg_trgm'")
+        if cursor.fetchone() is None:
+            return
+        cursor.execute("SELECT 1 FROM pg_extension WHERE extname = 'pg_trgm'")
+        if cursor.fetchone() is None:
+            try:
+                with transaction.atomic(using=schema_editor.connection.alias):
+                    cursor.execute("CREATE EXTENSION IF NOT EXISTS pg_trgm")
+            except DatabaseError:
+                # Needs a privileged role; a DBA can run it later and migrate back and forward again
+                return
+        cursor.execute("CREATE INDEX IF NOT EXISTS shooter_shooter_name_key_trgm "
+                       "ON shooter_shooter USING gin (name_key gin_trgm_ops)")
+
+
+def drop_trigram_index(apps, schema_editor):
+    if schema_editor.connection.vendor != 'postgresql':
+        return
+    with schema_editor.connection.cursor() as cursor:
+        cursor.execute("DROP INDEX IF EXISTS shooter_shooter_name_key_trgm")
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('shooter', '0012_job'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='shooter',
+            name='email_key',
+            field=models.CharField(blank=True, db_index=True, editable=False, max_length=100),
+        ),
+        migrations.AddField(
+            model_name='shooter',
+            name='name_key',
+            field=models.CharField(blank=True, db_index=True, editable=False, max_length=101),
+        ),
+        migrations.AddField(
+            model_name='shooter',
+            name='surname_key',
+            field=models.CharField(blank=True, db_index=True, editable=False, max_length=101),
+        ),
+        migrations.RunPython(populate_search_keys, migrations.RunPython.noop),
+        migrations.RunPython(add_trigram_index, drop_trigram_index),
+    ]
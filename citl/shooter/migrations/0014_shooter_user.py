@@ -0,0 +1,21 @@
+# Generated by Django 2.2.28 on 2026-10-18 04:07
+
+from django.conf import settings
+from django.db import migrations, models
+import django.db.models.deletion
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+        ('shooter', '0013_shooter_search_keys'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='shooter',
+            name='user',
+            field=models.OneToOneField(blank=True, null=True, on_delete=django.db.models.deletion.SET_NULL, related_name='shooter', to=settings.AUTH_USER_MODEL),
+        ),
+    ]
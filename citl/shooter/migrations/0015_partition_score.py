@@ -0,0 +1,127 @@
+# Optional partitioning of shooter_score by season (PostgreSQL 11+, settings.SHOOTER_PARTITION_SCORES = True).
+#
+# The partitioned table keeps every constraint and index name Django gave the plain one, so later migrations on
+# Score find them, and Django's model state is unchanged: the ORM still treats id as the primary key, which stays
+# unique through its sequence. PostgreSQL needs the partition key in every unique constraint, so the primary key
+# becomes (id, season) and season can no longer be empty.
+#
+# On a database already past this migration, set SHOOTER_PARTITION_SCORES and run
+# `manage.py migrate shooter 0014` then `manage.py migrate shooter` (and the reverse to undo it).
+# `manage.py partition_scores --season YEAR` adds a new season's partition.
+
+from django.conf import settings
+from django.db import migrations
+
+TABLE = 'shooter_score'
+OLD = TABLE + '_unpartitioned'
+
+
+def _partitioned(cursor, table):
+    cursor.execute("SELECT 1 FROM pg_partitioned_table p JOIN pg_class c ON c.oid = p.partrelid "
+                   "WHERE c.relname = %s", [table])
+    return cursor.fetchone() is not None
+
+
+def _rebuild(schema_editor, partitioned):
+    """Copy shooter_score into a new table, partitioned by season or plain, and put back the constraints and
+    indexes of the old table under their old names
+    """
+    connection = schema_editor.connection
+    quote = schema_editor.quote_name
+
+    with connection.cursor() as cursor:
+        constraints = connection.introspection.get_constraints(cursor, TABLE)
+        cursor.execute("SELECT attidentity FROM pg_attribute WHERE attrelid = %s::regclass AND attname = 'id'",
+                       [TABLE])
+        identity = cursor.fetchone()[0] != ''
+
+        if partitioned:
+            cursor.execute("SELECT id FROM " + TABLE + " WHERE season IS NULL ORDER BY id LIMIT 20")
+            undated = [str(row[0]) for row in cursor.fetchall()]
+            if undated:
+                raise RuntimeError(
+                    "Partitioning by season needs a date on every score. Date or delete these scores and migrate "
+                    "again: " + ", ".join(undated))
+            cursor.execute("SELECT DISTINCT season FROM " + TABLE + " ORDER BY season")
+            years = [row[0] for row in cursor.fetchall()]
+
+    # Django 4.1+ creates id as an identity column, older versions as a serial with a sequence owned by the table
+    like = "LIKE %s INCLUDING DEFAULTS%s" % (quote(OLD), " INCLUDING IDENTITY" if identity else "")
+    sql = [
+        "ALTER TABLE %s RENAME TO %s" % (quote(TABLE), quote(OLD)),
+        "CREATE TABLE %s (%s)%s" % (quote(TABLE), like, " PARTITION BY LIST (season)" if partitioned else ""),
+    ]
+    if partitioned:
+        for year in years:
+            sql.append("CREATE TABLE %s PARTITION OF %s FOR VALUES IN (%d)"
+                       % (quote('%s_%d' % (TABLE, year)), quote(TABLE), year))
+        sql.append("CREATE TABLE %s PARTITION OF %s DEFAULT" % (quote(TABLE + '_default'), quote(TABLE)))
+    if identity:
+        sql += [
+            "INSERT INTO %s OVERRIDING SYSTEM VALUE SELECT * FROM %s" % (quote(TABLE), quote(OLD)),
+            "SELECT setval(pg_get_serial_sequence('%s', 'id'), COALESCE(MAX(id), 1)) FROM %s" % (TABLE, quote(TABLE)),
+        ]
+    else:
+        sql += [
+            # Otherwise dropping the old table drops the sequence too
+            "ALTER SEQUENCE %s OWNED BY %s.id" % (quote(TABLE + '_id_seq'), quote(TABLE)),
+            "INSERT INTO %s SELECT * FROM %s" % (quote(TABLE), quote(OLD)),
+        ]
+    # Frees the old constraint and index names
+    sql.append("DROP TABLE %s" % quote(OLD))
+
+    for name, constraint in sorted(constraints.items()):
+        columns = list(constraint['columns'])
+        if partitioned and (constraint['primary_key'] or constraint['unique']) and 'season' not in columns:
+            columns.append('season')
+        elif not partitioned and constraint['primary_key']:
+            columns = ['id']
+        column_list = ", ".join(quote(column) for column in columns)
+
+        if constraint['primary_key']:
+            sql.append("ALTER TABLE %s ADD CONSTRAINT %s PRIMARY KEY (%s)" % (quote(TABLE), quote(name), column_list))
+        elif constraint['unique']:
+            sql.append("ALTER TABLE %s ADD CONSTRAINT %s UNIQUE (%s)" % (quote(TABLE), quote(name), column_list))
+        elif constraint['foreign_key']:
+            to_table, to_column = constraint['foreign_key']
+            sql.append("ALTER TABLE %s ADD CONSTRAINT %s FOREIGN KEY (%s) REFERENCES %s (%s) "
+                       "DEFERRABLE INITIALLY DEFERRED" % (quote(TABLE), quote(name), column_list, quote(to_table),
+                                                          quote(to_column)))
+        elif constraint['index']:
+            sql.append("CREATE INDEX %s ON %s (%s)" % (quote(name), quote(TABLE), column_list))
+
+    for statement in sql:
+        schema_editor.execute(statement)
+
+
+def partition_scores(apps, schema_editor):
+    if schema_editor.connection.vendor != 'postgresql' or not getattr(settings, 'SHOOTER_PARTITION_SCORES', False):
+        return
+    with schema_editor.connection.cursor() as cursor:
+        if _partitioned(cursor, TABLE):
+            return
+    _rebuild(schema_editor, partitioned=True)
+
+
+def unpartition_scores(apps, schema_editor):
+    if schema_editor.connection.vendor != 'postgresql':
+        return
+    with schema_editor.connection.cursor() as cursor:
+        if not _partitioned(cursor, TABLE):
+            return
+    _rebuild(schema_editor, partitioned=False)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('shooter', '0014_shooter_user'),
+    ]
+
+    operations = [
+        # Database only: no model field, constraint or index changes name or meaning
+        migrations.SeparateDatabaseAndState(
+            database_operations=[migrations.RunPython(partition_scores, unpartition_scores)],
+            state_operations=[],
+        ),
+    ]
@@ -1,6 +1,11 @@
 # Shooter models
 
+import json
+
+from django.conf import settings
+from django.core.exceptions import ValidationError
 from django.db import models
+from django.utils import timezone
 
 
 class Shooter(models.Model):
@@ -15,6 +20,23 @@ class Shooter(models.Model):
 	rookie = models.BooleanField(default=False)
 	guest = models.BooleanField(default=False)
 	captain = models.BooleanField(default=False)
+	# The login a captain enters scores with, linked by a league admin. Only a linked captain gets captain rights
+	user = models.OneToOneField(settings.AUTH_USER_MODEL, on_delete=models.SET_NULL, blank=True, null=True,
+								related_name='shooter')
+	# Normalized copies of the name and email for search and duplicate checks (see shooter/search.py)
+	name_key = models.CharField(max_length=101, blank=True, editable=False, db_index=True)		# "first last"
+	surname_key = models.CharField(max_length=101, blank=True, editable=False, db_index=True)	# "last first"
+	email_key = models.CharField(max_length=100, blank=True, editable=False, db_index=True)
+
+	def set_search_keys(self):
+		"""Fill in the search keys. save() does it; call it yourself before bulk_create()
+		"""
+		from .search import shooter_keys
+		self.name_key, self.surname_key, self.email_key = shooter_keys(self.first_name, self.last_name, self.email)
+
+	def save(self, *args, **kwargs):
+		self.set_search_keys()
+		super(Shooter, self).save(*args, **kwargs)
 
 
 class Team(models.Model):
@@ -44,10 +66,28 @@ class Score(models.Model):
 	shooter = models.ForeignKey(Shooter, on_delete=models.CASCADE)
 	team = models.ForeignKey(Team, on_delete=models.CASCADE)
 	date = models.DateField(blank=True, null=True)
+	# The year of date, stored so season lookups can use an index. Kept in sync by save(); bulk_create callers
+	# must set it themselves
+	season = models.IntegerField(blank=True, null=True, editable=False)
 	week = models.IntegerField(choices=WEEK_CHOICES, default=0)
 	bunker_one = models.IntegerField(default=0)
 	bunker_two = models.IntegerField(default=0)
 
+	class Meta:
+		unique_together = ('shooter', 'season', 'week')
+		indexes = [
+			models.Index(fields=['season', 'team', 'week'], name='score_season_team_week'),
+			models.Index(fields=['season', 'shooter', 'week'], name='score_season_shooter_week'),
+		]
+
+	def clean(self):
+		if self.date and Season.objects.filter(year=self.date.year, status=Season.CLOSED).exists():
+			raise ValidationError("The " + str(self.date.year) + " season is closed.")
+
+	def save(self, *args, **kwargs):
+		self.season = self.date.year if self.date else None
+		super(Score, self).save(*args, **kwargs)
+
 
 class Scorecard(models.Model):
 
@@ -62,3 +102,184 @@ class Scorecard(models.Model):
 	total_targets = models.IntegerField(default=0)
 	rank_points = models.IntegerField(default=0)
 	bonus_points = models.IntegerField(default=0)
+
+	class Meta:
+		unique_together = ('team', 'season', 'week')
+
+
+class ScorecardLine(models.Model):
+	"""A shooter's row on a team's season scorecard. Maintained from Score writes by shooter/scorecards.py
+	"""
+
+	def __str__(self):
+		return str(self.team) + ": " \
+				+ str(self.shooter) + " " \
+				+ str(self.season)
+
+	EMPTY_WEEKS = ",".join(["0"] * 16)
+
+	team = models.ForeignKey(Team, on_delete=models.CASCADE)
+	shooter = models.ForeignKey(Shooter, on_delete=models.CASCADE)
+	season = models.IntegerField(default=1900)
+	# W0..W15 totals (bunker_one + bunker_two), comma separated
+	weeks = models.CharField(max_length=80, default=EMPTY_WEEKS)
+	weeks_shot = models.IntegerField(default=0)
+	average = models.FloatField(default=0)
+
+	class Meta:
+		unique_together = ('team', 'shooter', 'season')
+
+	@property
+	def week_totals(self):
+		return [int(w) for w in self.weeks.split(",")]
+
+
+class ShooterStats(models.Model):
+	"""A shooter's running statistics for a season across every team they shot for. Maintained from Score writes
+	by shooter/stats.py
+	"""
+
+	def __str__(self):
+		return str(self.shooter) + ": " + str(self.season)
+
+	shooter = models.ForeignKey(Shooter, on_delete=models.CASCADE)
+	season = models.IntegerField(default=1900)
+	scores = models.IntegerField(default=0)				# Score rows, W0 included
+	weeks_shot = models.IntegerField(default=0)			# league weeks (W1-W15) entered
+	shot_all = models.IntegerField(default=0)			# non-zero totals, W0 included
+	sum_all = models.IntegerField(default=0)
+	shot_league = models.IntegerField(default=0)		# non-zero totals, W1-W15
+	sum_league = models.IntegerField(default=0)
+	average = models.FloatField(default=0)
+	best_week = models.IntegerField(blank=True, null=True)
+	best_total = models.IntegerField(blank=True, null=True)
+	worst_week = models.IntegerField(blank=True, null=True)
+	worst_total = models.IntegerField(blank=True, null=True)
+
+	class Meta:
+		unique_together = ('shooter', 'season')
+
+	@property
+	def mean(self):
+		"""Mean of the league nights shot, without the W0 fallback
+		"""
+		return round(self.sum_league / self.shot_league, 2) if self.shot_league else None
+
+
+class Season(models.Model):
+	"""A league season. Closing one freezes its standings into SeasonSummary rows (see shooter/seasons.py)
+	"""
+
+	def __str__(self):
+		return str(self.year)
+
+	OPEN = 'open'
+	CLOSED = 'closed'
+	STATUS_CHOICES = (
+		(OPEN, 'Open'),
+		(CLOSED, 'Closed'),
+	)
+
+	year = models.IntegerField(unique=True)
+	status = models.CharField(max_length=10, choices=STATUS_CHOICES, default=OPEN)
+	closed_at = models.DateTimeField(blank=True, null=True)
+
+	@property
+	def closed(self):
+		return self.status == self.CLOSED
+
+
+class SeasonSummary(models.Model):
+	"""A team's final standing in a closed season. Written once when the season closes and never recomputed
+	"""
+
+	def __str__(self):
+		return str(self.season) + ": " + self.team_name
+
+	season = models.ForeignKey(Season, on_delete=models.CASCADE, related_name='summaries')
+	# The name is kept as it was at closing, and the row outlives the Team
+	team = models.ForeignKey(Team, blank=True, null=True, on_delete=models.SET_NULL)
+	team_name = models.CharField(max_length=100)
+	position = models.IntegerField(default=0)
+	place = models.CharField(max_length=8)
+	total_targets = models.IntegerField(default=0)
+	rank_points = models.IntegerField(default=0)
+	bonus_points = models.IntegerField(default=0)
+	points = models.IntegerField(default=0)
+	# W0..W15 team totals, comma separated
+	weeks = models.CharField(max_length=120)
+
+	class Meta:
+		unique_together = ('season', 'team_name')
+
+	@property
+	def week_totals(self):
+		return [int(w) for w in self.weeks.split(",")]
+
+
+class Roster(models.Model):
+	"""A shooter's membership of a team for a season. Written when shooters are added and when scores arrive
+	(see shooter/rosters.py), so season, team and roster lists are index lookups instead of DISTINCT over Score
+	"""
+
+	def __str__(self):
+		return str(self.team) + ": " \
+				+ str(self.shooter) + " " \
+				+ str(self.season)
+
+	season = models.IntegerField()
+	team = models.ForeignKey(Team, on_delete=models.CASCADE)
+	shooter = models.ForeignKey(Shooter, on_delete=models.CASCADE)
+
+	class Meta:
+		# Also the (season, team) index the team and roster lists read
+		unique_together = ('season', 'team', 'shooter')
+
+
+class Job(models.Model):
+	"""A long admin task (season scoring, imports, exports) queued for `manage.py run_jobs` (see shooter/jobs.py)
+	"""
+
+	def __str__(self):
+		return self.kind + " #" + str(self.pk) + " (" + self.status + ")"
+
+	QUEUED = 'queued'
+	RUNNING = 'running'
+	DONE = 'done'
+	FAILED = 'failed'
+	STATUS_CHOICES = (
+		(QUEUED, 'Queued'),
+		(RUNNING, 'Running'),
+		(DONE, 'Done'),
+		(FAILED, 'Failed'),
+	)
+
+	kind = models.CharField(max_length=40)
+	arguments = models.TextField(default='{}')						# JSON keyword arguments for the task
+	status = models.CharField(max_length=10, choices=STATUS_CHOICES, default=QUEUED)
+	attempts = models.IntegerField(default=0)
+	max_attempts = models.IntegerField(default=3)
+	progress = models.IntegerField(default=0)						# percent
+	message = models.CharField(max_length=255, blank=True)
+	error = models.TextField(blank=True)
+	input_file = models.FileField(upload_to='jobs/', blank=True)
+	output_file = models.FileField(upload_to='jobs/', blank=True)
+	created_by = models.ForeignKey(settings.AUTH_USER_MODEL, on_delete=models.SET_NULL, blank=True, null=True)
+	created_at = models.DateTimeField(default=timezone.now)
+	run_after = models.DateTimeField(default=timezone.now)			# pushed back between retries
+	started_at = models.DateTimeField(blank=True, null=True)
+	finished_at = models.DateTimeField(blank=True, null=True)
+	heartbeat = models.DateTimeField(blank=True, null=True)		# last sign of life from the worker
+	worker = models.CharField(max_length=100, blank=True)
+
+	class Meta:
+		# The worker's "next job" query
+		index_together = ('status', 'run_after')
+
+	@property
+	def kwargs(self):
+		return json.loads(self.arguments)
+
+	@property
+	def active(self):
+		return self.status in (self.QUEUED, self.RUNNING)
@@ -0,0 +1,96 @@
+# League roles
+#
+# Who may run the administration pages and enter scores. A user's roles are resolved once and kept in their
+# session: league admin (member of the league_admin_g group) and team captain (a Shooter marked captain and linked
+# to the user through Shooter.user, for the teams they shot for in their newest season). Emails are never matched:
+# anyone can type one in. Every later request only compares the session copy with a few cache.py stamps, no
+# database queries.
+#
+# The stamps are bumped by the receivers in signals.py when group membership or a group changes, or a shooter's
+# captain flag or user link does ('roles', 'roles:user:<pk>'), and team renames bump 'league'. A session copy is
+# also re-resolved after ROLES_TIMEOUT, which picks up a captain's new season.
+
+import time
+
+from django.contrib.auth.mixins import UserPassesTestMixin
+
+from . import cache
+from .models import Score
+
+ADMIN_GROUP = 'league_admin_g'
+SESSION_KEY = '_league_roles'
+ROLES_TIMEOUT = 60 * 15
+
+NO_ROLES = {'admin': False, 'captain_of': []}
+
+
+def _scopes(user):
+	return ['league', 'roles', 'roles:user:%s' % user.pk]
+
+
+def league_roles(request):
+	"""{'admin': bool, 'captain_of': [team names]} for the request's user
+	"""
+	user = request.user
+	if not user.is_authenticated:
+		return NO_ROLES
+
+	version = repr(cache.stamps(_scopes(user)))
+	roles = request.session.get(SESSION_KEY)
+	if roles is None or roles['user'] != user.pk or roles['version'] != version \
+			or roles['resolved'] + ROLES_TIMEOUT < time.time():
+		roles = resolve_roles(user)
+		roles.update(user=user.pk, version=version, resolved=time.time())
+		request.session[SESSION_KEY] = roles
+	return roles
+
+
+def resolve_roles(user):
+	"""Look a user's roles up in the database
+	"""
+	admin = user.groups.filter(name=ADMIN_GROUP).exists()
+
+	captain_of = []
+	scores = Score.objects.filter(shooter__user=user, shooter__captain=True, season__isnull=False)
+	season = scores.order_by('-season').values_list('season', flat=True).first()
+	if season is not None:
+		captain_of = sorted(set(scores \
+			.filter(season=season) \
+			.values_list('team__team_name', flat=True)))
+
+	return {'admin': admin, 'captain_of': captain_of}
+
+
+def roles_changed(user_ids=None):
+	"""Re-resolve these users' roles on their next request (everyone's when user_ids is None)
+	"""
+	if user_ids is None:
+		cache.bump('roles')
+	elif user_ids:
+		cache.bump(*['roles:user:%s' % pk for pk in user_ids])
+
+
+class LeagueAdminMixin(UserPassesTestMixin):
+	"""Views for league admins only
+	"""
+
+	def test_func(self):
+		return league_roles(self.request)['admin']
+
+
+class ScoreEntryMixin(UserPassesTestMixin):
+	"""Score entry for a team (the view's team URL kwarg): league admins, and that team's captains
+	"""
+
+	def test_func(self):
+		roles = league_roles(self.request)
+		return roles['admin'] or self.kwargs.get('team') in roles['captain_of']
+
+
+class LeagueStaffMixin(UserPassesTestMixin):
+	"""League admins and every team captain
+	"""
+
+	def test_func(self):
+		roles = league_roles(self.request)
+		return roles['admin'] or bool(roles['captain_of'])
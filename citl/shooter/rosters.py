@@ -0,0 +1,56 @@
+# Season rosters
+#
+# Roster rows (season, team, shooter) record who shot for which team in which season. NewShooterView enrolls a
+# new shooter on their team; every score write enrolls its shooter too, so the rows cover everything in Score.
+# Rows are never removed when scores are: a roster is membership, not a score count.
+
+from .models import Roster, Score, Shooter
+
+
+def enroll(season, team_id, shooter_ids):
+	"""Add shooters to a team's roster for a season, skipping the ones already on it
+	"""
+	if season is None:
+		return
+
+	on_roster = set(Roster.objects \
+		.filter(season=season, team=team_id, shooter__in=shooter_ids) \
+		.values_list('shooter', flat=True))
+	Roster.objects.bulk_create([Roster(season=season, team_id=team_id, shooter_id=shooter_id)
+								for shooter_id in set(shooter_ids) - on_roster])
+
+
+def refresh_rosters(season=None):
+	"""Enroll every (season, team, shooter) found in Score that is missing from Roster. Returns the number added
+	"""
+	members = Score.objects \
+		.filter(season__isnull=False) \
+		.values_list('season', 'team', 'shooter') \
+		.order_by() \
+		.distinct()
+	existing = Roster.objects.all()
+	if season is not None:
+		members = members.filter(season=season)
+		existing = existing.filter(season=season)
+
+	missing = set(members) - set(existing.values_list('season', 'team', 'shooter'))
+	Roster.objects.bulk_create([Roster(season=s, team_id=t, shooter_id=sh) for s, t, sh in missing])
+	return len(missing)
+
+
+def team_roster(season, team_id):
+	"""The team's shooters for a season, by name
+	"""
+	return list(Shooter.objects \
+		.filter(roster__season=season, roster__team=team_id) \
+		.order_by('last_name', 'first_name', 'pk'))
+
+
+def season_teams(season):
+	"""Names of the teams with a roster for a season
+	"""
+	return Roster.objects \
+		.filter(season=season) \
+		.values_list('team__team_name', flat=True) \
+		.order_by('team__team_name') \
+		.distinct()
@@ -0,0 +1,181 @@
+# Scorecard rollups
+#
+# ScorecardLine (one row per shooter, team and season) and Scorecard (one row per team, season and week) are
+# kept up to date from Score writes so the scorecard pages only read precomputed rows. The signal receivers in
+# signals.py call refresh_score() on every save/delete; rebuild_scorecards() recomputes everything from Score.
+# Line averages and weeks shot are computed in the scorecard_lines() query; full rebuilds score the season with the
+# batch scorer (batch.py) instead unless SHOOTER_BATCH_SCORING is False.
+
+from django.conf import settings
+from django.db import transaction
+from django.db.models import Case, Count, F, FloatField, IntegerField, Q, Sum, Value, When
+from django.db.models.functions import Cast
+
+from .batch import score_shooters
+from .models import Score, Scorecard, ScorecardLine
+
+WEEK_RANGE = range(0, 16)
+
+
+def refresh_score(team_id, shooter_id, season, week):
+	"""Recompute the shooter's scorecard line and the team's week total touched by a single Score
+	"""
+	if season is None:
+		return
+
+	with transaction.atomic():
+		refresh_line(team_id, shooter_id, season)
+		refresh_team_week(team_id, season, week)
+
+
+def scorecard_lines(season=None, averages=True):
+	"""One aggregate row per (season, team, shooter), grouped on ids so same-name shooters stay apart.
+
+	Each row has w0..w15 week totals and entered, a bitmask of the weeks with a score (bit n for week n). With
+	averages, it also has weeks_shot, the league weeks (W1-W15) with a score entered, zero or not, and the league
+	average: average(W1:W15) once a shooter has two or more weeks shot, otherwise average(W0:W15). Only weeks with
+	a non-zero total count toward the average. line_values() turns rows into ScorecardLine fields.
+	"""
+	total = F('bunker_one') + F('bunker_two')
+
+	weeks = {'w%d' % n: Sum(Case(When(week=n, then=total), default=Value(0), output_field=IntegerField()))
+			 for n in WEEK_RANGE}
+
+	lines = Score.objects \
+		.filter(season__isnull=False) \
+		.values('season', 'team', 'shooter') \
+		.annotate(
+			entered=Sum(Case(*[When(week=n, then=Value(1 << n)) for n in WEEK_RANGE],
+							 default=Value(0), output_field=IntegerField())),
+			**weeks) \
+		.order_by()
+
+	if averages:
+		shot = Q(bunker_one__gt=0) | Q(bunker_two__gt=0)
+		league_night = Q(week__gt=0)
+		lines = lines \
+			.annotate(
+				weeks_shot=Count('id', filter=league_night),
+				shot_all=Count('id', filter=shot),
+				sum_all=Sum(total, filter=shot),
+				shot_league=Count('id', filter=shot & league_night),
+				sum_league=Sum(total, filter=shot & league_night)) \
+			.annotate(average=Case(
+				When(shot_league__gte=2, then=Cast('sum_league', FloatField()) / F('shot_league')),
+				When(shot_all__gt=0, then=Cast('sum_all', FloatField()) / F('shot_all')),
+				default=Value(0.0), output_field=FloatField()))
+
+	if season is not None:
+		lines = lines.filter(season=season)
+
+	return lines
+
+
+def line_values(rows):
+	"""ScorecardLine field values for scorecard_lines() rows. Rows without the SQL averages are scored with the
+	batch scorer, all rows in one pass
+	"""
+	matrix = [[row['w%d' % n] for n in WEEK_RANGE] for row in rows]
+
+	if rows and 'average' not in rows[0]:
+		entered = [[(row['entered'] >> n) & 1 for n in WEEK_RANGE] for row in rows]
+		scores = score_shooters(matrix, entered)
+		scored = zip(scores.weeks_shot, scores.averages)
+	else:
+		scored = [(row['weeks_shot'], round(row['average'], 2)) for row in rows]
+
+	return [{
+		'weeks': ",".join(str(total) for total in week_totals),
+		'weeks_shot': weeks_shot,
+		'average': average,
+	} for week_totals, (weeks_shot, average) in zip(matrix, scored)]
+
+
+def refresh_line(team_id, shooter_id, season):
+	"""Recompute a single shooter's scorecard line for a team and season
+	"""
+	# Not .first(): ordering on pk would split the group
+	rows = list(scorecard_lines(season).filter(team=team_id, shooter=shooter_id))
+
+	if not rows:
+		ScorecardLine.objects.filter(team=team_id, shooter=shooter_id, season=season).delete()
+		return
+
+	ScorecardLine.objects.update_or_create(
+		team_id=team_id, shooter_id=shooter_id, season=season,
+		defaults=line_values(rows)[0])
+
+
+def refresh_team_scores(team_id, season, week, shooter_ids):
+	"""Refresh after a team's week of scores was written in bulk (bulk_create sends no signals)
+	"""
+	rows = list(scorecard_lines(season).filter(team=team_id, shooter__in=shooter_ids))
+
+	with transaction.atomic():
+		ScorecardLine.objects.filter(team=team_id, season=season, shooter__in=shooter_ids).delete()
+		ScorecardLine.objects.bulk_create([
+			ScorecardLine(team_id=team_id, shooter_id=row['shooter'], season=season, **values)
+			for row, values in zip(rows, line_values(rows))])
+		refresh_team_week(team_id, season, week)
+
+
+def refresh_team_week(team_id, season, week):
+	"""Recompute a team's total targets for one week of a season
+	"""
+	total = Score.objects \
+		.filter(team=team_id, season=season, week=week) \
+		.aggregate(total=Sum(F('bunker_one') + F('bunker_two')))['total']
+
+	if total is None:
+		Scorecard.objects.filter(team=team_id, season=season, week=week).delete()
+		return
+
+	Scorecard.objects.update_or_create(
+		team_id=team_id, season=season, week=week,
+		defaults={'total_targets': total})
+
+
+def rebuild_scorecards(season=None):
+	"""Recompute every scorecard line and team week total from Score rows. Returns (lines, weeks) written
+	"""
+	team_weeks = Score.objects \
+		.filter(season__isnull=False) \
+		.values('season', 'team', 'week') \
+		.annotate(total_targets=Sum(F('bunker_one') + F('bunker_two'))) \
+		.order_by()
+	lines = ScorecardLine.objects.all()
+	cards = Scorecard.objects.all()
+	if season is not None:
+		team_weeks = team_weeks.filter(season=season)
+		lines = lines.filter(season=season)
+		cards = cards.filter(season=season)
+
+	# The batch scorer (batch.py) scores a whole season faster than the database computes every average
+	batched = getattr(settings, 'SHOOTER_BATCH_SCORING', True)
+	rows = list(scorecard_lines(season, averages=not batched).iterator())
+	new_lines = [ScorecardLine(season=row['season'], team_id=row['team'], shooter_id=row['shooter'], **values)
+				 for row, values in zip(rows, line_values(rows))]
+
+	with transaction.atomic():
+		lines.delete()
+		ScorecardLine.objects.bulk_create(new_lines)
+
+		# Keep existing Scorecard rows (and their rank/bonus points); only the totals are derived from Score
+		existing = {(c.season, c.team_id, c.week): c for c in cards}
+		new_cards = []
+		weeks_written = 0
+		for row in team_weeks.iterator():
+			weeks_written += 1
+			key = (row['season'], row['team'], row['week'])
+			card = existing.pop(key, None)
+			if card is None:
+				new_cards.append(Scorecard(season=key[0], team_id=key[1], week=key[2],
+										   total_targets=row['total_targets']))
+			elif card.total_targets != row['total_targets']:
+				card.total_targets = row['total_targets']
+				card.save(update_fields=['total_targets'])
+		Scorecard.objects.filter(pk__in=[c.pk for c in existing.values()]).delete()
+		Scorecard.objects.bulk_create(new_cards)
+
+	return len(new_lines), weeks_written
+
@@ -0,0 +1,104 @@
+# Season scoring engine ("Run Scores")
+#
+# Computes total targets, target bonus, rookie bonus and rank points for every team and week of a season from the
+# season's scorecard lines and one aggregate query, then writes the Scorecard rows back in bulk. The query count
+# does not depend on the number of teams, shooters or weeks in the league.
+
+from django.conf import settings
+from django.db import transaction
+from django.db.models import Count, Q
+
+from .batch import WEEKS, team_totals
+from .models import Score, Scorecard, ScorecardLine
+
+# League rules. The first three can be changed with the settings of the same name
+PERFECT_BUNKER = 25				# A bunker is 25 targets; a perfect bunker earns a target bonus point
+TARGET_BONUS_POINTS = 1			# Per perfect bunker
+ROOKIE_BONUS_POINTS = 1			# Per rookie who shot for the team that week
+FIRST_WEEK = 1					# W0 is the starting average, not a shooting night, so it is never ranked
+
+
+def team_week_bonuses(season, weeks=None):
+	"""One aggregate row per team and league night: perfect bunkers and rookies who shot (a non-zero total)
+	"""
+	perfect = getattr(settings, 'PERFECT_BUNKER', PERFECT_BUNKER)
+	shot = Q(bunker_one__gt=0) | Q(bunker_two__gt=0)
+	scores = Score.objects.filter(season=season, week__gte=FIRST_WEEK)
+	if weeks is not None:
+		scores = scores.filter(week__in=weeks)
+	return scores \
+		.values('team', 'week') \
+		.annotate(
+			perfect_bunkers=Count('id', filter=Q(bunker_one=perfect)) + Count('id', filter=Q(bunker_two=perfect)),
+			rookies=Count('shooter', filter=Q(shooter__rookie=True) & shot, distinct=True)) \
+		.order_by()
+
+
+def rank_points(totals):
+	"""Rank teams on total targets for one week. Best team gets one point per team in the league, ties share
+	the higher points. totals is {team_id: total_targets}; returns {team_id: points}
+	"""
+	ordered = sorted(totals.items(), key=lambda item: item[1], reverse=True)
+	points = {}
+	previous = None
+	for position, (team_id, total) in enumerate(ordered):
+		if total != previous:
+			rank, previous = len(ordered) - position, total
+		points[team_id] = rank
+	return points
+
+
+def score_season(season, weeks=None):
+	"""Compute every team's Scorecard rows for a season, or only for the given weeks (ranks in one week do not
+	depend on any other week). Returns unsaved Scorecard instances
+	"""
+	weeks = list(range(WEEKS)) if weeks is None else sorted(set(weeks))
+
+	# Total targets come from the materialized scorecard lines, summed per team in one batch
+	lines = ScorecardLine.objects.filter(season=season).values_list('team', 'weeks')
+	teams = []
+	matrix = []
+	for team_id, line_weeks in lines:
+		teams.append(team_id)
+		matrix.append([int(w) for w in line_weeks.split(",")])
+	totals = team_totals(matrix, teams) if teams else {}
+
+	bonuses = {(row['team'], row['week']): row for row in team_week_bonuses(season, weeks)}
+	target_bonus = getattr(settings, 'TARGET_BONUS_POINTS', TARGET_BONUS_POINTS)
+	rookie_bonus = getattr(settings, 'ROOKIE_BONUS_POINTS', ROOKIE_BONUS_POINTS)
+
+	week_points = {}
+	for week in weeks:
+		shot = {team_id: t[week] for team_id, t in totals.items() if t[week] != 0}
+		week_points[week] = rank_points(shot)
+
+	scorecards = []
+	for team_id, t in totals.items():
+		for week in weeks:
+			if t[week] == 0:
+				continue
+			card = Scorecard(team_id=team_id, season=season, week=week, total_targets=t[week])
+			if week >= FIRST_WEEK:
+				bonus = bonuses.get((team_id, week))
+				card.rank_points = week_points[week][team_id]
+				if bonus is not None:
+					card.bonus_points = bonus['perfect_bunkers'] * target_bonus + bonus['rookies'] * rookie_bonus
+			scorecards.append(card)
+
+	return scorecards
+
+
+def run_season_scores(season, weeks=None):
+	"""Score a season (or some of its weeks) and replace those Scorecard rows in one transaction.
+	Returns the number of rows written
+	"""
+	scorecards = score_season(season, weeks)
+
+	with transaction.atomic():
+		stale = Scorecard.objects.filter(season=season)
+		if weeks is not None:
+			stale = stale.filter(week__in=weeks)
+		stale.delete()
+		Scorecard.objects.bulk_create(scorecards)
+
+	return len(scorecards)
@@ -0,0 +1,177 @@
+# Shooter search
+#
+# Every Shooter stores normalized search keys (lower case, accents and punctuation dropped): name_key
+# "first last", surname_key "last first" and email_key. A query matches shooters whose name or surname key starts
+# with it, so "jo", "john sm" and "smith j" all find John Smith.
+#
+# On PostgreSQL that is an indexed LIKE 'prefix%' (the keys are db_index fields, which get a pattern ops index),
+# topped up with pg_trgm similarity matches for typos when the extension is installed (migration 0013 adds it and
+# a trigram index on name_key where it can). Other backends can't use an index for LIKE, so each process keeps an
+# in-memory index instead: every name word and email as a sorted list, searched by bisection, rebuilt when a
+# shooter changes.
+#
+# cached_search() caches results per query until a shooter changes or a score moves them to a team. Used by
+# ShooterSearchView (shooters/search.json), which the new shooter page calls as you type to show who is already in
+# the league.
+
+import bisect
+import hashlib
+import threading
+import unicodedata
+
+from django.core.cache import cache as django_cache
+from django.db import connection
+from django.db.models import F, FloatField, Func, Q, Value
+
+from . import cache
+from .models import Shooter, Roster
+
+MAX_RESULTS = 50
+
+_index = None
+_index_lock = threading.Lock()
+_trigram = None
+
+
+def normalize(text):
+	"""'  José  O'Brien ' -> 'jose o brien'
+	"""
+	text = unicodedata.normalize('NFKD', text or '')
+	text = ''.join(c for c in text if not unicodedata.combining(c)).lower()
+	return ' '.join(''.join(c if c.isalnum() else ' ' for c in text).split())
+
+
+def shooter_keys(first_name, last_name, email):
+	"""(name_key, surname_key, email_key) for a shooter
+	"""
+	first, last = normalize(first_name), normalize(last_name)
+	return (first + " " + last).strip(), (last + " " + first).strip(), (email or '').strip().lower()
+
+
+class PrefixIndex(object):
+	"""Name words and emails of every shooter, sorted, for prefix lookups without the database
+	"""
+
+	def __init__(self, rows):
+		# rows: (pk, name_key, surname_key, email_key)
+		self.tokens = []
+		self.order = {}
+		for pk, name_key, surname_key, email_key in rows:
+			for token in set(name_key.split()):
+				self.tokens.append((token, pk))
+			if email_key:
+				self.tokens.append((email_key, pk))
+			self.order[pk] = surname_key
+		self.tokens.sort()
+
+	def _starting(self, prefix):
+		pks = set()
+		i = bisect.bisect_left(self.tokens, (prefix,))
+		while i < len(self.tokens) and self.tokens[i][0].startswith(prefix):
+			pks.add(self.tokens[i][1])
+			i += 1
+		return pks
+
+	def search(self, query, limit):
+		if '@' in query:
+			words = [query.strip().lower()]
+		else:
+			words = normalize(query).split()
+		if not words:
+			return []
+
+		# Every word of the query has to start one of the shooter's words
+		found = None
+		for word in sorted(words, key=len, reverse=True):
+			pks = self._starting(word)
+			found = pks if found is None else found & pks
+			if not found:
+				return []
+		return sorted(found, key=lambda pk: (self.order[pk], pk))[:limit]
+
+
+def prefix_index():
+	"""This process' PrefixIndex, rebuilt after any shooter changes
+	"""
+	global _index
+	version = cache.data_version('shooters')
+	if _index is None or _index[0] != version:
+		with _index_lock:
+			if _index is None or _index[0] != version:
+				rows = Shooter.objects.values_list('pk', 'name_key', 'surname_key', 'email_key')
+				_index = (version, PrefixIndex(rows))
+	return _index[1]
+
+
+def has_trigram():
+	global _trigram
+	if _trigram is None:
+		with connection.cursor() as cursor:
+			cursor.execute("SELECT 1 FROM pg_extension WHERE extname = 'pg_trgm'")
+			_trigram = cursor.fetchone() is not None
+	return _trigram
+
+
+def _database_search(query, limit):
+	key = normalize(query)
+	match = Q(email_key__startswith=query.strip().lower()) if '@' in query else Q()
+	if key:
+		match |= Q(name_key__startswith=key) | Q(surname_key__startswith=key)
+	if not match:
+		return []
+
+	pks = list(Shooter.objects \
+		.filter(match) \
+		.order_by('surname_key', 'pk') \
+		.values_list('pk', flat=True)[:limit])
+
+	# Close spellings for whatever room is left ("jon smiht"). The % operator (pg_trgm.similarity_threshold,
+	# 0.3 by default) is what the trigram index answers
+	if len(pks) < limit and key and len(key) >= 3 and has_trigram():
+		pks += list(Shooter.objects \
+			.exclude(pk__in=pks) \
+			.extra(where=['shooter_shooter.name_key %% %s'], params=[key]) \
+			.annotate(similarity=Func(F('name_key'), Value(key), function='similarity', output_field=FloatField())) \
+			.order_by('-similarity', 'surname_key') \
+			.values_list('pk', flat=True)[:limit - len(pks)])
+	return pks
+
+
+def search_shooters(query, limit=10):
+	"""Shooters matching query, best first: [{'id', 'name', 'team', 'season'}], with their newest roster team
+	"""
+	limit = max(1, min(limit, MAX_RESULTS))
+	if connection.vendor == 'postgresql':
+		pks = _database_search(query, limit)
+	else:
+		pks = prefix_index().search(query, limit)
+	if not pks:
+		return []
+
+	shooters = Shooter.objects.in_bulk(pks)
+	teams = {}
+	for shooter_id, team_name, season in Roster.objects \
+			.filter(shooter__in=pks) \
+			.order_by('shooter', '-season') \
+			.values_list('shooter', 'team__team_name', 'season'):
+		teams.setdefault(shooter_id, (team_name, season))
+
+	results = []
+	for pk in pks:
+		shooter = shooters[pk]
+		team_name, season = teams.get(pk, (None, None))
+		results.append({'id': pk, 'name': str(shooter), 'team': team_name, 'season': season})
+	return results
+
+
+def cached_search(query, limit=10):
+	"""search_shooters(), cached until a shooter changes or new scores change the rosters
+	"""
+	version = cache.data_version('shooters', 'seasons')
+	key = 'shooter:search:' + hashlib.md5(
+		(version + '|' + str(limit) + '|' + query.strip().lower()).encode('utf-8')).hexdigest()
+	results = django_cache.get(key)
+	if results is None:
+		results = search_shooters(query, limit)
+		django_cache.set(key, results, cache.PAGE_TIMEOUT)
+	return results
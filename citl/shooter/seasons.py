@@ -0,0 +1,103 @@
+# Season lifecycle
+#
+# Season rows list the league's seasons, so listing them never scans Score. Score writes register their season
+# with ensure_seasons(). Closing a season ranks it one last time and freezes every team's final standing and week
+# totals into SeasonSummary rows. From then on its standings and team list are read from those rows and no new
+# scores can be entered for it. On PostgreSQL, Score can also be partitioned by season (SHOOTER_PARTITION_SCORES,
+# see migration 0015), so current season queries only touch the current season's partition.
+
+from django.db import transaction
+from django.utils import timezone
+
+from . import cache
+from .models import Season, SeasonSummary, Scorecard
+from .scoring import run_season_scores
+from .standings import rank_teams
+
+# Years this process has seen a committed Season row for
+_known = set()
+
+
+class SeasonClosed(Exception):
+	pass
+
+
+def ensure_seasons(years):
+	"""Create Season rows for any new years. Free for years this process has seen before
+	"""
+	new = set(y for y in years if y is not None) - _known
+	if not new:
+		return
+
+	existing = set(Season.objects.filter(year__in=new).values_list('year', flat=True))
+	missing = new - existing
+	if missing:
+		for year in sorted(missing):
+			Season.objects.get_or_create(year=year)
+		transaction.on_commit(lambda: cache.bump('seasons'))
+	# Only once the rows are committed: if the surrounding transaction rolls back, the next call creates them again
+	transaction.on_commit(lambda: _known.update(new))
+
+
+def closed_years(years):
+	"""The years in years whose season is closed
+	"""
+	return set(Season.objects.filter(year__in=set(years), status=Season.CLOSED).values_list('year', flat=True))
+
+
+def check_open(years):
+	"""Raise SeasonClosed if any of years is a closed season
+	"""
+	closed = closed_years(years)
+	if closed:
+		raise SeasonClosed("Season " + ", ".join(str(y) for y in sorted(closed)) + " is closed")
+
+
+def close_season(year):
+	"""Rank the season one last time and freeze the standings. Returns the number of teams frozen
+	"""
+	with transaction.atomic():
+		season, created = Season.objects.select_for_update().get_or_create(year=year)
+		if season.closed:
+			raise SeasonClosed("Season " + str(year) + " is already closed")
+
+		run_season_scores(year)
+
+		weeks = {}
+		for team_id, team_name, week, total in Scorecard.objects \
+				.filter(season=year, week__range=(0, 15)) \
+				.values_list('team', 'team__team_name', 'week', 'total_targets'):
+			weeks.setdefault(team_name, (team_id, [0] * 16))[1][week] = total
+
+		summaries = []
+		for row in rank_teams(year):
+			team_id, totals = weeks.get(row['team'], (None, [0] * 16))
+			summaries.append(SeasonSummary(
+				season=season, team_id=team_id, team_name=row['team'], position=row['position'],
+				place=row['place'], total_targets=row['total_targets'], rank_points=row['rank_points'],
+				bonus_points=row['bonus_points'], points=row['points'], weeks=",".join(str(t) for t in totals)))
+		SeasonSummary.objects.bulk_create(summaries)
+
+		season.status = Season.CLOSED
+		season.closed_at = timezone.now()
+		season.save()
+
+	_season_changed(year)
+	return len(summaries)
+
+
+def reopen_season(year):
+	"""Undo close_season(): drop the frozen rows so the season is ranked from its scores again
+	"""
+	with transaction.atomic():
+		season = Season.objects.select_for_update().get(year=year)
+		season.summaries.all().delete()
+		season.status = Season.OPEN
+		season.closed_at = None
+		season.save()
+
+	_season_changed(year)
+
+
+def _season_changed(year):
+	cache.bump('seasons', 'season:%s' % year, 'standings:%s' % year)
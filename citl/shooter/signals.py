@@ -0,0 +1,139 @@
+# Signal receivers keeping the scorecard rollups and the page cache in step with writes (views, admin and shell)
+
+from django.contrib.auth.models import Group, User
+from django.db import transaction
+from django.db.models.signals import m2m_changed, pre_save, post_save, post_delete
+from django.dispatch import receiver
+
+from . import cache, live, rosters, seasons, standings, stats
+from .permissions import roles_changed
+from .models import Shooter, Team, Score
+from .scorecards import refresh_score
+
+
+def _score_key(score):
+	return (score.team_id, score.shooter_id, score.season, score.week)
+
+
+@receiver(pre_save, sender=Score)
+def remember_previous_score(sender, instance, raw=False, **kwargs):
+	"""An edit can move a Score to another shooter, team or week; remember where it was so both get refreshed
+	"""
+	instance._previous_key = None
+	if raw or instance.pk is None:
+		return
+
+	previous = Score.objects.filter(pk=instance.pk).select_related('team').first()
+	if previous is not None:
+		instance._previous_key = _score_key(previous)
+		instance._previous_team_name = previous.team.team_name
+		instance._previous_total = previous.bunker_one + previous.bunker_two
+
+
+@receiver(post_save, sender=Score)
+def score_saved(sender, instance, raw=False, **kwargs):
+	if raw:
+		return
+
+	key = _score_key(instance)
+	previous = getattr(instance, '_previous_key', None)
+	seasons.ensure_seasons([key[2]])
+	rosters.enroll(key[2], key[0], [key[1]])
+	if previous is not None and previous != key:
+		refresh_score(*previous)
+		cache.score_changed(previous[2], instance._previous_team_name)
+		standings.weeks_touched(previous[2], [previous[3]])
+	refresh_score(*key)
+	cache.score_changed(key[2], instance.team.team_name)
+	standings.weeks_touched(key[2], [key[3]])
+
+	# Running stats: take back what the score used to count for, then count what it is now
+	if previous is not None:
+		stats.score_removed(previous[1], previous[2], previous[3], instance._previous_total)
+	stats.score_added(instance.shooter_id, instance.season, instance.week, instance.bunker_one + instance.bunker_two)
+
+	if key[2] is not None:
+		transaction.on_commit(lambda: live.scores_posted(key[2], instance.team, key[3], [key[1]]))
+
+
+@receiver(post_delete, sender=Score)
+def score_deleted(sender, instance, **kwargs):
+	key = _score_key(instance)
+	refresh_score(*key)
+	cache.score_changed(key[2], instance.team.team_name)
+	standings.weeks_touched(key[2], [key[3]])
+	stats.score_removed(instance.shooter_id, instance.season, instance.week, instance.bunker_one + instance.bunker_two)
+
+
+@receiver(post_save, sender=Team)
+@receiver(post_delete, sender=Team)
+def team_changed(sender, instance, raw=False, **kwargs):
+	if not raw:
+		cache.team_changed()
+
+
+def _captain_key(shooter):
+	return (shooter.captain, shooter.user_id)
+
+
+@receiver(pre_save, sender=Shooter)
+def remember_previous_captain(sender, instance, raw=False, **kwargs):
+	instance._previous_captain = None
+	if raw or instance.pk is None:
+		return
+	instance._previous_captain = Shooter.objects \
+		.filter(pk=instance.pk) \
+		.values_list('captain', 'user') \
+		.first()
+
+
+@receiver(post_save, sender=Shooter)
+def shooter_changed(sender, instance, created=False, raw=False, **kwargs):
+	if raw:
+		return
+
+	cache.bump('shooters')
+	# The captain flag and user link decide who may enter a team's scores: re-resolve the users linked before and
+	# after, and only when one of them changed
+	previous = getattr(instance, '_previous_captain', None) or (False, None)
+	if previous != _captain_key(instance):
+		roles_changed([user_id for user_id in (previous[1], instance.user_id) if user_id is not None])
+	if created:
+		return
+
+	cache.shooter_changed(Score.objects \
+		.filter(shooter=instance, season__isnull=False) \
+		.values_list('season', 'team__team_name') \
+		.order_by() \
+		.distinct())
+	cache.bump('shooter:%s' % instance.pk)
+
+
+@receiver(post_delete, sender=Shooter)
+def shooter_deleted(sender, instance, **kwargs):
+	cache.bump('shooters')
+	if instance.user_id is not None:
+		roles_changed([instance.user_id])
+
+
+# League roles cached in sessions (see permissions.py)
+
+@receiver(m2m_changed, sender=User.groups.through)
+def group_membership_changed(sender, instance, action, reverse, pk_set, **kwargs):
+	if action not in ('post_add', 'post_remove', 'post_clear'):
+		return
+
+	if not reverse:
+		roles_changed([instance.pk])
+	elif pk_set is not None:
+		roles_changed(pk_set)
+	else:
+		# group.user_set.clear() doesn't say who was removed
+		roles_changed()
+
+
+@receiver(post_save, sender=Group)
+@receiver(post_delete, sender=Group)
+def group_changed(sender, instance, raw=False, **kwargs):
+	if not raw:
+		roles_changed()
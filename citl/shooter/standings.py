@@ -0,0 +1,129 @@
+# Season standings
+#
+# Rank and bonus points live on Scorecard rows (see scoring.py). Score writes mark the (season, week) pairs they
+# touch and, once the transaction commits, only those weeks are re-ranked: a week's ranks never depend on another
+# week. The leaderboard sums each team's points and is cached until the next standings change. A closed season's
+# standings are the SeasonSummary rows frozen when it closed (see seasons.py).
+
+import hashlib
+import threading
+
+from django.core.cache import cache as django_cache
+from django.db import transaction
+from django.db.models import Sum
+
+from . import cache
+from .models import Season, SeasonSummary, Scorecard
+from .scoring import FIRST_WEEK, run_season_scores
+
+_pending = threading.local()
+
+
+def weeks_touched(season, weeks):
+	"""Re-rank these weeks of a season once the current transaction commits (immediately outside one)
+	"""
+	if season is None:
+		return
+
+	pending = getattr(_pending, 'weeks', None)
+	if pending is None:
+		pending = _pending.weeks = set()
+	pending.update((season, week) for week in weeks)
+	transaction.on_commit(_flush)
+
+
+def _flush():
+	# Every write in a transaction registers a callback; the first one to run does all of the work
+	pending = getattr(_pending, 'weeks', None)
+	if not pending:
+		return
+	_pending.weeks = set()
+
+	seasons = {}
+	for season, week in pending:
+		seasons.setdefault(season, set()).add(week)
+	for season, weeks in seasons.items():
+		run_season_scores(season, weeks)
+		standings_changed(season)
+
+
+def standings_changed(season):
+	cache.bump('standings:%s' % season)
+
+
+def leaderboard(season):
+	"""Teams ordered by points (rank + bonus) with positions; tied teams share a position. Cached between writes
+	"""
+	stamps = cache.stamps(['league', 'standings:%s' % season])
+	key = 'shooter:leaderboard:%s:%s' % (season, hashlib.md5(repr(stamps).encode('utf-8')).hexdigest())
+	standings = django_cache.get(key)
+	if standings is None:
+		standings = _frozen_standings(season)
+		if standings is None:
+			standings = rank_teams(season)
+		django_cache.set(key, standings, cache.PAGE_TIMEOUT)
+	return standings
+
+
+def team_position(season, team_name):
+	for row in leaderboard(season):
+		if row['team'] == team_name:
+			return row
+	return None
+
+
+def _frozen_standings(season):
+	summaries = SeasonSummary.objects \
+		.filter(season__year=season, season__status=Season.CLOSED) \
+		.order_by('position', 'team_name')
+	if not summaries:
+		return None
+
+	return [{
+		'team': s.team_name,
+		'total_targets': s.total_targets,
+		'rank_points': s.rank_points,
+		'bonus_points': s.bonus_points,
+		'points': s.points,
+		'position': s.position,
+		'place': s.place,
+	} for s in summaries]
+
+
+def rank_teams(season):
+	"""Rank a season's teams from its Scorecard rows
+	"""
+	rows = Scorecard.objects \
+		.filter(season=season, week__gte=FIRST_WEEK) \
+		.values('team__team_name') \
+		.annotate(total_targets=Sum('total_targets'), rank_points=Sum('rank_points'),
+				  bonus_points=Sum('bonus_points')) \
+		.order_by()
+
+	standings = [{
+		'team': row['team__team_name'],
+		'total_targets': row['total_targets'],
+		'rank_points': row['rank_points'],
+		'bonus_points': row['bonus_points'],
+		'points': row['rank_points'] + row['bonus_points'],
+	} for row in rows]
+	standings.sort(key=lambda r: (-r['points'], -r['total_targets'], r['team']))
+
+	previous = None
+	for i, row in enumerate(standings, start=1):
+		if previous is not None and (row['points'], row['total_targets']) == previous[0]:
+			row['position'] = previous[1]
+		else:
+			row['position'] = i
+		row['place'] = ordinal(row['position'])
+		previous = ((row['points'], row['total_targets']), row['position'])
+
+	return standings
+
+
+def ordinal(n):
+	if 10 <= n % 100 <= 20:
+		suffix = 'th'
+	else:
+		suffix = {1: 'st', 2: 'nd', 3: 'rd'}.get(n % 10, 'th')
+	return str(n) + suffix
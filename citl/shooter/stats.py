@@ -0,0 +1,206 @@
+# Shooter statistics
+#
+# ShooterStats keeps one row of running totals per shooter and season, across every team the shooter shot for.
+# A single Score write adjusts the row by that score alone (add the new total, take back the old one), so reading
+# an average is one row instead of an aggregate over Score. Only taking back the best or worst week needs the
+# shooter's remaining scores, to find the next best or worst. Bulk writes recompute the shooters they touched with
+# refresh_stats().
+#
+# The average follows the scorecard rule: average(W1:W15) once two or more league weeks are shot, otherwise
+# average(W0:W15); only non-zero totals count.
+
+from django.db import transaction
+from django.db.models import F
+
+from . import cache
+from .models import Score, ShooterStats, ScorecardLine
+
+
+def score_added(shooter_id, season, week, total):
+	_adjust(shooter_id, season, week, total, 1)
+
+
+def score_removed(shooter_id, season, week, total):
+	_adjust(shooter_id, season, week, total, -1)
+
+
+def _adjust(shooter_id, season, week, total, sign):
+	if season is None:
+		return
+
+	with transaction.atomic():
+		stats = ShooterStats.objects.select_for_update().filter(shooter=shooter_id, season=season).first()
+		if stats is None:
+			if sign < 0:
+				return
+			stats = ShooterStats(shooter_id=shooter_id, season=season)
+
+		if sign > 0:
+			add(stats, week, total)
+		elif not remove(stats, week, total):
+			_find_extremes(stats)
+
+		if stats.scores > 0:
+			stats.save()
+		elif stats.pk is not None:
+			stats.delete()
+
+	stats_changed([shooter_id])
+
+
+def add(stats, week, total):
+	"""Count one score into a ShooterStats row
+	"""
+	stats.scores += 1
+	if week > 0:
+		stats.weeks_shot += 1
+	if total > 0:
+		stats.shot_all += 1
+		stats.sum_all += total
+		if week > 0:
+			stats.shot_league += 1
+			stats.sum_league += total
+			if stats.best_total is None or total > stats.best_total:
+				stats.best_week, stats.best_total = week, total
+			if stats.worst_total is None or total < stats.worst_total:
+				stats.worst_week, stats.worst_total = week, total
+	_set_average(stats)
+
+
+def remove(stats, week, total):
+	"""Take one score back out of a ShooterStats row. Returns False when it was the best or worst week, which
+	leaves those to be found again from the remaining scores
+	"""
+	stats.scores -= 1
+	if week > 0:
+		stats.weeks_shot -= 1
+	if total > 0:
+		stats.shot_all -= 1
+		stats.sum_all -= total
+		if week > 0:
+			stats.shot_league -= 1
+			stats.sum_league -= total
+	_set_average(stats)
+	return week not in (stats.best_week, stats.worst_week)
+
+
+def _set_average(stats):
+	if stats.shot_league >= 2:
+		stats.average = round(stats.sum_league / stats.shot_league, 2)
+	elif stats.shot_all > 0:
+		stats.average = round(stats.sum_all / stats.shot_all, 2)
+	else:
+		stats.average = 0
+
+
+def _find_extremes(stats):
+	totals = Score.objects \
+		.filter(shooter=stats.shooter_id, season=stats.season, week__gt=0) \
+		.annotate(total=F('bunker_one') + F('bunker_two')) \
+		.filter(total__gt=0) \
+		.values_list('week', 'total') \
+		.order_by('week')
+
+	stats.best_week = stats.best_total = stats.worst_week = stats.worst_total = None
+	for week, total in totals:
+		if stats.best_total is None or total > stats.best_total:
+			stats.best_week, stats.best_total = week, total
+		if stats.worst_total is None or total < stats.worst_total:
+			stats.worst_week, stats.worst_total = week, total
+
+
+def refresh_stats(season=None, shooter_ids=None):
+	"""Recompute ShooterStats from Score rows for a season (default every season), optionally only for some
+	shooters. Returns the number of rows written
+	"""
+	scores = Score.objects \
+		.filter(season__isnull=False) \
+		.annotate(total=F('bunker_one') + F('bunker_two')) \
+		.values_list('shooter', 'season', 'week', 'total') \
+		.order_by('week')
+	rows = ShooterStats.objects.all()
+	if season is not None:
+		scores = scores.filter(season=season)
+		rows = rows.filter(season=season)
+	if shooter_ids is not None:
+		scores = scores.filter(shooter__in=shooter_ids)
+		rows = rows.filter(shooter__in=shooter_ids)
+
+	stats = {}
+	for shooter_id, score_season, week, total in scores.iterator():
+		key = (shooter_id, score_season)
+		if key not in stats:
+			stats[key] = ShooterStats(shooter_id=shooter_id, season=score_season)
+		add(stats[key], week, total)
+
+	with transaction.atomic():
+		rows.delete()
+		ShooterStats.objects.bulk_create(stats.values())
+
+	if shooter_ids is None:
+		cache.bump('league')
+	else:
+		stats_changed(shooter_ids)
+	return len(stats)
+
+
+def stats_changed(shooter_ids):
+	scopes = ['shooter:%s' % shooter_id for shooter_id in shooter_ids]
+	if scopes:
+		transaction.on_commit(lambda: cache.bump(*scopes))
+
+
+def season_history(shooter):
+	"""The shooter's ShooterStats rows, newest season first, each with its teams and trend: the change in average
+	from the shooter's previous season
+	"""
+	history = list(ShooterStats.objects.filter(shooter=shooter).order_by('season'))
+
+	teams = {}
+	for season, team_name in ScorecardLine.objects \
+			.filter(shooter=shooter) \
+			.values_list('season', 'team__team_name') \
+			.order_by('team__team_name'):
+		teams.setdefault(season, []).append(team_name)
+
+	previous = None
+	for stats in history:
+		stats.teams = teams.get(stats.season, [])
+		stats.trend = round(stats.average - previous.average, 2) if previous is not None else None
+		previous = stats
+
+	history.reverse()
+	return history
+
+
+def as_dict(stats):
+	"""A season_history() row for the JSON views
+	"""
+	return {
+		'season': stats.season,
+		'teams': stats.teams,
+		'scores': stats.scores,
+		'weeks_shot': stats.weeks_shot,
+		'targets': stats.sum_all,
+		'average': stats.average,
+		'mean': stats.mean,
+		'best_week': stats.best_week,
+		'best_total': stats.best_total,
+		'worst_week': stats.worst_week,
+		'worst_total': stats.worst_total,
+		'trend': stats.trend,
+	}
+
+
+def career(history):
+	"""Career totals over a season_history() list
+	"""
+	shot_league = sum(s.shot_league for s in history)
+	sum_league = sum(s.sum_league for s in history)
+	return {
+		'seasons': len(history),
+		'weeks_shot': sum(s.weeks_shot for s in history),
+		'targets': sum(s.sum_all for s in history),
+		'mean': round(sum_league / shot_league, 2) if shot_league else None,
+		'best_total': max([s.best_total for s in history if s.best_total is not None], default=None),
+	}
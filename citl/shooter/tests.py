@@ -1,3 +1,1499 @@
-from django.test import TestCase
+# Shooter tests
+#
+# Behaviour tests for the scorecard rollups and the modules around them. Each test starts from an empty cache and
+# clears the per-process state (known seasons, search index) so tests don't see each other's writes.
+# Run with `manage.py test shooter`.
 
-# Create your tests here.
+import asyncio
+import base64
+import datetime
+import gzip
+import hashlib
+import json
+import os
+import shutil
+import tempfile
+import time
+from io import StringIO
+from unittest import mock, skipUnless
+
+import django
+from django.contrib.auth.models import Group, User
+from django.core.cache import cache as django_cache
+from django.core.exceptions import ImproperlyConfigured, ValidationError
+from django.core.files.base import ContentFile
+from django.core.files.storage import FileSystemStorage
+from django.core.management import call_command
+from django.core.management.base import CommandError
+from django.db import IntegrityError, connection, transaction
+from django.http import HttpResponse, StreamingHttpResponse
+from django.shortcuts import render
+from django.test import RequestFactory, SimpleTestCase, TestCase, TransactionTestCase, override_settings
+from django.test.utils import CaptureQueriesContext
+from django.urls import reverse
+from django.utils import timezone
+from django.views import View
+
+from citl import routers
+from citl.middleware import RequestTimingMiddleware
+from citl.staticfiles import CompressedManifestStorage, StaticFilesApplication, minify_css
+from citl.templating import template_settings
+from citl.views import AsyncIndexView
+
+from . import batch, cache, jobs, live, search, seasons
+from .api import ApiView, keyset_page
+from .benchmark import compare, run_benchmarks, seed_league
+from .export import stream as export_stream
+from .importer import SheetError, import_scores
+from .models import Job, Roster, Score, Scorecard, ScorecardLine, Season, SeasonSummary, Shooter, ShooterStats, Team
+from .permissions import ADMIN_GROUP, resolve_roles
+from .rosters import refresh_rosters, team_roster
+from .scorecards import line_values, rebuild_scorecards, scorecard_lines
+from .scoring import rank_points, run_season_scores
+from .standings import leaderboard, ordinal
+from .stats import refresh_stats
+
+YEAR = datetime.date.today().year
+
+
+def make_team(name, shooters=3, rookies=0):
+	"""A team and its shooters, the first `rookies` of them rookies
+	"""
+	team = Team.objects.create(team_name=name)
+	members = [Shooter.objects.create(first_name="Shooter" + str(n), last_name=name.replace(" ", ""),
+									  email="shooter%d@%s.example.com" % (n, team.pk), rookie=n < rookies)
+			   for n in range(shooters)]
+	return team, members
+
+
+def shoot(shooter, team, week, bunker_one, bunker_two, year=YEAR):
+	return Score.objects.create(shooter=shooter, team=team, date=datetime.date(year, 1, 1) + datetime.timedelta(weeks=week),
+								week=week, bunker_one=bunker_one, bunker_two=bunker_two)
+
+
+def make_admin(username='admin'):
+	user = User.objects.create_user(username, username + '@example.com', 'pw')
+	user.groups.add(Group.objects.get_or_create(name=ADMIN_GROUP)[0])
+	return user
+
+
+def reset_process_state():
+	django_cache.clear()
+	seasons._known.clear()
+	search._index = None
+
+
+class LeagueTestCase(TestCase):
+
+	def setUp(self):
+		reset_process_state()
+
+
+class LeagueTransactionTestCase(TransactionTestCase):
+	"""For behaviour that waits for the transaction to commit (standings, on_commit cache bumps)
+	"""
+
+	def setUp(self):
+		reset_process_state()
+
+
+# Scorecard rollups (scorecards.py, signals.py)
+
+class ScorecardRollupTests(LeagueTestCase):
+
+	def setUp(self):
+		super(ScorecardRollupTests, self).setUp()
+		self.team, self.shooters = make_team("Team A")
+		self.other, _ = make_team("Team B")
+
+	def test_score_writes_update_line_and_team_week(self):
+		shooter = self.shooters[0]
+		shoot(shooter, self.team, 0, 20, 20)
+		shoot(shooter, self.team, 1, 22, 23)
+		shoot(shooter, self.team, 2, 24, 23)
+		shoot(self.shooters[1], self.team, 1, 10, 10)
+
+		line = ScorecardLine.objects.get(team=self.team, shooter=shooter, season=YEAR)
+		self.assertEqual(line.week_totals, [40, 45, 47] + [0] * 13)
+		self.assertEqual(line.weeks_shot, 2)
+		self.assertEqual(line.average, 46.0)
+		self.assertEqual(Scorecard.objects.get(team=self.team, season=YEAR, week=1).total_targets, 65)
+
+	def test_zero_score_counts_as_week_shot(self):
+		shooter = self.shooters[0]
+		shoot(shooter, self.team, 0, 20, 20)
+		shoot(shooter, self.team, 1, 0, 0)
+
+		line = ScorecardLine.objects.get(team=self.team, shooter=shooter, season=YEAR)
+		self.assertEqual(line.weeks_shot, 1)
+		# One league night shot: the average falls back to every non-zero week
+		self.assertEqual(line.average, 40.0)
+
+	def test_moving_a_score_refreshes_both_teams(self):
+		score = shoot(self.shooters[0], self.team, 1, 20, 20)
+		score.team = self.other
+		score.save()
+
+		self.assertFalse(ScorecardLine.objects.filter(team=self.team).exists())
+		self.assertFalse(Scorecard.objects.filter(team=self.team).exists())
+		self.assertEqual(ScorecardLine.objects.get(team=self.other).week_totals[1], 40)
+		self.assertEqual(Scorecard.objects.get(team=self.other, week=1).total_targets, 40)
+
+	def test_deleting_the_last_score_removes_the_rows(self):
+		score = shoot(self.shooters[0], self.team, 3, 20, 21)
+		score.delete()
+
+		self.assertFalse(ScorecardLine.objects.exists())
+		self.assertFalse(Scorecard.objects.exists())
+
+	def test_rebuild_matches_incremental_rows(self):
+		for n, shooter in enumerate(self.shooters):
+			for week in range(0, 4):
+				shoot(shooter, self.team if n else self.other, week, 15 + n + week, 20)
+		columns = ('season', 'team', 'shooter', 'weeks', 'weeks_shot', 'average')
+		incremental = sorted(ScorecardLine.objects.values_list(*columns))
+		totals = sorted(Scorecard.objects.values_list('season', 'team', 'week', 'total_targets'))
+
+		ScorecardLine.objects.all().delete()
+		Scorecard.objects.all().delete()
+		rebuild_scorecards(YEAR)
+
+		self.assertEqual(sorted(ScorecardLine.objects.values_list(*columns)), incremental)
+		self.assertEqual(sorted(Scorecard.objects.values_list('season', 'team', 'week', 'total_targets')), totals)
+
+	def test_scorecard_page_shows_the_lines(self):
+		shoot(self.shooters[0], self.team, 1, 22, 23)
+		response = self.client.get(reverse('shooter:scorecard', args=[YEAR, "Team A"]))
+		self.assertContains(response, str(self.shooters[0]))
+		self.assertContains(response, "<td>45</td>", html=True)
+
+
+class ScorecardLinesTests(LeagueTestCase):
+
+	def test_same_name_shooters_stay_apart(self):
+		team, _ = make_team("Team A", shooters=0)
+		twins = [Shooter.objects.create(first_name="Sam", last_name="Lee", email="sam%d@example.com" % n)
+				 for n in range(2)]
+		shoot(twins[0], team, 1, 20, 20)
+		shoot(twins[1], team, 1, 10, 10)
+
+		lines = ScorecardLine.objects.filter(team=team).order_by('shooter')
+		self.assertEqual([line.week_totals[1] for line in lines], [40, 20])
+
+	def test_average_rule(self):
+		team, shooters = make_team("Team A", shooters=3)
+		# Two league nights: W1-W15 only, zero weeks left out
+		for week, total in ((0, 10), (1, 40), (2, 0), (3, 44)):
+			shoot(shooters[0], team, week, total, 0)
+		# One league night: W0-W15
+		shoot(shooters[1], team, 0, 30, 0)
+		shoot(shooters[1], team, 1, 41, 0)
+		# Nothing but zeros
+		shoot(shooters[2], team, 1, 0, 0)
+
+		# Computed in the query, and by the batch scorer for rebuilds
+		for averages in (True, False):
+			rows = list(scorecard_lines(YEAR, averages=averages))
+			self.assertEqual('average' in rows[0], averages)
+			values = {row['shooter']: v for row, v in zip(rows, line_values(rows))}
+			self.assertEqual([(values[s.pk]['weeks_shot'], values[s.pk]['average']) for s in shooters],
+							 [(3, 42.0), (1, 35.5), (1, 0.0)])
+			self.assertEqual(values[shooters[0].pk]['weeks'].split(",")[:4], ["10", "40", "0", "44"])
+
+	def test_rebuild_without_the_batch_scorer(self):
+		team, shooters = make_team("Team A", shooters=1)
+		shoot(shooters[0], team, 1, 20, 21)
+		shoot(shooters[0], team, 2, 22, 0)
+
+		with override_settings(SHOOTER_BATCH_SCORING=False):
+			rebuild_scorecards(YEAR)
+		line = ScorecardLine.objects.get(shooter=shooters[0])
+		self.assertEqual((line.weeks_shot, line.average), (2, 31.5))
+
+
+# Score rules (models.py)
+
+class ScoreTests(LeagueTestCase):
+
+	def setUp(self):
+		super(ScoreTests, self).setUp()
+		self.team, self.shooters = make_team("Team A", shooters=1)
+
+	def test_save_sets_season_from_date(self):
+		score = shoot(self.shooters[0], self.team, 1, 20, 20, year=2017)
+		self.assertEqual(score.season, 2017)
+		self.assertEqual(ScorecardLine.objects.get(shooter=self.shooters[0]).season, 2017)
+
+	def test_one_score_per_shooter_season_and_week(self):
+		shoot(self.shooters[0], self.team, 1, 20, 20)
+		with self.assertRaises(IntegrityError), transaction.atomic():
+			shoot(self.shooters[0], self.team, 1, 21, 21)
+
+		# The same week of another season is a different night
+		shoot(self.shooters[0], self.team, 1, 21, 21, year=YEAR - 1)
+
+	def test_clean_refuses_closed_seasons(self):
+		Season.objects.create(year=YEAR - 1, status=Season.CLOSED)
+		score = Score(shooter=self.shooters[0], team=self.team, date=datetime.date(YEAR - 1, 5, 1), week=1)
+		with self.assertRaises(ValidationError):
+			score.clean()
+
+
+# Batch scoring (batch.py)
+
+class BatchScoringTests(SimpleTestCase):
+
+	matrix = [
+		[40, 45, 47] + [0] * 13,
+		[38, 0, 0, 41] + [0] * 12,
+		[0] * 16,
+		[25, 50, 49, 48, 47, 46, 45, 44, 43, 42, 41, 40, 39, 38, 37, 36],
+	]
+
+	def test_averages_and_weeks_shot(self):
+		scores = batch._score_python(self.matrix, None)
+		self.assertEqual(scores.averages[:3], [46.0, 39.5, 0.0])
+		self.assertEqual(scores.weeks_shot, [2, 1, 0, 15])
+		self.assertEqual(scores.week_totals[0], 103)
+
+	def test_entered_weeks_count_zero_scores(self):
+		entered = [[1 if n < 4 else 0 for n in range(16)]] * len(self.matrix)
+		self.assertEqual(batch._score_python(self.matrix, entered).weeks_shot, [3, 3, 3, 3])
+
+	@skipUnless(batch.numpy is not None, "NumPy is not installed")
+	def test_numpy_matches_python(self):
+		entered = [[n % 2 for n in range(16)]] * len(self.matrix)
+		for argument in (None, entered):
+			self.assertEqual(batch._score_numpy(self.matrix, argument), batch._score_python(self.matrix, argument))
+
+	def test_team_totals(self):
+		totals = batch.team_totals(self.matrix, [1, 2, 1, 2])
+		self.assertEqual(totals[1][:3], [40, 45, 47])
+		self.assertEqual(totals[2][:4], [63, 50, 49, 89])
+
+
+# Running statistics (stats.py)
+
+class ShooterStatsTests(LeagueTestCase):
+
+	def setUp(self):
+		super(ShooterStatsTests, self).setUp()
+		self.team, shooters = make_team("Team A", shooters=1)
+		self.shooter = shooters[0]
+		self.scores = [shoot(self.shooter, self.team, week, b1, b2)
+					   for week, b1, b2 in ((0, 20, 20), (1, 22, 23), (2, 25, 24), (3, 18, 19), (4, 0, 0))]
+
+	def stats(self):
+		return ShooterStats.objects.get(shooter=self.shooter, season=YEAR)
+
+	def test_score_writes_keep_running_totals(self):
+		stats = self.stats()
+		self.assertEqual((stats.scores, stats.weeks_shot, stats.shot_league, stats.sum_league), (5, 4, 3, 131))
+		self.assertEqual(stats.average, 43.67)
+		self.assertEqual((stats.best_week, stats.best_total, stats.worst_week, stats.worst_total), (2, 49, 3, 37))
+
+	def test_removing_the_best_week_finds_the_next(self):
+		self.scores[2].delete()
+		stats = self.stats()
+		self.assertEqual((stats.best_week, stats.best_total), (1, 45))
+		self.assertEqual(stats.average, 41.0)
+
+		self.scores[2].pk = None
+		self.scores[2].save()
+		self.assertEqual((self.stats().best_week, self.stats().best_total), (2, 49))
+
+	def test_refresh_matches_running_totals(self):
+		columns = ('scores', 'weeks_shot', 'shot_all', 'sum_all', 'shot_league', 'sum_league', 'average',
+				   'best_week', 'best_total', 'worst_week', 'worst_total')
+		running = ShooterStats.objects.values_list(*columns).get()
+
+		ShooterStats.objects.all().delete()
+		self.assertEqual(refresh_stats(YEAR), 1)
+		self.assertEqual(ShooterStats.objects.values_list(*columns).get(), running)
+
+	def test_shooter_pages(self):
+		response = self.client.get(reverse('shooter:shooterjson', args=[self.shooter.pk]))
+		self.assertEqual(response.json()['seasons'][0]['teams'], ["Team A"])
+		self.assertEqual(response.json()['career']['best_total'], 49)
+		self.assertEqual(self.client.get(reverse('shooter:shooter', args=[self.shooter.pk])).status_code, 200)
+		self.assertEqual(self.client.get(reverse('shooter:shooter', args=[self.shooter.pk + 100])).status_code, 404)
+
+
+# Page cache (cache.py)
+
+class PageCacheTests(LeagueTestCase):
+
+	def setUp(self):
+		super(PageCacheTests, self).setUp()
+		self.team, self.shooters = make_team("Team A", shooters=2)
+		shoot(self.shooters[0], self.team, 1, 20, 20)
+		self.url = reverse('shooter:scorecard', args=[YEAR, "Team A"])
+
+	def test_conditional_get(self):
+		response = self.client.get(self.url)
+		self.assertEqual(response.status_code, 200)
+		self.assertEqual(self.client.get(self.url, HTTP_IF_NONE_MATCH=response['ETag']).status_code, 304)
+
+	def test_score_write_invalidates_the_page(self):
+		etag = self.client.get(self.url)['ETag']
+		shoot(self.shooters[1], self.team, 1, 21, 22)
+
+		response = self.client.get(self.url, HTTP_IF_NONE_MATCH=etag)
+		self.assertEqual(response.status_code, 200)
+		self.assertContains(response, str(self.shooters[1]))
+
+	def test_shooter_and_team_changes_invalidate_the_page(self):
+		etag = self.client.get(self.url)['ETag']
+		self.shooters[0].first_name = "Renamed"
+		self.shooters[0].save()
+		response = self.client.get(self.url, HTTP_IF_NONE_MATCH=etag)
+		self.assertContains(response, "Renamed")
+
+		etag = response['ETag']
+		Team.objects.create(team_name="Team C")
+		self.assertEqual(self.client.get(self.url, HTTP_IF_NONE_MATCH=etag).status_code, 200)
+
+	def test_other_teams_keep_their_page(self):
+		other, shooters = make_team("Team B", shooters=1)
+		shoot(shooters[0], other, 1, 20, 20)
+		etag = self.client.get(self.url)['ETag']
+
+		shoot(shooters[0], other, 2, 20, 20)
+		self.assertEqual(self.client.get(self.url, HTTP_IF_NONE_MATCH=etag).status_code, 304)
+
+	def test_logged_in_users_see_fresh_fragments(self):
+		self.client.force_login(make_admin())
+		self.client.get(self.url)
+
+		# A fragment hit skips the scorecard line query
+		with CaptureQueriesContext(connection) as queries:
+			self.client.get(self.url)
+		self.assertFalse([q for q in queries.captured_queries if 'shooter_scorecardline' in q['sql']])
+
+		shoot(self.shooters[1], self.team, 1, 21, 22)
+		self.assertContains(self.client.get(self.url), str(self.shooters[1]))
+
+	def test_season_pages(self):
+		self.assertContains(self.client.get(reverse('shooter:seasons')), str(YEAR))
+		self.assertContains(self.client.get(reverse('shooter:season', args=[YEAR])), "Team A")
+
+
+# Score entry (NewScoreView)
+
+class NewScoreTests(LeagueTestCase):
+
+	def setUp(self):
+		super(NewScoreTests, self).setUp()
+		self.team, self.shooters = make_team("Team A", shooters=2)
+		for shooter in self.shooters:
+			shoot(shooter, self.team, 0, 20, 20)
+		self.url = reverse('shooter:newscore', args=["Team A"])
+
+	def post_week(self, week, scores):
+		data = {
+			'date': datetime.date(YEAR, 3, 1).isoformat(),
+			'week': week,
+			'form-TOTAL_FORMS': len(scores),
+			'form-INITIAL_FORMS': 0,
+			'form-MIN_NUM_FORMS': 0,
+			'form-MAX_NUM_FORMS': 1000,
+		}
+		for n, (shooter, bunker_one, bunker_two) in enumerate(scores):
+			data['form-%d-shooter' % n] = shooter.pk
+			data['form-%d-bunker_one' % n] = bunker_one
+			data['form-%d-bunker_two' % n] = bunker_two
+		return self.client.post(self.url, data)
+
+	def messages(self, response):
+		return [str(m) for m in response.wsgi_request._messages]
+
+	def test_week_is_saved_with_rollups(self):
+		self.client.force_login(make_admin())
+		response = self.post_week(2, [(self.shooters[0], 20, 21), (self.shooters[1], 0, 0)])
+
+		self.assertRedirects(response, '/shooter/administration/', fetch_redirect_response=False)
+		# Rows with zero scores are not entries
+		self.assertEqual(Score.objects.filter(week=2).count(), 1)
+		self.assertEqual(ScorecardLine.objects.get(shooter=self.shooters[0]).week_totals[2], 41)
+		self.assertEqual(Scorecard.objects.get(team=self.team, season=YEAR, week=2).total_targets, 41)
+		self.assertEqual(ShooterStats.objects.get(shooter=self.shooters[0]).weeks_shot, 1)
+		self.assertEqual(self.messages(response), ["1 scores added for Team A W2."])
+
+	def test_duplicates_are_reported_not_saved(self):
+		self.client.force_login(make_admin())
+		self.post_week(2, [(self.shooters[0], 20, 21)])
+		# Already entered, and listed twice on the same sheet
+		response = self.post_week(2, [(self.shooters[0], 25, 25), (self.shooters[1], 22, 22),
+									  (self.shooters[1], 23, 23)])
+
+		self.assertEqual(Score.objects.filter(week=2).count(), 2)
+		self.assertEqual(Score.objects.get(shooter=self.shooters[0], week=2).bunker_one, 20)
+		self.assertEqual(Score.objects.get(shooter=self.shooters[1], week=2).bunker_one, 22)
+		self.assertIn("Already scored this week, not added: %s, %s." % (self.shooters[0], self.shooters[1]),
+					  self.messages(response)[-1])
+
+	def test_concurrent_submits_report_duplicates(self):
+		self.client.force_login(make_admin())
+		# Another submit saves the first shooter after this one's duplicate check
+		shoot(self.shooters[0], self.team, 2, 20, 21)
+		real_filter = Score.objects.filter
+		checks = []
+
+		def stale_check(*args, **kwargs):
+			if 'shooter__in' in kwargs and not checks:
+				checks.append(kwargs)
+				return Score.objects.none()
+			return real_filter(*args, **kwargs)
+
+		with mock.patch.object(Score.objects, 'filter', stale_check):
+			response = self.post_week(2, [(self.shooters[0], 25, 25), (self.shooters[1], 22, 22)])
+
+		self.assertEqual(response.status_code, 302)
+		self.assertEqual(Score.objects.get(shooter=self.shooters[0], week=2).bunker_one, 20)
+		self.assertEqual(Score.objects.get(shooter=self.shooters[1], week=2).bunker_one, 22)
+		self.assertEqual(self.messages(response), [
+			"1 scores added for Team A W2. Already scored this week, not added: %s." % self.shooters[0]])
+
+	def test_form_lists_the_team_roster_in_constant_queries(self):
+		other, outsiders = make_team("Team B", shooters=1)
+		shoot(outsiders[0], other, 0, 20, 20)
+		self.client.force_login(make_admin())
+		self.client.get(self.url)
+		with CaptureQueriesContext(connection) as queries:
+			self.client.get(self.url)
+		count = len(queries)
+
+		# Another shooter on the roster costs no extra query
+		newcomer = Shooter.objects.create(first_name="New", last_name="Comer", email="newcomer@example.com")
+		shoot(newcomer, self.team, 0, 20, 20)
+		with self.assertNumQueries(count):
+			response = self.client.get(self.url)
+
+		self.assertContains(response, str(self.shooters[0]))
+		self.assertNotContains(response, str(outsiders[0]))
+
+	def test_only_admins_and_captains_enter_scores(self):
+		self.assertEqual(self.post_week(2, [(self.shooters[0], 20, 21)]).status_code, 302)
+		self.assertFalse(Score.objects.filter(week=2).exists())
+
+		user = User.objects.create_user('captain', self.shooters[0].email, 'pw')
+		self.client.force_login(user)
+		# The same email is not enough: a league admin links the login to the shooter
+		self.assertEqual(self.client.get(self.url).status_code, 403)
+
+		self.shooters[0].captain = True
+		self.shooters[0].user = user
+		self.shooters[0].save()
+		self.assertEqual(self.client.get(self.url).status_code, 200)
+		self.assertEqual(self.client.get(reverse('shooter:administration')).status_code, 403)
+
+		# Captains come back to their own sheet
+		self.assertRedirects(self.post_week(2, [(self.shooters[0], 20, 21)]), self.url, fetch_redirect_response=False)
+
+		other, _ = make_team("Team B")
+		self.assertEqual(self.client.get(reverse('shooter:newscore', args=["Team B"])).status_code, 403)
+
+		self.shooters[0].captain = False
+		self.shooters[0].save()
+		self.assertEqual(self.client.get(self.url).status_code, 403)
+
+
+class RolesTests(LeagueTestCase):
+
+	def test_resolve_roles(self):
+		team, shooters = make_team("Team A", shooters=1)
+		shoot(shooters[0], team, 1, 20, 20)
+		user = User.objects.create_user('captain', 'captain@example.com', 'pw')
+		self.assertEqual(resolve_roles(user), {'admin': False, 'captain_of': []})
+
+		Shooter.objects.filter(pk=shooters[0].pk).update(captain=True, user=user)
+		self.assertEqual(resolve_roles(user), {'admin': False, 'captain_of': ["Team A"]})
+
+		user.groups.add(Group.objects.create(name=ADMIN_GROUP))
+		self.assertTrue(resolve_roles(user)['admin'])
+
+	def test_only_the_affected_users_are_invalidated(self):
+		team, shooters = make_team("Team A", shooters=2)
+		user = User.objects.create_user('captain', 'captain@example.com', 'pw')
+		before = cache.stamps(['roles', 'roles:user:%s' % user.pk])
+
+		# Unrelated shooter edits leave roles alone
+		shooters[1].first_name = "Renamed"
+		shooters[1].save()
+		self.assertEqual(cache.stamps(['roles', 'roles:user:%s' % user.pk]), before)
+
+		shooters[0].user = user
+		shooters[0].save()
+		after = cache.stamps(['roles', 'roles:user:%s' % user.pk])
+		self.assertEqual(after[0], before[0])
+		self.assertNotEqual(after[1], before[1])
+
+	def test_group_membership_reaches_the_session(self):
+		user = User.objects.create_user('someone', 'someone@example.com', 'pw')
+		group = Group.objects.create(name=ADMIN_GROUP)
+		self.client.force_login(user)
+		self.assertEqual(self.client.get(reverse('shooter:administration')).status_code, 403)
+
+		user.groups.add(group)
+		self.assertEqual(self.client.get(reverse('shooter:administration')).status_code, 200)
+
+
+# Run Scores (scoring.py)
+
+class RunScoresTests(LeagueTestCase):
+
+	def setUp(self):
+		super(RunScoresTests, self).setUp()
+		self.team_a, self.shooters_a = make_team("Team A", shooters=2, rookies=1)
+		self.team_b, shooters_b = make_team("Team B", shooters=2)
+		shoot(self.shooters_a[0], self.team_a, 0, 20, 20)
+		shoot(self.shooters_a[0], self.team_a, 1, 25, 20)
+		shoot(self.shooters_a[1], self.team_a, 1, 20, 20)
+		shoot(shooters_b[0], self.team_b, 1, 25, 25)
+		shoot(shooters_b[1], self.team_b, 1, 20, 21)
+
+	def test_rank_points_share_ties(self):
+		self.assertEqual(rank_points({1: 100, 2: 100, 3: 90}), {1: 3, 2: 3, 3: 1})
+		self.assertEqual(rank_points({1: 80, 2: 90, 3: 100, 4: 90}), {1: 1, 2: 3, 3: 4, 4: 3})
+		self.assertEqual(rank_points({}), {})
+
+	def test_rank_and_bonus_points(self):
+		self.assertEqual(run_season_scores(YEAR), 3)
+
+		card_a = Scorecard.objects.get(team=self.team_a, season=YEAR, week=1)
+		card_b = Scorecard.objects.get(team=self.team_b, season=YEAR, week=1)
+		self.assertEqual((card_a.total_targets, card_a.rank_points, card_a.bonus_points), (85, 1, 2))
+		self.assertEqual((card_b.total_targets, card_b.rank_points, card_b.bonus_points), (91, 2, 2))
+		# W0 is the starting average, never ranked
+		card_w0 = Scorecard.objects.get(team=self.team_a, season=YEAR, week=0)
+		self.assertEqual((card_w0.rank_points, card_w0.bonus_points), (0, 0))
+
+	@override_settings(TARGET_BONUS_POINTS=2, ROOKIE_BONUS_POINTS=3)
+	def test_bonus_points_follow_the_settings(self):
+		rookie, veteran = self.shooters_a
+		# A rookie on the sheet with a zero total did not shoot
+		shoot(rookie, self.team_a, 2, 0, 0)
+		shoot(veteran, self.team_a, 2, 20, 20)
+		run_season_scores(YEAR)
+
+		self.assertEqual(Scorecard.objects.get(team=self.team_a, season=YEAR, week=1).bonus_points, 5)
+		self.assertEqual(Scorecard.objects.get(team=self.team_a, season=YEAR, week=2).bonus_points, 0)
+
+	def test_run_scores_button(self):
+		url = reverse('shooter:administration')
+		self.assertEqual(self.client.post(url, {'run_scores': '1'}).status_code, 302)
+		self.assertFalse(Scorecard.objects.filter(rank_points__gt=0).exists())
+
+		self.client.force_login(make_admin())
+		self.client.post(url, {'run_scores': '1'})
+		# The button queues the scoring for a worker
+		self.assertFalse(Scorecard.objects.filter(rank_points__gt=0).exists())
+		jobs.run(jobs.claim('test'))
+		self.assertEqual(Scorecard.objects.get(team=self.team_b, week=1).rank_points, 2)
+
+
+# Standings (standings.py)
+
+class StandingsTests(LeagueTransactionTestCase):
+
+	def test_committed_scores_rerank_the_leaderboard(self):
+		team_a, shooters_a = make_team("Team A", shooters=1)
+		team_b, shooters_b = make_team("Team B", shooters=1)
+		shoot(shooters_a[0], team_a, 1, 20, 20)
+		shoot(shooters_b[0], team_b, 1, 22, 22)
+
+		self.assertEqual([(r['team'], r['points'], r['place']) for r in leaderboard(YEAR)],
+						 [("Team B", 2, "1st"), ("Team A", 1, "2nd")])
+
+		# A cached leaderboard is replaced once the next score commits
+		shoot(shooters_a[0], team_a, 2, 22, 22)
+		shoot(shooters_b[0], team_b, 2, 20, 20)
+		# Level on points and targets: both are first
+		self.assertEqual([(r['team'], r['points'], r['place']) for r in leaderboard(YEAR)],
+						 [("Team A", 3, "1st"), ("Team B", 3, "1st")])
+
+	def test_standings_pages(self):
+		team, shooters = make_team("Team A", shooters=1)
+		shoot(shooters[0], team, 1, 20, 20)
+
+		response = self.client.get(reverse('shooter:standingsjson', args=[YEAR]))
+		self.assertEqual(response.status_code, 200)
+		self.assertEqual(response.json()['standings'][0]['team'], "Team A")
+		self.assertEqual(self.client.get(reverse('shooter:standings', args=[YEAR])).status_code, 200)
+
+	def test_ordinal(self):
+		self.assertEqual([ordinal(n) for n in (1, 2, 3, 4, 11, 12, 13, 21, 22, 101)],
+						 ["1st", "2nd", "3rd", "4th", "11th", "12th", "13th", "21st", "22nd", "101st"])
+
+
+# JSON API (api.py)
+
+class ApiTests(LeagueTestCase):
+
+	def setUp(self):
+		super(ApiTests, self).setUp()
+		self.team, self.shooters = make_team("Team A", shooters=5)
+		for shooter in self.shooters:
+			shoot(shooter, self.team, 1, 20, 20)
+
+	def test_keyset_pages_cover_every_row_once(self):
+		url = reverse('shooter:api-shooters') + '?limit=2'
+		seen = []
+		while url:
+			data = self.client.get(url).json()
+			self.assertLessEqual(len(data['results']), 2)
+			seen += [row['id'] for row in data['results']]
+			url = data['next']
+
+		self.assertEqual(seen, list(Shooter.objects.order_by('last_name', 'first_name', 'id').values_list('id', flat=True)))
+
+	def test_descending_keyset(self):
+		for year in (YEAR - 2, YEAR - 1):
+			shoot(self.shooters[0], self.team, 1, 20, 20, year=year)
+		seasons = Score.objects.filter(shooter=self.shooters[0]).values('season')
+		rows, cursor = keyset_page(seasons, ['-season'], limit=2)
+		self.assertEqual([r['season'] for r in rows], [YEAR, YEAR - 1])
+		rows, cursor = keyset_page(seasons, ['-season'], after=cursor, limit=2)
+		self.assertEqual(([r['season'] for r in rows], cursor), ([YEAR - 2], None))
+
+	def test_bad_requests(self):
+		url = reverse('shooter:api-shooters')
+		bad_cursor = base64.urlsafe_b64encode(b'"x"').decode('ascii')
+		for params in ({'after': 'not base64!'}, {'after': bad_cursor}, {'limit': 'ten'}, {'limit': 0}):
+			self.assertEqual(self.client.get(url, params).status_code, 400, params)
+		self.assertEqual(self.client.get(reverse('shooter:api-scorecard', args=[YEAR, "Nobody"])).status_code, 404)
+
+	def test_etag_changes_with_the_data(self):
+		url = reverse('shooter:api-scorecard', args=[YEAR, "Team A"])
+		response = self.client.get(url)
+		self.assertTrue(response['ETag'].startswith('W/"'))
+		self.assertEqual(self.client.get(url, HTTP_IF_NONE_MATCH=response['ETag']).status_code, 304)
+
+		shoot(self.shooters[0], self.team, 2, 25, 25)
+		response = self.client.get(url, HTTP_IF_NONE_MATCH=response['ETag'])
+		self.assertEqual(response.status_code, 200)
+		self.assertEqual(response.json()['week_totals'][2], 50)
+
+	def test_gzip_and_fields(self):
+		url = reverse('shooter:api-scorecard', args=[YEAR, "Team A"])
+		response = self.client.get(url, {'fields': 'name,average'}, HTTP_ACCEPT_ENCODING='gzip')
+		self.assertEqual(response['Content-Encoding'], 'gzip')
+		data = json.loads(gzip.decompress(response.content).decode('utf-8'))
+		self.assertEqual(set(data['results'][0]), {'name', 'average'})
+		self.assertEqual(len(data['results']), 5)
+
+	def test_seasons_teams_and_shooter(self):
+		self.assertEqual(self.client.get(reverse('shooter:api-seasons')).json()['results'][0]['season'], YEAR)
+		self.assertEqual(self.client.get(reverse('shooter:api-teams', args=[YEAR])).json()['results'][0]['team'],
+						 "Team A")
+		data = self.client.get(reverse('shooter:api-shooter', args=[self.shooters[0].pk])).json()
+		self.assertEqual(data['results'][0]['average'], 40.0)
+		self.assertEqual(self.client.get(reverse('shooter:api-shooter', args=[0])).status_code, 404)
+
+	def test_api_views_need_a_payload(self):
+		with self.assertRaises(ImproperlyConfigured):
+			ApiView.as_view()
+
+		view = ApiView.as_view(payload=lambda request, year: {'season': year, 'results': [{'a': 1}], 'next': None})
+		response = view(RequestFactory().get('/api/'), year=YEAR)
+		self.assertEqual(json.loads(response.content.decode('utf-8'))['season'], YEAR)
+
+
+# Shooter search (search.py)
+
+class SearchTests(LeagueTestCase):
+
+	def setUp(self):
+		super(SearchTests, self).setUp()
+		self.smith = Shooter.objects.create(first_name="John", last_name="Smith", email="jsmith@example.com")
+		self.obrien = Shooter.objects.create(first_name="José", last_name="O'Brien", email="jose@example.com")
+		Shooter.objects.create(first_name="Mary", last_name="Johnson", email="mary@example.com")
+
+	def test_normalize(self):
+		self.assertEqual(search.normalize("  José  O'Brien "), "jose o brien")
+		self.assertEqual(self.obrien.name_key, "jose o brien")
+		self.assertEqual(self.obrien.surname_key, "o brien jose")
+
+	def test_prefixes_of_any_name_word(self):
+		def names(query):
+			return [r['name'] for r in search.search_shooters(query)]
+
+		self.assertEqual(names("jo"), ["Mary Johnson", "José O'Brien", "John Smith"])
+		self.assertEqual(names("smith j"), ["John Smith"])
+		self.assertEqual(names("JOSE OBR"), [])
+		self.assertEqual(names("jose o"), ["José O'Brien"])
+		self.assertEqual(names("jsmith@"), ["John Smith"])
+
+	def test_index_follows_shooter_changes(self):
+		self.assertEqual(search.search_shooters("smith")[0]['id'], self.smith.pk)
+		self.smith.last_name = "Smythe"
+		self.smith.save()
+		self.assertEqual(search.search_shooters("smith"), [])
+
+	def test_search_endpoint(self):
+		url = reverse('shooter:shootersearch')
+		self.assertEqual(self.client.get(url, {'q': 'jo'}).status_code, 302)
+
+		self.client.force_login(make_admin())
+		data = self.client.get(url, {'q': 'jo', 'limit': 1}).json()
+		self.assertEqual(len(data['results']), 1)
+		self.assertEqual(self.client.get(url, {'q': 'jo', 'limit': 'x'}).status_code, 400)
+
+
+# Live scoreboard (live.py)
+
+class LiveTests(LeagueTestCase):
+
+	def setUp(self):
+		super(LiveTests, self).setUp()
+		live.hub = live.Hub()
+		self.addCleanup(setattr, live, 'hub', live.hub)
+
+	def test_publish_reaches_subscribers_and_the_log(self):
+		subscriber = live.hub.subscribe()
+		self.addCleanup(live.hub.unsubscribe, subscriber)
+		event = live.publish('standings', YEAR, None, {'standings': []})
+
+		self.assertEqual(subscriber.get_nowait(), event)
+		self.assertEqual(live.events_since(event['id'] - 1), [event])
+		self.assertEqual(live.events_since(event['id']), [])
+
+	def test_stream_replays_missed_events_for_its_team(self):
+		first = live.publish('scorecard', YEAR, "Team A", {'week': 1})
+		live.publish('scorecard', YEAR, "Team B", {'week': 1})
+		live.publish('scorecard', YEAR - 1, "Team A", {'week': 1})
+		missed = live.publish('standings', YEAR, None, {'standings': []})
+
+		subscriber = live.hub.subscribe()
+		events = live.stream(subscriber, YEAR, "Team A", last_event_id=first['id'] - 1)
+		self.assertEqual(next(events), "retry: 5000\n\n")
+		self.assertEqual(next(events), live.format_event(first))
+		self.assertEqual(next(events), live.format_event(missed))
+
+		# Queued events already replayed are not sent twice
+		subscriber.put_nowait(missed)
+		later = live.publish('scorecard', YEAR, "Team A", {'week': 2})
+		self.assertEqual(next(events), live.format_event(later))
+
+		events.close()
+		self.assertNotIn(subscriber, live.hub.subscribers)
+
+	def test_scores_posted_publishes_lines_and_standings(self):
+		team, shooters = make_team("Team A", shooters=1)
+		shoot(shooters[0], team, 1, 20, 21)
+		subscriber = live.hub.subscribe()
+		self.addCleanup(live.hub.unsubscribe, subscriber)
+
+		live.scores_posted(YEAR, team, 1, [shooters[0].pk])
+		scorecard, standings = subscriber.get_nowait(), subscriber.get_nowait()
+		self.assertEqual(scorecard['data']['total_targets'], 41)
+		self.assertEqual(scorecard['data']['lines'][0]['weeks'][1], 41)
+		self.assertEqual(standings['event'], 'standings')
+
+	@override_settings(LIVE_POLL_RETRY=10)
+	def test_wsgi_viewers_are_polled_by_default(self):
+		url = reverse('shooter:live', args=[YEAR]) + "?team=Team+A"
+		mine = live.publish('scorecard', YEAR, "Team A", {'week': 1})
+
+		# A first visit learns where the log is and comes back later
+		response = self.client.get(url)
+		self.assertFalse(response.streaming)
+		self.assertEqual(response.content.decode('utf-8'), "retry: 10000\n\nid: %d\n\n" % mine['id'])
+		self.assertFalse(live.hub.subscribers)
+
+		# The next visit gets what it missed; other teams' events still move it on
+		later = live.publish('scorecard', YEAR, "Team A", {'week': 2})
+		other = live.publish('scorecard', YEAR, "Team B", {'week': 2})
+		response = self.client.get(url, HTTP_LAST_EVENT_ID=str(mine['id']))
+		self.assertEqual(response.content.decode('utf-8'),
+						 "retry: 10000\n\n" + live.format_event(later) + "id: %d\n\n" % other['id'])
+
+	@override_settings(LIVE_MAX_SYNC_STREAMS=1)
+	def test_wsgi_streams_are_capped(self):
+		url = reverse('shooter:live', args=[YEAR])
+		response = self.client.get(url)
+		self.assertTrue(response.streaming)
+		self.addCleanup(response.close)
+		self.assertEqual(len(live.hub.subscribers), 1)
+
+		self.assertFalse(self.client.get(url).streaming)
+
+	@override_settings(LIVE_MAX_CLIENTS=1, LIVE_MAX_SYNC_STREAMS=5)
+	def test_full_hub_turns_viewers_away(self):
+		subscriber = live.hub.subscribe()
+		self.addCleanup(live.hub.unsubscribe, subscriber)
+		response = self.client.get(reverse('shooter:live', args=[YEAR]))
+		self.assertEqual(response.status_code, 503)
+
+
+# Seasons (seasons.py)
+
+class SeasonTests(LeagueTestCase):
+
+	def setUp(self):
+		super(SeasonTests, self).setUp()
+		self.team_a, shooters_a = make_team("Team A", shooters=1)
+		self.team_b, shooters_b = make_team("Team B", shooters=1)
+		shoot(shooters_a[0], self.team_a, 1, 25, 25, year=2016)
+		shoot(shooters_b[0], self.team_b, 1, 20, 20, year=2016)
+
+	def test_scores_register_their_season(self):
+		self.assertEqual(list(Season.objects.values_list('year', 'status')), [(2016, Season.OPEN)])
+
+	def test_close_freezes_standings(self):
+		self.assertEqual(seasons.close_season(2016), 2)
+
+		summaries = SeasonSummary.objects.filter(season__year=2016).order_by('position')
+		self.assertEqual([(s.team_name, s.place, s.points) for s in summaries],
+						 [("Team A", "1st", 4), ("Team B", "2nd", 1)])
+		self.assertEqual(summaries[0].week_totals[1], 50)
+		self.assertTrue(Season.objects.get(year=2016).closed)
+
+		# The frozen rows outlive the teams
+		self.team_a.delete()
+		self.assertEqual(leaderboard(2016)[0]['team'], "Team A")
+
+	def test_closed_season_refuses_changes(self):
+		seasons.close_season(2016)
+		with self.assertRaises(seasons.SeasonClosed):
+			seasons.close_season(2016)
+		with self.assertRaises(seasons.SeasonClosed):
+			seasons.check_open([2015, 2016])
+		with self.assertRaises(SheetError):
+			import_scores(["team,shooter,date,week,bunker_one,bunker_two",
+						   "Team A,New Shooter,2016-05-01,W2,20,20"])
+
+	def test_reopen(self):
+		seasons.close_season(2016)
+		seasons.reopen_season(2016)
+		self.assertFalse(SeasonSummary.objects.exists())
+		self.assertFalse(Season.objects.get(year=2016).closed)
+
+	def test_seasons_are_remembered_only_after_commit(self):
+		reset_process_state()
+		try:
+			with transaction.atomic():
+				seasons.ensure_seasons([2014])
+				raise RuntimeError
+		except RuntimeError:
+			pass
+
+		# The rolled back row has to be created again
+		self.assertNotIn(2014, seasons._known)
+		seasons.ensure_seasons([2014])
+		self.assertTrue(Season.objects.filter(year=2014).exists())
+
+	def test_partition_command(self):
+		out = StringIO()
+		call_command('partition_scores', season=2017, stdout=out)
+		self.assertEqual(out.getvalue().strip(),
+						 "CREATE TABLE shooter_score_2017 PARTITION OF shooter_score FOR VALUES IN (2017);")
+
+		# Only a partitioned PostgreSQL table can take a new partition
+		if connection.vendor != 'postgresql':
+			with self.assertRaises(CommandError):
+				call_command('partition_scores', season=2017, execute=True, stdout=StringIO())
+
+
+# Rosters (rosters.py)
+
+class RosterTests(LeagueTestCase):
+
+	def test_scores_enroll_their_shooter(self):
+		team, shooters = make_team("Team A", shooters=2)
+		shoot(shooters[1], team, 1, 20, 20)
+		shoot(shooters[0], team, 1, 20, 20)
+
+		self.assertEqual(team_roster(YEAR, team.pk), sorted(shooters, key=lambda s: (s.last_name, s.first_name)))
+		# Membership stays when the scores go
+		Score.objects.all().delete()
+		self.assertEqual(Roster.objects.filter(season=YEAR, team=team).count(), 2)
+
+	def test_refresh_rosters_after_bulk_writes(self):
+		team, shooters = make_team("Team A", shooters=2)
+		Score.objects.bulk_create([Score(shooter=s, team=team, date=datetime.date(YEAR, 2, 1), season=YEAR, week=1)
+								   for s in shooters])
+
+		self.assertEqual(refresh_rosters(YEAR), 2)
+		self.assertEqual(refresh_rosters(YEAR), 0)
+
+	@skipUnless(django.VERSION >= (4, 2), "async streams need Django 4.2")
+	def test_async_stream(self):
+		from asgiref.sync import async_to_sync
+
+		async def read():
+			subscriber = live.hub.subscribe(live.AsyncSubscriber())
+			events = live.async_stream(subscriber, YEAR)
+			chunks = [await events.__anext__()]
+			# Writers publish from other threads
+			await asyncio.get_running_loop().run_in_executor(
+				None, live.publish, 'standings', YEAR, None, {'standings': []})
+			chunks.append(await events.__anext__())
+			await events.aclose()
+			return subscriber, chunks
+
+		subscriber, chunks = async_to_sync(read)()
+		self.assertEqual(chunks[0], "retry: 5000\n\n")
+		self.assertTrue(chunks[1].startswith("id: "))
+		self.assertNotIn(subscriber, live.hub.subscribers)
+
+
+# Async read views (async_views.py)
+
+@skipUnless(django.VERSION >= (4, 2), "async views need Django 4.2")
+class AsyncViewTests(LeagueTestCase):
+
+	def setUp(self):
+		super(AsyncViewTests, self).setUp()
+		team, shooters = make_team("Team A", shooters=2)
+		shoot(shooters[0], team, 1, 20, 21)
+		shoot(shooters[1], team, 1, 22, 23, year=YEAR - 1)
+
+	def render(self, view, **kwargs):
+		"""Run an async view the way the ASGI handler does, with the test client's session and a lazy user
+		"""
+		from asgiref.sync import async_to_sync
+		from django.contrib.auth import get_user
+		from django.test import AsyncRequestFactory
+		from django.utils.functional import SimpleLazyObject
+
+		request = AsyncRequestFactory().get('/')
+		request.session = self.client.session
+		request.user = SimpleLazyObject(lambda: get_user(request))
+		return async_to_sync(view.as_view())(request, **kwargs)
+
+	def test_pages_match_the_sync_views(self):
+		from . import async_views
+
+		for name, kwargs, url in (
+				('SeasonsView', {}, reverse('shooter:seasons')),
+				('SeasonView', {'year': YEAR}, reverse('shooter:season', args=[YEAR])),
+				('ScorecardView', {'year': YEAR, 'team': "Team A"}, reverse('shooter:scorecard', args=[YEAR, "Team A"]))):
+			django_cache.clear()
+			response = self.render(getattr(async_views, name), **kwargs)
+			self.assertEqual(response.status_code, 200, name)
+			self.assertEqual(response.content, self.client.get(url).content, name)
+
+		self.assertEqual(self.render(AsyncIndexView).content, self.client.get('/').content)
+
+	def test_logged_in_users(self):
+		from . import async_views
+
+		self.client.force_login(make_admin())
+		self.assertContains(self.render(AsyncIndexView), "Logged in as")
+		self.assertContains(self.render(async_views.ScorecardView, year=YEAR, team="Team A"), "Logged in as")
+
+	def test_live_stream_is_async(self):
+		from . import async_views
+
+		live.hub = live.Hub()
+		self.addCleanup(setattr, live, 'hub', live.hub)
+		response = self.render(async_views.LiveView, year=YEAR)
+		self.assertTrue(response.is_async)
+		self.addCleanup(live.hub.subscribers.clear)
+
+		with override_settings(LIVE_MAX_CLIENTS=1):
+			self.assertEqual(self.render(async_views.LiveView, year=YEAR).status_code, 503)
+
+
+# View benchmarks (benchmark.py)
+
+class BenchmarkTests(LeagueTestCase):
+
+	def test_every_view_runs_on_a_seeded_league(self):
+		teams = seed_league(teams=2, shooters=3, seasons=2, weeks=3)
+		results = run_benchmarks(teams, repeat=1)
+
+		self.assertEqual(Score.objects.count(), 2 * 3 * 2 * 4)
+		self.assertEqual({name: r['status'] for name, r in results.items() if r['status'] not in (200, 302)}, {})
+		self.assertTrue(all(r['queries'] > 0 for r in results.values()))
+		# Write views roll back
+		self.assertFalse(Shooter.objects.filter(email='bench@example.com').exists())
+
+	def test_compare_flags_extra_queries_and_slow_views(self):
+		baseline = {'A': {'queries': 3, 'time_ms': 10.0}, 'B': {'queries': 3, 'time_ms': 10.0}}
+		results = {
+			'A': {'queries': 4, 'time_ms': 10.5},
+			'B': {'queries': 3, 'time_ms': 12.0},
+			'C': {'queries': 99, 'time_ms': 99.0},
+		}
+		self.assertEqual(compare(results, baseline, 0.1), ["A: 4 queries (baseline 3)", "B: 12.00 ms (baseline 10.00 ms)"])
+
+
+# Score sheet import (importer.py)
+
+class ImporterTests(LeagueTestCase):
+
+	header = "team,shooter,email,date,week,bunker_one,bunker_two"
+
+	def test_import_builds_rollups(self):
+		result = import_scores([self.header,
+								"Team A,John Smith,,%d-02-01,W1,20,21" % YEAR,
+								"Team A,Mary Jones,,%d-02-01,1,22,23" % YEAR,
+								"Team B,Joe Bloggs,,%d-02-01,W1,25,25" % YEAR])
+
+		self.assertEqual((result.rows, result.created, result.teams_created, result.shooters_created), (3, 3, 2, 3))
+		self.assertEqual(Scorecard.objects.get(team__team_name="Team A", week=1).total_targets, 86)
+		self.assertEqual(ScorecardLine.objects.filter(season=YEAR).count(), 3)
+		self.assertEqual(Roster.objects.filter(season=YEAR).count(), 3)
+		self.assertEqual(ShooterStats.objects.filter(season=YEAR).count(), 3)
+
+	def test_existing_shooters_match_on_normalized_names(self):
+		team, shooters = make_team("Team A", shooters=0)
+		existing = Shooter.objects.create(first_name="José", last_name="O'Brien", email="jose@example.com")
+
+		result = import_scores([self.header,
+								"Team A,JOSE o brien,,%d-02-01,W1,20,21" % YEAR,
+								"Team A,jose O'Brien,JOSE@example.com,%d-02-08,W2,20,21" % YEAR])
+
+		self.assertEqual(result.shooters_created, 0)
+		self.assertEqual(Score.objects.filter(shooter=existing).count(), 2)
+
+	def test_rows_without_an_email_match_on_the_name(self):
+		result = import_scores([self.header,
+								"Team A,John Smith,john@example.com,%d-02-01,W1,20,21" % YEAR,
+								"Team A,John Smith,,%d-02-08,W2,20,21" % YEAR])
+
+		self.assertEqual(result.shooters_created, 1)
+		self.assertEqual(Score.objects.get(week=2).shooter.email, "john@example.com")
+
+	def test_committed_chunks_are_rebuilt_when_a_later_chunk_fails(self):
+		bulk_create = Score.objects.bulk_create
+
+		def fail_second_chunk(objs, *args, **kwargs):
+			if Score.objects.exists():
+				raise IntegrityError("second chunk")
+			return bulk_create(objs, *args, **kwargs)
+
+		with mock.patch('shooter.importer.CHUNK_SIZE', 1), \
+				mock.patch.object(Score.objects, 'bulk_create', fail_second_chunk):
+			with self.assertRaises(IntegrityError):
+				import_scores([self.header,
+							   "Team A,John Smith,,%d-02-01,W1,20,21" % YEAR,
+							   "Team A,Mary Jones,,%d-02-01,W1,22,23" % YEAR])
+
+		self.assertEqual(Score.objects.count(), 1)
+		self.assertEqual(Scorecard.objects.get(week=1).total_targets, 41)
+		self.assertEqual(ShooterStats.objects.filter(season=YEAR).count(), 1)
+
+	def test_duplicates_are_skipped(self):
+		import_scores([self.header, "Team A,John Smith,,%d-02-01,W1,20,21" % YEAR])
+		result = import_scores([self.header,
+								"Team A,John Smith,,%d-02-01,W1,25,25" % YEAR,
+								"Team A,John Smith,,%d-02-08,W2,25,25" % YEAR,
+								"Team A,John Smith,,%d-02-08,W2,24,24" % YEAR])
+
+		self.assertEqual((result.created, result.duplicates), (1, 2))
+		self.assertEqual(Score.objects.get(week=1).bunker_one, 20)
+
+	def test_bad_sheets_list_every_bad_row(self):
+		with self.assertRaisesRegex(SheetError, "Missing columns: week"):
+			import_scores(["team,shooter,date,bunker_one,bunker_two"])
+
+		with self.assertRaises(SheetError) as raised:
+			import_scores([self.header,
+						   "Team A,John Smith,,%d-02-01,W16,20,21" % YEAR,
+						   "Team A,Smith,,%d-02-01,W1,20,21" % YEAR,
+						   "Team A,John Smith,,yesterday,W1,20,21"])
+		self.assertIn("line 2", str(raised.exception))
+		self.assertIn("line 3", str(raised.exception))
+		self.assertIn("line 4", str(raised.exception))
+		self.assertFalse(Score.objects.exists())
+
+
+# Exports (export.py)
+
+class ExportTests(LeagueTestCase):
+
+	def setUp(self):
+		super(ExportTests, self).setUp()
+		self.team, shooters = make_team("Team A", shooters=2)
+		shoot(shooters[0], self.team, 1, 20, 21)
+		shoot(shooters[1], self.team, 1, 22, 23, year=YEAR - 1)
+
+	def test_csv(self):
+		lines = list(export_stream('scores', 'csv'))
+		self.assertEqual(lines[0].strip(), "season,team,shooter_id,first_name,last_name,date,week,bunker_one,bunker_two")
+		self.assertEqual(len(lines), 3)
+		self.assertEqual(len(list(export_stream('scores', 'csv', YEAR))), 2)
+
+	def test_ndjson(self):
+		rows = [json.loads(line) for line in export_stream('lines', 'ndjson', YEAR)]
+		self.assertEqual(len(rows), 1)
+		self.assertEqual((rows[0]['team'], rows[0]['weeks_shot']), ("Team A", 1))
+
+	def test_export_view(self):
+		url = reverse('shooter:export', args=['scorecards'])
+		self.assertEqual(self.client.get(url).status_code, 302)
+
+		self.client.force_login(make_admin())
+		response = self.client.get(url, {'format': 'csv', 'season': YEAR})
+		self.assertEqual(response['Content-Disposition'], 'attachment; filename="citl-scorecards-%d.csv"' % YEAR)
+		self.assertEqual(b''.join(response.streaming_content).decode('utf-8').splitlines()[1],
+						 "%d,Team A,1,41,0,0" % YEAR)
+		self.assertEqual(self.client.get(url, {'format': 'xml'}).status_code, 404)
+
+
+# Background jobs (jobs.py)
+
+class JobTests(LeagueTestCase):
+
+	def setUp(self):
+		super(JobTests, self).setUp()
+		media_root = tempfile.mkdtemp()
+		self.addCleanup(shutil.rmtree, media_root)
+		settings = override_settings(MEDIA_ROOT=media_root, JOB_RETRY_DELAY=10, JOB_MAX_ATTEMPTS=3)
+		settings.enable()
+		self.addCleanup(settings.disable)
+
+		self.calls = 0
+
+		def flaky(job, fail_with='ValueError'):
+			self.calls += 1
+			raise {'ValueError': ValueError, 'JobError': jobs.JobError}[fail_with]("try again")
+
+		jobs.TASKS['test_flaky'] = flaky
+		self.addCleanup(jobs.TASKS.pop, 'test_flaky')
+
+	def claim_and_run(self, fails=False):
+		job = jobs.claim('test')
+		if fails:
+			with self.assertLogs('shooter.jobs', 'ERROR'):
+				jobs.run(job)
+		else:
+			jobs.run(job)
+		job.refresh_from_db()
+		return job
+
+	def make_due(self, job):
+		Job.objects.filter(pk=job.pk).update(run_after=timezone.now() - datetime.timedelta(seconds=1))
+
+	def test_retries_back_off_then_fail(self):
+		job = jobs.enqueue('test_flaky')
+
+		job = self.claim_and_run(fails=True)
+		self.assertEqual((job.status, job.attempts), (Job.QUEUED, 1))
+		self.assertAlmostEqual((job.run_after - timezone.now()).total_seconds(), 10, delta=2)
+		self.assertIsNone(jobs.claim('test'))
+
+		self.make_due(job)
+		job = self.claim_and_run(fails=True)
+		self.assertAlmostEqual((job.run_after - timezone.now()).total_seconds(), 20, delta=2)
+
+		self.make_due(job)
+		job = self.claim_and_run(fails=True)
+		self.assertEqual((job.status, job.attempts, self.calls), (Job.FAILED, 3, 3))
+		self.assertIn("ValueError", job.error)
+
+	def test_job_errors_fail_at_once(self):
+		jobs.enqueue('test_flaky', fail_with='JobError')
+		job = self.claim_and_run(fails=True)
+		self.assertEqual((job.status, job.attempts, job.message), (Job.FAILED, 1, "try again"))
+
+	def test_a_job_is_claimed_once(self):
+		job = jobs.enqueue('test_flaky')
+		self.assertEqual(jobs.claim('first').pk, job.pk)
+		self.assertIsNone(jobs.claim('second'))
+
+	def test_stale_jobs_are_requeued(self):
+		job = jobs.enqueue('test_flaky')
+		jobs.claim('lost')
+		Job.objects.filter(pk=job.pk).update(heartbeat=timezone.now() - datetime.timedelta(hours=1))
+
+		self.assertEqual(jobs.requeue_stale(), 1)
+		self.assertEqual(jobs.claim('test').pk, job.pk)
+
+	def test_heartbeats_keep_long_jobs_running(self):
+		job = jobs.enqueue('test_flaky')
+		jobs.claim('busy')
+		Job.objects.filter(pk=job.pk).update(heartbeat=timezone.now() - datetime.timedelta(hours=1))
+
+		# The task has not reported for an hour, but its worker is alive
+		self.assertEqual(jobs.beat([job.pk]), 1)
+		self.assertEqual(jobs.requeue_stale(), 0)
+		self.assertEqual(Job.objects.get(pk=job.pk).status, Job.RUNNING)
+
+	def test_unknown_kinds_are_refused(self):
+		with self.assertRaises(ValueError):
+			jobs.enqueue('no_such_task')
+
+	def test_import_job(self):
+		sheet = ContentFile(("team,shooter,date,week,bunker_one,bunker_two\n"
+							 "Team A,John Smith,%d-02-01,W1,20,21\n" % YEAR).encode('utf-8'), name='sheet.csv')
+		jobs.enqueue('import_scores', input_file=sheet)
+		job = self.claim_and_run()
+
+		self.assertEqual(job.status, Job.DONE)
+		self.assertTrue(job.message.startswith("Imported 1 of 1 scores"))
+		self.assertEqual(Score.objects.count(), 1)
+
+	def test_export_job_file_download(self):
+		team, shooters = make_team("Team A", shooters=1)
+		shoot(shooters[0], team, 1, 20, 21)
+		jobs.enqueue('export', export='scores', fmt='csv', season=YEAR)
+		job = self.claim_and_run()
+		self.assertEqual(job.status, Job.DONE)
+
+		url = reverse('shooter:jobfile', args=[job.pk])
+		self.assertEqual(self.client.get(url).status_code, 302)
+		self.client.force_login(make_admin())
+		response = self.client.get(url)
+		self.assertEqual(response['Content-Disposition'], 'attachment; filename="citl-scores-%d.csv"' % YEAR)
+		self.assertEqual(len(b''.join(response.streaming_content).decode('utf-8').splitlines()), 2)
+
+	def test_administration_queues_jobs(self):
+		self.client.force_login(make_admin())
+		self.client.post(reverse('shooter:administration'), {'run_scores': '1'})
+		self.client.post(reverse('shooter:administration'), {'export': 'scores', 'format': 'ndjson'})
+		self.assertEqual(sorted(Job.objects.values_list('kind', flat=True)), ['export', 'run_scores'])
+
+
+@override_settings(JOB_HEARTBEAT_SECONDS=0.05)
+class JobWorkerTests(LeagueTransactionTestCase):
+
+	def test_worker_beats_while_a_task_is_silent(self):
+		def silent(job):
+			time.sleep(0.5)
+			return "Slept"
+
+		jobs.TASKS['test_silent'] = silent
+		self.addCleanup(jobs.TASKS.pop, 'test_silent')
+		job = jobs.enqueue('test_silent')
+
+		worker = jobs.Worker(concurrency=1, poll=0.05, drain=True)
+		worker.start()
+		worker.join(5)
+
+		job.refresh_from_db()
+		self.assertEqual((job.status, job.message), (Job.DONE, "Slept"))
+		self.assertGreater((job.heartbeat - job.started_at).total_seconds(), 0.2)
+
+
+# Read replicas (citl/routers.py)
+
+class ReadView(View):
+	read_replica = True
+
+
+class WriteView(View):
+	pass
+
+
+@override_settings(DATABASE_REPLICAS=['replica'], REPLICA_PIN_SECONDS=10)
+class ReplicaRouterTests(SimpleTestCase):
+
+	def setUp(self):
+		self.router = routers.ReplicaRouter()
+		self.factory = RequestFactory()
+		patcher = mock.patch.object(routers, 'healthy', return_value=True)
+		self.healthy = patcher.start()
+		self.addCleanup(patcher.stop)
+
+	def handle(self, request, view_class, write=False, scopes=()):
+		"""Run a request through ReplicaMiddleware, looking up the write stamps of scopes first as cached pages do.
+		Returns (response, alias reads went to)
+		"""
+		used = []
+
+		def get_response(request):
+			middleware.process_view(request, view_class.as_view(), (), {})
+			if scopes:
+				cache.stamps(scopes)
+			if write:
+				self.router.db_for_write(Score)
+			used.append(self.router.db_for_read(Score))
+			return HttpResponse()
+
+		middleware = routers.ReplicaMiddleware(get_response)
+		return middleware(request), used[0]
+
+	def test_reads_outside_requests_use_the_primary(self):
+		self.assertEqual(self.router.db_for_read(Score), 'default')
+
+	def test_public_views_read_from_a_replica(self):
+		response, alias = self.handle(self.factory.get('/'), ReadView)
+		self.assertEqual(alias, 'replica')
+		self.assertNotIn(routers.PIN_COOKIE, response.cookies)
+		self.assertEqual(self.router.db_for_read(Score), 'default')
+
+	def test_other_views_read_from_the_primary(self):
+		self.assertEqual(self.handle(self.factory.get('/'), WriteView)[1], 'default')
+		self.assertEqual(self.handle(self.factory.head('/'), ReadView)[1], 'replica')
+
+	def test_writes_pin_the_request_and_the_browser(self):
+		response, alias = self.handle(self.factory.get('/'), ReadView, write=True)
+		self.assertEqual(alias, 'default')
+		self.assertEqual(response.cookies[routers.PIN_COOKIE]['max-age'], 10)
+
+		request = self.factory.get('/')
+		request.COOKIES[routers.PIN_COOKIE] = '1'
+		self.assertEqual(self.handle(request, ReadView)[1], 'default')
+
+	def test_recent_writes_are_read_from_the_primary(self):
+		# Anything read now is cached under the new stamp, and a lagging replica may not have the write yet
+		cache.bump('scorecard:2018:Team A')
+		self.assertEqual(self.handle(self.factory.get('/'), ReadView, scopes=['scorecard:2018:Team A'])[1], 'default')
+
+		django_cache.set(cache._stamp_key('scorecard:2018:Team A'), time.time() - 60, None)
+		self.assertEqual(self.handle(self.factory.get('/'), ReadView, scopes=['scorecard:2018:Team A'])[1], 'replica')
+
+	def test_unhealthy_replicas_are_skipped(self):
+		self.healthy.return_value = False
+		self.assertEqual(self.handle(self.factory.get('/'), ReadView)[1], 'default')
+
+	def test_replicas_are_not_migrated(self):
+		self.assertIs(self.router.allow_migrate('replica', 'shooter'), False)
+		self.assertIsNone(self.router.allow_migrate('default', 'shooter'))
+
+
+class HealthTests(TestCase):
+
+	def test_health(self):
+		response = self.client.get(reverse('health'))
+		self.assertEqual(response.status_code, 200)
+		self.assertEqual(response.json()['databases']['default'], 'ok')
+
+
+# Static files (citl/staticfiles.py)
+
+class StaticFilesTests(SimpleTestCase):
+
+	def setUp(self):
+		self.root = tempfile.mkdtemp()
+		self.addCleanup(shutil.rmtree, self.root)
+
+	def write(self, name, content):
+		path = os.path.join(self.root, name)
+		os.makedirs(os.path.dirname(path), exist_ok=True)
+		with open(path, 'wb') as f:
+			f.write(content)
+
+	def test_minify_css(self):
+		self.assertEqual(minify_css("/* c */\nbody {\n  color: red;\n}\n/*! licence */"),
+						 "body{color:red}/*! licence */\n")
+		# A space before a pseudo-class is a descendant combinator; only declarations lose theirs
+		self.assertEqual(minify_css("a :hover, li  :first-child {\n  color : red;\n  content: ' : ';\n}"),
+						 "a :hover,li :first-child{color:red;content:' : '}\n")
+
+	def test_collected_names_hash_the_minified_content(self):
+		css = "/* The league colours */\nbody {\n    background: url('bg.png');\n}\n" + "p { margin: 0; }\n" * 40
+		self.write('css/style.css', css.encode('utf-8'))
+		self.write('css/bg.png', b'\x89PNG not really')
+
+		storage = CompressedManifestStorage(location=self.root, base_url='/static/')
+		source = FileSystemStorage(location=self.root)
+		paths = {name: (source, name) for name in ('css/style.css', 'css/bg.png')}
+		results = [r for r in storage.post_process(paths) if not isinstance(r[2], Exception)]
+		self.assertTrue(results)
+
+		hashed = storage.stored_name('css/style.css')
+		with storage.open(hashed) as f:
+			content = f.read()
+		self.assertEqual(hashed.split('.')[-2], hashlib.md5(content).hexdigest()[:12])
+		self.assertNotIn(b'league colours', content)
+		self.assertIn(os.path.basename(storage.stored_name('css/bg.png')).encode('utf-8'), content)
+		self.assertTrue(storage.exists(hashed + '.gz'))
+
+		# Templates naming a file that was never collected still render
+		with self.assertLogs('citl.staticfiles', 'WARNING'):
+			self.assertEqual(storage.stored_name('images/missing.png'), 'images/missing.png')
+
+	def call(self, path, **environ):
+		def application(environ, start_response):
+			start_response('200 OK', [('X-App', '1')])
+			return [b'app']
+
+		started = {}
+
+		def start_response(status, headers):
+			started['status'], started['headers'] = status, dict(headers)
+
+		environ.update(PATH_INFO=path, REQUEST_METHOD=environ.get('REQUEST_METHOD', 'GET'))
+		body = StaticFilesApplication(application, self.root, '/static/')(environ, start_response)
+		content = b''.join(body)
+		if hasattr(body, 'close'):
+			body.close()
+		return started['status'], started['headers'], content
+
+	def test_serves_precompressed_hashed_files(self):
+		self.write('style.0123456789ab.css', b'body{}')
+		self.write('style.0123456789ab.css.gz', gzip.compress(b'body{}'))
+
+		status, headers, content = self.call('/static/style.0123456789ab.css', HTTP_ACCEPT_ENCODING='gzip, br')
+		self.assertEqual(status, '200 OK')
+		self.assertEqual(headers['Content-Encoding'], 'gzip')
+		self.assertIn('immutable', headers['Cache-Control'])
+		self.assertEqual(gzip.decompress(content), b'body{}')
+
+		status, headers, content = self.call('/static/style.0123456789ab.css', HTTP_ACCEPT_ENCODING='gzip',
+											 HTTP_IF_NONE_MATCH=headers['ETag'])
+		self.assertEqual(status, '304 Not Modified')
+
+	def test_refused_encodings_are_not_served(self):
+		self.write('style.0123456789ab.css', b'body{}')
+		self.write('style.0123456789ab.css.gz', gzip.compress(b'body{}'))
+
+		for accepted in ('gzip;q=0', 'br, gzip; q=0', '*;q=0', 'identity'):
+			status, headers, content = self.call('/static/style.0123456789ab.css', HTTP_ACCEPT_ENCODING=accepted)
+			self.assertNotIn('Content-Encoding', headers, accepted)
+			self.assertEqual(content, b'body{}')
+		status, headers, content = self.call('/static/style.0123456789ab.css', HTTP_ACCEPT_ENCODING='*;q=0.5')
+		self.assertEqual(headers['Content-Encoding'], 'gzip')
+
+	def test_plain_names_are_revalidated(self):
+		self.write('style.css', b'body{}')
+		status, headers, content = self.call('/static/style.css')
+		self.assertEqual((content, headers['Cache-Control']), (b'body{}', 'public, max-age=300'))
+		self.assertNotIn('Content-Encoding', headers)
+
+	def test_everything_else_goes_to_the_application(self):
+		for path in ('/shooter/', '/static/missing.css', '/static/../etc/passwd'):
+			self.assertEqual(self.call(path)[1], {'X-App': '1'}, path)
+		self.write('style.css', b'body{}')
+		self.assertEqual(self.call('/static/style.css', REQUEST_METHOD='POST')[1], {'X-App': '1'})
+
+
+# Request timing (citl/middleware.py)
+
+class RequestTimingTests(TestCase):
+
+	def test_server_timing_header(self):
+		from django.conf import settings
+
+		middleware = ['citl.middleware.RequestTimingMiddleware'] + \
+					 [m for m in settings.MIDDLEWARE if m != 'citl.middleware.RequestTimingMiddleware']
+		with override_settings(MIDDLEWARE=middleware, REQUEST_TIMING_SAMPLE_RATE=1.0), \
+				self.assertLogs('citl.timing', 'INFO') as logs:
+			response = self.client.get(reverse('shooter:seasons'))
+
+		self.assertRegex(response['Server-Timing'], r'^db;dur=[\d.]+;desc="\d+ queries", tpl;dur=[\d.]+;desc="templates", total;dur=[\d.]+$')
+		record = json.loads(logs.records[0].getMessage())
+		self.assertEqual((record['path'], record['status']), ('/shooter/', 200))
+
+	def test_templates_are_timed_by_the_engine(self):
+		from django.conf import settings
+		from django.template.backends.django import Template
+
+		with override_settings(TEMPLATES=template_settings(settings.BASE_DIR)), \
+				self.assertLogs('citl.timing', 'INFO') as logs:
+			response = RequestTimingMiddleware(lambda request: render(request, 'index.html', {}))(
+				RequestFactory().get('/'))
+
+		self.assertGreater(json.loads(logs.records[0].getMessage())['template_ms'], 0)
+		self.assertNotRegex(response['Server-Timing'], r'tpl;dur=0\.0;')
+		# Nothing is patched, so requests that aren't timed render as usual
+		self.assertFalse(hasattr(Template.render, 'timed'))
+
+	def test_streaming_responses_are_timed_to_the_end(self):
+		def stream():
+			yield "first\n"
+			yield "%d teams\n" % Team.objects.count()
+
+		middleware = RequestTimingMiddleware(lambda request: StreamingHttpResponse(stream()))
+		response = middleware(RequestFactory().get('/stream/'))
+		with self.assertLogs('citl.timing', 'INFO') as logs:
+			self.assertEqual(b''.join(response.streaming_content), b"first\n0 teams\n")
+
+		record = json.loads(logs.records[0].getMessage())
+		self.assertEqual((record['streaming'], record['queries']), (True, 1))
+		self.assertNotIn('Server-Timing', response)
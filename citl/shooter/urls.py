@@ -1,19 +1,42 @@
 # shooter/urls.py
 
+from django.conf import settings
 from django.urls import path, re_path
 
-from . import views
+from . import api, views
+
+# Async read views when served over ASGI (see citl/asgi.py)
+if getattr(settings, 'SHOOTER_ASYNC_VIEWS', False):
+	from . import async_views as read_views
+else:
+	read_views = views
 
 app_name = 'shooter'
 
 urlpatterns = [
-	path('', views.SeasonsView.as_view(), name='seasons'),						# /shooter/
-	path('<int:year>/season/', views.SeasonView.as_view(), name='season'),
-	path('<int:year>/<team>/scorecard/', views.ScorecardView.as_view(), name='scorecard'),
+	path('', read_views.SeasonsView.as_view(), name='seasons'),						# /shooter/
+	path('<int:year>/season/', read_views.SeasonView.as_view(), name='season'),
+	path('<int:year>/<team>/scorecard/', read_views.ScorecardView.as_view(), name='scorecard'),
+	path('shooters/search.json', views.ShooterSearchView.as_view(), name='shootersearch'),
+	path('shooters/<int:shooter_id>/', views.ShooterView.as_view(), name='shooter'),
+	path('shooters/<int:shooter_id>.json', views.ShooterView.as_view(as_json=True), name='shooterjson'),
+	path('<int:year>/live/', read_views.LiveView.as_view(), name='live'),
+	path('standings/', views.CurrentStandingsView.as_view(), name='currentstandings'),
+	path('<int:year>/standings/', views.StandingsView.as_view(), name='standings'),
+	path('<int:year>/standings.json', views.StandingsView.as_view(as_json=True), name='standingsjson'),
 	path('administration/', views.AdministrationView.as_view(), name='administration'),
 	path('administration/newteam/', views.NewTeamView.as_view(), name='newteam'),
 	path('administration/newshooter/', views.NewShooterView.as_view(), name='newshooter'),
 	path('administration/<team>/newscore/', views.NewScoreView.as_view(), name='newscore'),
+	path('administration/import/', views.ImportView.as_view(), name='import'),
+	path('administration/export/<kind>/', views.ExportView.as_view(), name='export'),
+	path('administration/jobs/<int:job_id>/file/', views.JobFileView.as_view(), name='jobfile'),
+	path('api/seasons/', api.SeasonsApi.as_view(), name='api-seasons'),
+	path('api/seasons/<int:year>/teams/', api.TeamsApi.as_view(), name='api-teams'),
+	path('api/seasons/<int:year>/teams/<team>/scorecard/', api.ScorecardApi.as_view(), name='api-scorecard'),
+	path('api/seasons/<int:year>/standings/', api.StandingsApi.as_view(), name='api-standings'),
+	path('api/shooters/', api.ShootersApi.as_view(), name='api-shooters'),
+	path('api/shooters/<int:shooter_id>/', api.ShooterApi.as_view(), name='api-shooter'),
 	#path('administration/newscore/', views.NewScoreView.as_view(), name='newscore'),
 	path('test/', views.TestView.as_view(), name='test'),
 ]
\ No newline at end of file
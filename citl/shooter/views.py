@@ -1,59 +1,84 @@
 # Views
 
-import sys
 import datetime
+import logging
 
-from collections import Counter
-
-from django.contrib.auth.mixins import UserPassesTestMixin
+from django.conf import settings
 from django.contrib import messages
 from django.shortcuts import render
-from django.forms import formset_factory, modelformset_factory, inlineformset_factory
+from django.forms import formset_factory
 from django.views import View
-from django.http import HttpResponseRedirect
-from django.db import models
-from django.db.models import F
-from django.db.models import Count
-
-from .models import Shooter, Team, Score
-from .forms import TeamForm, TeamChoiceForm, ShooterForm, ScoreFormTeam, ScoreFormWeek
+from django.http import FileResponse, Http404, HttpResponse, HttpResponseRedirect, JsonResponse, StreamingHttpResponse
+from django.urls import reverse
+from django.db import IntegrityError, transaction
+from django.utils.functional import SimpleLazyObject
+
+from .models import Shooter, Team, Score, ScorecardLine, Season, SeasonSummary, Job
+from .forms import TeamForm, TeamChoiceForm, ShooterForm, ScoreFormTeam, ScoreFormWeek, ImportForm
+from .batch import score_shooters
+from .cache import cached_page, data_version, score_changed
+from .scorecards import refresh_team_scores
+from .export import EXPORTS, FORMATS, stream as export_stream
+from .standings import leaderboard, team_position, weeks_touched
+from .stats import as_dict, career, refresh_stats, season_history
+from . import jobs, live
+from .search import cached_search, shooter_keys
+from .permissions import LeagueAdminMixin, LeagueStaffMixin, ScoreEntryMixin, league_roles
+from .seasons import SeasonClosed, close_season, ensure_seasons
+from .rosters import enroll, season_teams, team_roster
+
+logger = logging.getLogger(__name__)
+
+
+def heavy_template_engine():
+	"""The engine for the heaviest pages: 'jinja2' with settings.SHOOTER_JINJA2_TEMPLATES (see citl/templating.py)
+	"""
+	return 'jinja2' if getattr(settings, 'SHOOTER_JINJA2_TEMPLATES', False) else None
 
 
 class SeasonsView(View):
 
 	template_name = 'shooter/seasons.html'
+	read_replica = True				# see citl/routers.py
 
+	@cached_page('seasons')
 	def get(self, request):
 
-		# In the absense of something yet discovered, I used Extract. This is only available with certain databases!
-		all_season = Score.objects \
-			.annotate(season=models.functions.Extract('date', 'year')) \
-			.values('season','team__team_name') \
-			.order_by('-season') \
-			.distinct()
+		current_year = datetime.datetime.now().year
 
-		print(all_season)
+		# The season list is the Season table; only the current season lists its teams. Both are lazy, so a
+		# cached fragment never runs their queries
+		seasons = Season.objects.order_by('-year')
+		current_teams = season_teams(current_year)
 
 		context = {
-			'all_season': all_season,
-			'current_year': datetime.datetime.now().year,
+			'seasons': seasons,
+			'current_teams': current_teams,
+			'current_year': current_year,
+			'version': data_version('seasons', 'season:%s' % current_year),
 		}
 
-		return render(request, self.template_name, context)
+		return render(request, self.template_name, context, using=heavy_template_engine())
 
 
 class SeasonView(View):
 
 	template_name = 'shooter/season.html'
+	read_replica = True
 
+	@cached_page('season:{year}')
 	def get(self, request, year):
 
-		season = Score.objects \
-			.annotate(season=models.functions.Extract('date', 'year')) \
-			.values('season', 'team__team_name').filter(season=year).distinct()
+		# A closed season's teams in final standing order, otherwise from the season's rosters
+		teams = list(SeasonSummary.objects \
+			.filter(season__year=year) \
+			.order_by('position', 'team_name') \
+			.values_list('team_name', flat=True))
+		if not teams:
+			teams = season_teams(year)
 
 		context = {
-			'season': season,
+			'teams': teams,
 			'year': year,
 		}
 
@@ -61,144 +86,203 @@ class SeasonView(View):
 
 
 class ScorecardView(View):
+
+	read_replica = True
+
+	@cached_page('scorecard:{year}:{team}', 'standings:{year}')
 	def get(self, request, year, team):
 
 		week_range = range(0,16)
 
-		scores = Score.objects \
-				.values('shooter__first_name', 'shooter__last_name', 'week', 'bunker_one', 'bunker_two') \
-				.filter(team__team_name=team, date__year=year) \
-				.order_by('shooter__last_name', 'shooter__first_name', 'week')
+		# One precomputed line per shooter, maintained from Score writes (see scorecards.py). Only read if the
+		# scorecard fragment isn't cached
+		lines = ScorecardLine.objects \
+				.filter(team__team_name=team, season=year) \
+				.select_related('shooter') \
+				.order_by('shooter__last_name', 'shooter__first_name')
 
-		# Init some vars for the upcoming loop
-		scorecard = {}
-		for score in scores:
-			personName = score['shooter__first_name'] + " " + score['shooter__last_name']
+		# Total targets row, from the lines the grid has already fetched
+		total_targets = SimpleLazyObject(lambda: dict(zip(week_range,
+				score_shooters([line.week_totals for line in lines]).week_totals)))
 
-			# For each new person pulled from the Team, build their scorecard line and calculate average
-			# Count var is initializes at -1 because WEEK0 is NOT counted toward weeks participated
-			if personName not in scorecard:
-				scorecard[personName] = { 'weeks': dict.fromkeys(week_range,0), 'count': -1, 'average': 0 }
+		context = {
+			'scores': lines,
+			'team': team,
+			'weekRange': week_range,
+			'season': year,
+			'totalTargets': total_targets,
+			'standing': team_position(year, team),
+			'version': data_version('scorecard:%s:%s' % (year, team)),
+		}
 
-			# Add the two bunkers for that week
-			scorecard[personName]['weeks'][score['week']] = score['bunker_one'] + score['bunker_two']
+		return render(request, 'shooter/scorecard.html', context, using=heavy_template_engine())
 
-			# Bump the Weeks Shot count
-			scorecard[personName]['count'] += 1
 
-		# Calculate shooters' averages
-		for person, values in scorecard.items():
-			# scores = {k: v for k, v in values['weeks'].items() if v != '-'} # used this when i had '-' as placeholders
-			scores = {k: v for k, v in values['weeks'].items() if v != 0}
-			values['average'] = shooterAverage(scores)
+class StandingsView(View):
 
-		# TODO: Once the Scorecard model is implemented, change all this to pull from that model and display it
+	template_name = 'shooter/standings.html'
+	as_json = False
 
-		# Calculate total targets row
-		total_targets = totalTargets(scorecard)
+	@cached_page('standings:{year}')
+	def get(self, request, year):
+
+		standings = leaderboard(year)
+
+		if self.as_json:
+			return JsonResponse({'season': year, 'standings': standings})
 
 		context = {
-			'scores': scorecard,
-			'team': team,
-			'weekRange': week_range,
+			'standings': standings,
 			'season': year,
-			'totalTargets': total_targets,
 		}
 
-		return render(request, 'shooter/scorecard.html', context)
+		return render(request, self.template_name, context)
 
 
-class AdministrationView(UserPassesTestMixin, View):
+class ShooterSearchView(LeagueStaffMixin, View):
+	"""Autocomplete: shooters whose name (or email) starts with ?q=, as JSON. ?limit= up to 50 (default 10)
+	"""
 
-	template_name = 'shooter/administration.html'
-	season_year = datetime.datetime.now().year
+	def get(self, request):
+		query = request.GET.get('q', '').strip()
+		try:
+			limit = int(request.GET.get('limit', 10))
+		except ValueError:
+			return JsonResponse({'error': "limit must be a number"}, status=400)
 
-	def test_func(self):
-		"""Validate user viewing this page has permissions
-		"""
-		return self.request.user.groups.filter(name='league_admin_g').exists()
+		results = cached_search(query, limit) if query else []
 
-	def get(self, request):
+		return JsonResponse({'query': query, 'results': results})
 
-		season_scores = Score.objects \
-			.annotate(season=models.functions.Extract('date', 'year')) \
-			.values('team__team_name') \
-			.order_by('team__team_name') \
-			.distinct()
+
+class ShooterView(View):
+
+	template_name = 'shooter/shooter.html'
+	as_json = False
+
+	@cached_page('shooter:{shooter_id}')
+	def get(self, request, shooter_id):
+
+		try:
+			shooter = Shooter.objects.get(pk=shooter_id)
+		except Shooter.DoesNotExist:
+			raise Http404("No such shooter")
+
+		history = season_history(shooter)
+
+		if self.as_json:
+			return JsonResponse({
+				'id': shooter.pk,
+				'name': str(shooter),
+				'career': career(history),
+				'seasons': [as_dict(s) for s in history],
+			})
 
 		context = {
-			'season_scores': season_scores,
-			'season_year': self.season_year,
+			'shooter': shooter,
+			'history': history,
+			'career': career(history),
 		}
 
 		return render(request, self.template_name, context)
 
-	def post(self, request, *args, **kwargs):
 
-		if 'run_scores' in request.POST:
-			print("Run Scores executing...")
-			# I really don't like the dual queries for this part, but hey, it works
+class LiveView(View):
+	"""Server-Sent Events stream of a season's scorecard and standings changes (see live.py). An open stream holds
+	a worker thread, so past LIVE_MAX_SYNC_STREAMS viewers are polled instead
+	"""
 
-			# Pull teams from just the current active year
-			teams = Score.objects \
-					.values('team__team_name', 'team__id') \
-					.filter(date__year=self.season_year) \
-					.distinct()
+	def get(self, request, year):
 
-			# Pull scores for only the current active year, per team found in previous Team query. Assign to teamdict{}
-			teamdict = {}
-			for team in teams:
-				teamdict[team['team__id']] = Score.objects \
-					.values('shooter__first_name', 'shooter__last_name', 'week', 'bunker_one', 'bunker_two', \
-							'team__team_name', 'team__id') \
-					.filter(date__year=self.season_year, team__id=team['team__id']) \
-					.order_by('team__team_name', 'shooter__last_name', 'shooter__first_name', 'week')
+		try:
+			last_event_id = int(request.META.get('HTTP_LAST_EVENT_ID', ''))
+		except ValueError:
+			last_event_id = None
+
+		if live.sync_streams_full():
+			response = HttpResponse(live.poll(year, request.GET.get('team'), last_event_id),
+									content_type='text/event-stream')
+			response['Cache-Control'] = 'no-cache'
+			return response
+
+		subscriber = live.hub.subscribe()
+		if subscriber is None:
+			response = HttpResponse("Too many live viewers, try again shortly", status=503, content_type='text/plain')
+			response['Retry-After'] = '30'
+			return response
+
+		response = StreamingHttpResponse(
+			live.stream(subscriber, year, request.GET.get('team'), last_event_id),
+			content_type='text/event-stream')
+		response['Cache-Control'] = 'no-cache'
+		# Stop nginx from buffering the stream
+		response['X-Accel-Buffering'] = 'no'
+		return response
+
+
+class CurrentStandingsView(View):
+	def get(self, request):
+		return HttpResponseRedirect(reverse('shooter:standings', args=[datetime.datetime.now().year]))
 
-			# For each team, go through the scores per Shooter and total up each Week.
-			week_range = range(0, 16)
-			for team,scores in teamdict.items():
 
-				scorecard = {}
-				for score in scores:
-					personName = score['shooter__first_name'] + " " + score['shooter__last_name']
-					if personName not in scorecard:
-						# Init the dictionary to include all weeks. This helps with Counter in the upcoming calculations
-						scorecard[personName] = { 'weeks': dict.fromkeys(week_range,0) }
+class AdministrationView(LeagueAdminMixin, View):
+
+	template_name = 'shooter/administration.html'
+	season_year = datetime.datetime.now().year
+
+	def get(self, request):
 
-					if (score['bunker_one'] + score['bunker_two']) > 0:
-						# Add the two bunkers for that week
-						scorecard[personName]['weeks'][score['week']] = score['bunker_one'] + score['bunker_two']
+		season_scores = Score.objects \
+			.values('team__team_name') \
+			.order_by('team__team_name') \
+			.distinct()
 
-					# TODO: Add 'Total Targets', 'Target Bonus', 'Rookie Bonus', 'Rank Bonus' model and logic
+		recent_jobs = list(jobs.recent())
 
-					# Calculate Total Targets
-					total_targets = totalTargets(scorecard)
+		context = {
+			'season_scores': season_scores,
+			'season_year': self.season_year,
+			'jobs': recent_jobs,
+			'jobs_active': any(job.active for job in recent_jobs),
+		}
 
-					# Calculate Target Bonus
-					#
+		return render(request, self.template_name, context)
 
-					# Calculate Rookie Bonus
-					#
+	def post(self, request, *args, **kwargs):
 
-				# Calculate Rank Bonus
-				#
+		# Long tasks go to the job queue (manage.py run_jobs); the page shows their progress
+		if 'run_scores' in request.POST:
+			jobs.enqueue('run_scores', request.user, season=self.season_year)
+			messages.add_message(self.request, messages.INFO,
+								 "Queued scoring for the " + str(self.season_year) + " season")
+
+		if 'export' in request.POST:
+			kind = request.POST.get('export')
+			fmt = request.POST.get('format', 'csv')
+			season = request.POST.get('season')
+			if kind in EXPORTS and fmt in FORMATS and (not season or season.isdigit()):
+				jobs.enqueue('export', request.user, export=kind, fmt=fmt, season=int(season) if season else None)
+				messages.add_message(self.request, messages.INFO, "Queued the " + kind + " export")
+			else:
+				messages.add_message(self.request, messages.ERROR, "Unknown export")
 
-				print(self.season_year, team, total_targets)
+		if 'close_season' in request.POST:
+			try:
+				count = close_season(self.season_year)
+				messages.add_message(self.request, messages.INFO,
+									 "Closed the " + str(self.season_year) + " season with " + str(count) + " teams")
+			except SeasonClosed as e:
+				messages.add_message(self.request, messages.ERROR, str(e))
 
 		return HttpResponseRedirect('/shooter/administration/')
 
 # FORM VIEWS
 
-class NewTeamView(UserPassesTestMixin, View):
+class NewTeamView(LeagueAdminMixin, View):
 
 	template_name 	= 'shooter/newteam.html'
 	TeamForm		= TeamForm
 
-	def test_func(self):
-		"""Validate user viewing this page has permission
-		"""
-		return self.request.user.groups.filter(name='league_admin_g').exists()
-
 	def get(self, request, *args, **kwargs):
 		"""On initial GET, return forms
 		"""
@@ -238,16 +322,13 @@ class NewTeamView(UserPassesTestMixin, View):
 		# return render(request, self.template_name, {'team_form': team_form, 'shooter_formset': shooter_formset})
 
 
-class NewShooterView(UserPassesTestMixin, View):
+class NewShooterView(LeagueAdminMixin, View):
 
 	template_name = 'shooter/newshooter.html'
 	#this_season = datetime.datetime.now().year
 	team_form = TeamChoiceForm
 	shooter_form = ShooterForm
 
-	def test_func(self):
-		return self.request.user.groups.filter(name='league_admin_g').exists()
-
 	def get(self, request):
 		"""On initial GET, return forms
 		"""
@@ -278,10 +359,10 @@ class NewShooterView(UserPassesTestMixin, View):
 				shooter = Shooter(first_name=c_first_name, last_name=c_last_name, email=c_email, captain=c_captain,
 								  rookie=c_rookie, guest=c_guest)
 
-				# Check to see if the shooter already exists in the league; brute force...
-				# TODO: How do I handle multiple shooters with the same name in the league? Could get messy.
-				#		Right now I do it via a unique email address.
-				if Shooter.objects.filter(first_name=c_first_name, last_name=c_last_name, email=c_email).exists():
+				# Check to see if the shooter already exists in the league. Same-name shooters are told apart by
+				# email; the normalized keys also catch "jose" vs "José" and stray spaces or capitals
+				name_key, surname_key, email_key = shooter_keys(c_first_name, c_last_name, c_email)
+				if Shooter.objects.filter(name_key=name_key, email_key=email_key).exists():
 					messages.add_message(self.request, messages.WARNING,
 										 c_first_name + " " + c_last_name + " already exists in the league")
 
@@ -292,6 +373,7 @@ class NewShooterView(UserPassesTestMixin, View):
 				else:
 					team = Team.objects.get(team_name=c_team_name)
 					shooter.save()
+					enroll(datetime.datetime.now().year, team.pk, [shooter.pk])
 					ScoreInit = Score(shooter=shooter, team=team, date=datetime.datetime.now().date(),
 									bunker_one=1, bunker_two=34)
 					ScoreInit.save()
@@ -303,16 +385,17 @@ class NewShooterView(UserPassesTestMixin, View):
 		return HttpResponseRedirect('/shooter/administration/newshooter/')
 
 
-class NewScoreView(UserPassesTestMixin, View):
+class NewScoreView(ScoreEntryMixin, View):
 
 	template_name = 'shooter/newscore.html'
 	this_season = datetime.datetime.now().year
 	score_form_team = ScoreFormTeam
-	score_formset_week = modelformset_factory(Score, form=ScoreFormWeek)
+	score_formset_week = formset_factory(ScoreFormWeek)
 
-	def test_func(self):
-
-		return self.request.user.groups.filter(name='league_admin_g').exists()
+	def team_roster(self, team_id):
+		"""The team's roster this season. Loaded once per request and shared by every form
+		"""
+		return team_roster(self.this_season, team_id)
 
 	def get(self, request, team):
 		"""On initial GET, return forms
@@ -326,23 +409,15 @@ class NewScoreView(UserPassesTestMixin, View):
 
 		# get the team_id for the team_name that was passed via URLs
 		team_id = Team.objects.get(team_name=team)
-		# pull the shooters into a queryset to prepoulate the modelformset, filtering on current year and team_id
-		qset = Score.objects \
-			.filter(date__year=self.this_season, team=team_id) \
-			.order_by('shooter__last_name', 'shooter__first_name') \
-			.distinct('shooter__last_name', 'shooter__first_name')
+		# pull the team's shooters to prepopulate the formset and fill the shooter dropdowns
+		roster = self.team_roster(team_id)
 
 		# initialize the scores to 0 for the form being displayed
-		for shooter in qset:
-			shooter.bunker_one, shooter.bunker_two = 0,0
+		initial = [{'shooter': s.pk, 'bunker_one': 0, 'bunker_two': 0} for s in roster]
 
 		# build the forms with their respective initalized data
 		score_form_team = self.score_form_team(initial=date_init)
-		score_formset_week = self.score_formset_week(queryset=qset)
-
-		# TODO: Make it so not all the shooter names in the league pop up in the dropdown list. Use below as guide.
-		#for form in score_formset_week:
-			#form.fields['shooter'].queryset = Score.objects.filter(team__team_name=team)
+		score_formset_week = self.score_formset_week(initial=initial, form_kwargs={'roster': roster})
 
 		context = {
 			'score_form_team': score_form_team,
@@ -352,63 +427,86 @@ class NewScoreView(UserPassesTestMixin, View):
 
 		return render(request, self.template_name, context)
 
+	def save_scores(self, team_id, c_date, c_week, entries):
+		"""Save the sheet's (shooter, bunker_one, bunker_two) entries in one transaction, skipping shooters already
+		scored this week. Returns the new scores and the names of the skipped shooters
+		"""
+		with transaction.atomic():
+			# One query for every shooter on the sheet that already has a score for this year and week
+			existing = set(Score.objects \
+				.filter(shooter__in=[e[0] for e in entries], week=c_week, season=c_date.year) \
+				.values_list('shooter', flat=True))
+
+			new_scores = []
+			duplicates = []
+			for c_shooter, c_b1, c_b2 in entries:
+				if c_shooter.pk in existing:
+					duplicates.append(str(c_shooter))
+					continue
+				existing.add(c_shooter.pk)
+				new_scores.append(Score(shooter=c_shooter, team=team_id, date=c_date, season=c_date.year,
+										week=c_week, bunker_one=c_b1, bunker_two=c_b2))
+
+			ensure_seasons([c_date.year])
+			Score.objects.bulk_create(new_scores)
+			enroll(c_date.year, team_id.pk, [n.shooter_id for n in new_scores])
+
+			# bulk_create skips the Score signals, so refresh the rollups and page cache here
+			if new_scores:
+				refresh_team_scores(team_id.pk, c_date.year, c_week, [n.shooter_id for n in new_scores])
+				weeks_touched(c_date.year, [c_week])
+				refresh_stats(c_date.year, [n.shooter_id for n in new_scores])
+				transaction.on_commit(lambda: score_changed(c_date.year, team_id.team_name))
+				transaction.on_commit(lambda: live.scores_posted(
+					c_date.year, team_id, c_week, [n.shooter_id for n in new_scores]))
+
+		return new_scores, duplicates
+
 	def post(self, request, team):
 		"""On POST, validate data entry and save to back end
 		"""
 
+		team_id = Team.objects.get(team_name=team)
 		score_form_team = self.score_form_team(request.POST)
-		score_formset_week = self.score_formset_week(request.POST)
+		score_formset_week = self.score_formset_week(request.POST, form_kwargs={'roster': self.team_roster(team_id)})
 
 		if score_form_team.is_valid() and score_formset_week.is_valid():
 
 			c_date = score_form_team.cleaned_data.get('date')
 			c_week = score_form_team.cleaned_data.get('week')
-			team_id = Team.objects.get(team_name=team)
 
+			# Collect the rows worth saving. Don't do anything with rows without a shooter or with zero scores
+			entries = []
 			for f in score_formset_week:
-				# Don't do anything with fields that don't have a shooter selected
-				if f.cleaned_data.get('shooter') is not None:
-					c_shooter = f.cleaned_data.get('shooter')
-					c_b1 = f.cleaned_data.get('bunker_one')
-					c_b2 = f.cleaned_data.get('bunker_two')
-
-					# Use this previous logic to improve performance by moving average to its own database
-					# bunker_total = [c_b1 + c_b2]
-					# sum all current bunkers from this year to calculate average later on
-					# bunker_qset = Score.objects \
-					# 	.annotate(season=models.functions.Extract('date', 'year'),
-					#			  bunker_total=F('bunker_one') + F('bunker_two')) \
-					#	.filter(season=self.this_season, team=team_id, shooter=c_shooter)
-
-					# add the queried and summed bunkers to the bunker list
-					# for q in bunker_qset:
-					#	bunker_total.append(q.bunker_total)
-
-					# calculate average based on the shooter and the current season
-					# average = sum(bunker_total) / float(len(bunker_total))
-
-					# if the scores are zeroes, don't add a new score
-					if (c_b1 + c_b2) == 0:
-						continue
-					# check to see if a score already exists for the year and week. If it does, warn me of duplication
-					elif Score.objects.filter(shooter=c_shooter, week=c_week, date__year=c_date.year).exists():
-						messages.add_message(self.request, messages.WARNING,
-											 str(c_shooter) + " already has a score for this week. Score not added.")
-					# else add a new score to the Score model
-					else:
-						# build the new score to add to the database
-						new_score = Score(shooter=c_shooter, team=team_id, date=c_date, week=c_week,
-										  bunker_one=c_b1, bunker_two=c_b2)
-
-						new_score.save()
-						messages.add_message(self.request, messages.INFO, "Score added for " + str(c_shooter))
+				c_shooter = f.cleaned_data.get('shooter')
+				c_b1 = f.cleaned_data.get('bunker_one') or 0
+				c_b2 = f.cleaned_data.get('bunker_two') or 0
+
+				if c_shooter is not None and (c_b1 + c_b2) != 0:
+					entries.append((c_shooter, c_b1, c_b2))
+
+			# A second submit of the same sheet can save a shooter between the duplicate check and the insert. The
+			# insert then fails and rolls back, and the next attempt sees what the other submit saved
+			for attempt in range(3):
+				try:
+					new_scores, duplicates = self.save_scores(team_id, c_date, c_week, entries)
+					break
+				except IntegrityError:
+					new_scores, duplicates = [], [str(e[0]) for e in entries]
+
+			# One summary message for the whole sheet
+			summary = str(len(new_scores)) + " scores added for " + team + " W" + str(c_week) + "."
+			if duplicates:
+				summary += " Already scored this week, not added: " + ", ".join(duplicates) + "."
+				messages.add_message(self.request, messages.WARNING, summary)
+			else:
+				messages.add_message(self.request, messages.INFO, summary)
 		else:
-			print("ERROR: NEWSCORE_VALIDATION_ERROR...")
-			print("Header", score_form_team.errors)
-			print("Scores", score_formset_week.errors)
-			for e in score_formset_week.errors:
-				print(e)
-			messages.add_message(self.request, messages.ERROR, "Validation error. Check server logs for details.")
+			logger.warning("New score validation error for %s. Header: %s Scores: %s",
+						   team, score_form_team.errors.as_json(), score_formset_week.errors)
+			# Score.clean() refuses dates in closed seasons; say so rather than only logging it
+			messages.add_message(self.request, messages.ERROR, " ".join(
+				["Validation error."] + list(score_form_team.non_field_errors()) + ["Check server logs for details."]))
 
 		context = {
 			'score_form_team': score_form_team,
@@ -417,43 +515,79 @@ class NewScoreView(UserPassesTestMixin, View):
 		}
 
 		# return render(request, self.template_name, context)
+		if not league_roles(request)['admin']:
+			# Captains only have their team's score sheet
+			return HttpResponseRedirect(request.path)
 		return HttpResponseRedirect('/shooter/administration/')
 
 
-class TestView(View):
+class ImportView(LeagueAdminMixin, View):
+
+	template_name = 'shooter/import.html'
+	import_form = ImportForm
+
 	def get(self, request):
+		"""On initial GET, return the upload form
+		"""
+		return render(request, self.template_name, {'import_form': self.import_form})
 
-		context = {
-			'test': "Test"
-		}
+	def post(self, request):
+		"""On POST, bulk import the uploaded score sheet and report how it went
+		"""
+		import_form = self.import_form(request.POST, request.FILES)
 
-		return render(request, 'shooter/test.html', context)
+		if import_form.is_valid():
+			sheet = import_form.cleaned_data['score_sheet']
+			jobs.enqueue('import_scores', request.user, input_file=sheet)
+			messages.add_message(self.request, messages.INFO,
+								 "Queued the import of " + sheet.name + "; its progress is shown on the Administration page")
+		else:
+			messages.add_message(self.request, messages.ERROR, "Validation error")
 
-# Special formulas for calculating averages
-def shooterAverage(scores):
-	# TODO: Move this to newScore with a dedicated table on the back end. Avoid calculating on each page view
+		return HttpResponseRedirect('/shooter/administration/import/')
 
-	# TODO: Could be a more Pythonic way of doing this than creating an entirely new dictionary.
-	# A temporary dictionary that drops W0 to allow for special league average formulas
-	scores_noW0 = {k:v for k,v in scores.items() if k != 0}
 
-	# If less than two scores between W1 and W15: average(W0:W15)
-	if len(scores_noW0.values()) < 2:
-		return round(float(sum(scores.values())) / max(len(scores.values()), 1),2)
-	# Else average(W1:W15)
-	else:
-		return round(float(sum(scores_noW0.values())) / max(len(scores_noW0.values()), 1),2)
+class ExportView(LeagueAdminMixin, View):
+	"""Stream scores, scorecard lines or team scorecards as CSV or newline delimited JSON.
+	?season=YEAR limits the export to one season; ?format=csv|ndjson (default csv)
+	"""
 
-# Calculate Total Targets
-def totalTargets(scorecard):
-	r = range(0, 16)
+	def get(self, request, kind):
+		fmt = request.GET.get('format', 'csv')
+		season = request.GET.get('season')
+		if kind not in EXPORTS or fmt not in FORMATS or (season and not season.isdigit()):
+			raise Http404("Unknown export")
 
-	t1 = {'total_targets': dict.fromkeys(r, 0)}
-	t2 = {}
+		response = StreamingHttpResponse(export_stream(kind, fmt, int(season) if season else None),
+										 content_type=FORMATS[fmt])
+		filename = "citl-" + kind + "-" + (season or "all") + "." + fmt
+		response['Content-Disposition'] = 'attachment; filename="' + filename + '"'
+		return response
 
-	for shooter,v in scorecard.items():
-		t2 = Counter(t2) + Counter(v['weeks'])
 
-	total_targets = {**t1['total_targets'], **t2}
+class JobFileView(LeagueAdminMixin, View):
+	"""Download the file a finished job wrote (exports)
+	"""
 
-	return(total_targets)
+	def get(self, request, job_id):
+		try:
+			job = Job.objects.get(pk=job_id, status=Job.DONE)
+		except Job.DoesNotExist:
+			raise Http404("No such job")
+		if not job.output_file:
+			raise Http404("This job has no file")
+
+		filename = job.output_file.name.rsplit('/', 1)[-1]
+		response = FileResponse(job.output_file.open('rb'), content_type=FORMATS.get(filename.rsplit('.', 1)[-1]))
+		response['Content-Disposition'] = 'attachment; filename="' + filename + '"'
+		return response
+
+
+class TestView(View):
+	def get(self, request):
+
+		context = {
+			'test': "Test"
+		}
+
+		return render(request, 'shooter/test.html', context)
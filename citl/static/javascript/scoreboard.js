@@ -0,0 +1,65 @@
+/**
+ * Live scoreboard: follows the season's Server-Sent Events stream (shooter/live.py) and updates the scorecard
+ * and standings tables in place, so nobody has to keep reloading the page on league night.
+ */
+;(function($) {
+    var table = $('#scorecard-tables[data-live]');
+    if (!table.length || !window.EventSource) {
+        return;
+    }
+
+    var source = new EventSource(table.data('live'));
+
+    source.addEventListener('scorecard', function(e) {
+        var data = JSON.parse(e.data);
+        var reload = false;
+
+        $.each(data.lines, function(i, line) {
+            var row = table.find('tr[data-shooter="' + line.shooter + '"]');
+            if (!row.length) {
+                // A shooter new to this scorecard: easier to fetch the page again than build the row
+                reload = true;
+                return false;
+            }
+            var cells = row.children('td');
+            $.each(line.weeks, function(week, total) {
+                cells.eq(week + 1).text(total === 0 ? '-' : total);
+            });
+            cells.eq(line.weeks.length + 1).text(line.weeks_shot);
+            cells.eq(line.weeks.length + 2).text(line.average);
+        });
+
+        if (reload) {
+            window.location.reload();
+            return;
+        }
+        table.find('tr[data-totals]').children('td').eq(data.week + 1).text(data.total_targets);
+    });
+
+    source.addEventListener('standings', function(e) {
+        var standings = JSON.parse(e.data).standings;
+
+        var place = $('#standing-place');
+        $.each(standings, function(i, row) {
+            if (row.team === place.data('team')) {
+                place.text(row.place);
+            }
+        });
+
+        if (table.is('[data-standings]')) {
+            table.find('tr[data-team]').remove();
+            var header = table.find('tr').first();
+            $.each(standings.slice().reverse(), function(i, row) {
+                // Relative to /shooter/<year>/standings/
+                var link = $('<a>').attr('href', '../' + encodeURIComponent(row.team) + '/scorecard/').text(row.team);
+                header.after($('<tr>').attr('data-team', row.team).append(
+                    $('<td>').text(row.place),
+                    $('<td>').append(link),
+                    $('<td>').text(row.total_targets),
+                    $('<td>').text(row.rank_points),
+                    $('<td>').text(row.bonus_points),
+                    $('<td>').text(row.points)));
+            });
+        }
+    });
+})(jQuery);
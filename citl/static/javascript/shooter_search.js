@@ -0,0 +1,47 @@
+/**
+ * Shooter autocomplete: as a name is typed on the new shooter page, list the shooters already in the league
+ * with that name (shooters/search.json, see shooter/search.py), so the same person isn't added twice.
+ */
+;(function($) {
+    var list = $('#shooter-matches[data-search]');
+    if (!list.length) {
+        return;
+    }
+
+    var inputs = $('#id_first_name, #id_last_name');
+    var timer = null;
+    var last = null;
+
+    function show(results) {
+        list.empty();
+        $.each(results, function(i, shooter) {
+            var item = $('<li>').append($('<a>').attr('href', list.data('shooter').replace('/0/', '/' + shooter.id + '/'))
+                                                .text(shooter.name));
+            if (shooter.team) {
+                item.append(document.createTextNode(' (' + shooter.team + ', ' + shooter.season + ')'));
+            }
+            list.append(item);
+        });
+        list.prev('.matches-label').toggle(results.length > 0);
+    }
+
+    inputs.on('input', function() {
+        clearTimeout(timer);
+        timer = setTimeout(function() {
+            var query = $.trim($('#id_first_name').val() + ' ' + $('#id_last_name').val());
+            if (query === last) {
+                return;
+            }
+            last = query;
+            if (query.length < 2) {
+                show([]);
+                return;
+            }
+            $.getJSON(list.data('search'), {q: query, limit: 8}, function(data) {
+                if (data.query === last) {
+                    show(data.results);
+                }
+            });
+        }, 150);
+    });
+})(jQuery);